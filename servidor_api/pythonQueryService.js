@@ -0,0 +1,137 @@
+// Cliente del servicio Python residente (src/query_service.py).
+// Mantiene un único proceso Python con los MongoClient calientes y le envía
+// peticiones JSON-RPC por líneas (stdin/stdout), correlacionadas por id.
+// Si el servicio no está disponible, `call` rechaza con { unavailable: true } para
+// que el llamador use el camino clásico (exec/spawn por petición).
+
+const { spawn } = require('child_process');
+const readline = require('readline');
+
+const RESTART_BASE_DELAY_MS = 1000;
+const RESTART_MAX_DELAY_MS = 30000;
+
+class PythonQueryService {
+    constructor({ pythonInterpreter, scriptPath, enabled = true, defaultTimeoutMs = 10000 }) {
+        this.pythonInterpreter = pythonInterpreter;
+        this.scriptPath = scriptPath;
+        this.enabled = enabled;
+        this.defaultTimeoutMs = defaultTimeoutMs;
+        this.proc = null;
+        this.ready = false;
+        this.nextId = 1;
+        this.pending = new Map();
+        this.restartDelayMs = RESTART_BASE_DELAY_MS;
+        this.stopped = false;
+    }
+
+    start() {
+        if (!this.enabled || this.proc || this.stopped) {
+            return;
+        }
+
+        const proc = spawn(this.pythonInterpreter, [this.scriptPath], { stdio: ['pipe', 'pipe', 'pipe'] });
+        this.proc = proc;
+        this.ready = false;
+
+        readline.createInterface({ input: proc.stdout }).on('line', (line) => this.handleLine(line));
+        proc.stderr.on('data', (data) => {
+            console.error(`[query_service] ${data.toString().trimEnd()}`);
+        });
+        proc.on('error', (err) => {
+            console.error('[query_service] Error al iniciar el servicio Python:', err.message);
+        });
+        proc.on('exit', (code, signal) => {
+            console.warn(`[query_service] Proceso terminado (code=${code}, signal=${signal}).`);
+            this.proc = null;
+            this.ready = false;
+            this.failPending('El servicio Python se detuvo.');
+            this.scheduleRestart();
+        });
+    }
+
+    scheduleRestart() {
+        if (this.stopped || !this.enabled) {
+            return;
+        }
+        const delay = this.restartDelayMs;
+        this.restartDelayMs = Math.min(this.restartDelayMs * 2, RESTART_MAX_DELAY_MS);
+        setTimeout(() => this.start(), delay).unref();
+    }
+
+    handleLine(line) {
+        let message;
+        try {
+            message = JSON.parse(line);
+        } catch (_e) {
+            console.warn(`[query_service] Línea no JSON ignorada: ${line.substring(0, 200)}`);
+            return;
+        }
+
+        if (message.event === 'ready') {
+            this.ready = true;
+            this.restartDelayMs = RESTART_BASE_DELAY_MS;
+            console.log('[query_service] Servicio Python listo.');
+            return;
+        }
+
+        const entry = this.pending.get(message.id);
+        if (!entry) {
+            return;
+        }
+        this.pending.delete(message.id);
+        clearTimeout(entry.timer);
+
+        if (message.error) {
+            entry.reject({ error: message.error.message, details: message.error.details || null });
+        } else if (entry.withMeta) {
+            entry.resolve({ result: message.result, version: message.version || null });
+        } else {
+            entry.resolve(message.result);
+        }
+    }
+
+    failPending(reason) {
+        for (const [id, entry] of this.pending) {
+            clearTimeout(entry.timer);
+            entry.reject({ error: reason, unavailable: true });
+            this.pending.delete(id);
+        }
+    }
+
+    isAvailable() {
+        return Boolean(this.enabled && this.proc && this.ready);
+    }
+
+    // Con { withMeta: true } resuelve { result, version } (version: hash de contenido para ETag).
+    call(method, params = {}, timeoutMs = this.defaultTimeoutMs, { withMeta = false } = {}) {
+        if (!this.isAvailable()) {
+            return Promise.reject({ error: 'Servicio Python no disponible.', unavailable: true });
+        }
+
+        const id = this.nextId++;
+        return new Promise((resolve, reject) => {
+            const timer = setTimeout(() => {
+                this.pending.delete(id);
+                reject({ error: `Timeout en query_service (${method})` });
+            }, timeoutMs);
+            this.pending.set(id, { resolve, reject, timer, withMeta });
+
+            try {
+                this.proc.stdin.write(`${JSON.stringify({ id, method, params })}\n`);
+            } catch (err) {
+                clearTimeout(timer);
+                this.pending.delete(id);
+                reject({ error: 'Error de comunicación con query_service', details: err.message, unavailable: true });
+            }
+        });
+    }
+
+    stop() {
+        this.stopped = true;
+        if (this.proc) {
+            this.proc.stdin.end();
+        }
+    }
+}
+
+module.exports = { PythonQueryService };
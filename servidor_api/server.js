@@ -7,6 +7,7 @@ const cors = require('cors');
 const path = require('path');
 const OpenAI = require('openai');
 const { clerkMiddleware, requireAuth } = require('@clerk/express');
+const { PythonQueryService } = require('./pythonQueryService');
 
 // Cargar variables de entorno desde el archivo .env en el root del proyecto
 require('dotenv').config({ path: path.join(__dirname, '..', '.env') });
@@ -24,6 +25,14 @@ const HISTORY_LIMIT = 4;
 // El intérprete de Python se resuelve automáticamente desde el PATH del entorno virtual definido en el Dockerfile.
 const PYTHON_INTERPRETER = 'python'; 
 
+// Servicio Python residente (src/query_service.py) para búsquedas, historial y permisos.
+// PY_QUERY_SERVICE=false vuelve al exec/spawn por petición.
+const queryService = new PythonQueryService({
+    pythonInterpreter: PYTHON_INTERPRETER,
+    scriptPath: path.join(PYTHON_SCRIPT_DIR, 'query_service.py'),
+    enabled: String(process.env.PY_QUERY_SERVICE || 'true').trim().toLowerCase() !== 'false',
+});
+
 function normalizeOrigin(origin = '') {
     return String(origin).trim().replace(/\/+$/, '');
 }
@@ -237,6 +246,81 @@ function ejecutarScriptPythonPorStdin(scriptName, payload, timeoutMs = 10000) {
     });
 }
 
+/**
+ * Busca una noticia con el servicio residente; si no está disponible, ejecuta buscar_noticia.py.
+ * @param {string[]} args - Mismos argumentos que buscar_noticia.py: [identificador, '--solo-antigua'?].
+ * @param {string} perfil - Proyección de src/projections.py (badge, alerts, chat_context, pdf, full).
+ * @returns {Promise<object>} Noticia o { mensaje: "Noticia no encontrada." }.
+ */
+async function buscarNoticiaPython(args, perfil = 'full') {
+    const { resultado } = await buscarNoticiaConVersion(args, perfil);
+    return resultado;
+}
+
+/**
+ * Como buscarNoticiaPython, pero devuelve también la versión de contenido (ETag) que
+ * calcula el servicio residente; version es null en el camino clásico.
+ * @returns {Promise<{resultado: object, version: string|null}>}
+ */
+async function buscarNoticiaConVersion(args, perfil = 'full') {
+    if (queryService.isAvailable()) {
+        try {
+            const { result, version } = await queryService.call(
+                'buscar_noticia',
+                { identificador: args[0], soloAntigua: args.includes('--solo-antigua'), perfil },
+                undefined,
+                { withMeta: true }
+            );
+            return { resultado: result, version };
+        } catch (error) {
+            if (!error.unavailable) {
+                throw error;
+            }
+        }
+    }
+    return { resultado: await ejecutarScriptPython('buscar_noticia.py', [...args, '--perfil', perfil]), version: null };
+}
+
+/**
+ * Aplica el ETag de una versión de contenido. Devuelve true si ya se respondió 304.
+ */
+function responderSiNoModificado(req, res, version, variante = '') {
+    if (!version) {
+        return false;
+    }
+    const etag = `"${version}${variante ? `-${variante}` : ''}"`;
+    res.set('ETag', etag);
+    if (req.headers['if-none-match'] === etag) {
+        res.status(304).end();
+        return true;
+    }
+    return false;
+}
+
+/**
+ * Ejecuta una acción de historial/permisos con el servicio residente o, como respaldo,
+ * con el entrypoint por stdin. Mantiene la semántica de ejecutarScriptPythonPorStdin
+ * (rechaza si la respuesta trae ok: false).
+ */
+async function ejecutarAccionPython(method, scriptName, payload) {
+    if (queryService.isAvailable()) {
+        let result;
+        try {
+            result = await queryService.call(method, payload);
+        } catch (error) {
+            if (!error.unavailable) {
+                throw error;
+            }
+            return ejecutarScriptPythonPorStdin(scriptName, payload);
+        }
+        if (result && result.ok === false) {
+            throw { error: result.error || `Error en ${scriptName}` };
+        }
+        return result;
+    }
+    return ejecutarScriptPythonPorStdin(scriptName, payload);
+}
+
 function normalizeHistoryQuery(query) {
     if (typeof query !== 'string') {
         return '';
@@ -270,7 +354,7 @@ async function pushHistoryForUser(userId, item) {
         },
     };
 
-    const result = await ejecutarScriptPythonPorStdin(HISTORY_SCRIPT, payload);
+    const result = await ejecutarAccionPython('history', HISTORY_SCRIPT, payload);
     return Array.isArray(result?.items) ? result.items : [];
 }
 
@@ -296,7 +380,7 @@ async function resolveChatbotPermissionState(req, { enforce = false } = {}) {
     }
 
     try {
-        const result = await ejecutarScriptPythonPorStdin(PERMISSIONS_SCRIPT, {
+        const result = await ejecutarAccionPython('permissions', PERMISSIONS_SCRIPT, {
             action: 'check_chatbot_access',
             userId,
             email: resolveSessionEmail(req),
@@ -608,7 +692,7 @@ app.post('/api/check-url', async (req, res) => {
         // Reutilizamos la misma lógica que en /api/buscar,
         // pero pasando directamente la URL como identificador.
         const args = [url];
-        const resultado = await ejecutarScriptPython('buscar_noticia.py', args);
+        const resultado = await buscarNoticiaPython(args, 'badge');
 
         // El propio script devuelve un mensaje estándar cuando no encuentra nada
         if (!resultado || resultado.mensaje === "Noticia no encontrada.") {
@@ -650,7 +734,8 @@ app.post('/api/check-url', async (req, res) => {
 
 /**
  * GET /api/news/context
- * Busca una noticia por URL y devuelve su contexto (análisis, metadatos) sin el embedding.
+ * Busca una noticia por URL y devuelve su contexto (perfil chat_context: análisis y metadatos,
+ * sin embedding, HTML de valoraciones ni historiales de consenso).
  * query: ?url=...
  */
 app.get('/api/news/context', async (req, res) => {
@@ -663,11 +748,14 @@ app.get('/api/news/context', async (req, res) => {
     try {
         const args = [url];
         // Ejecutamos buscar_noticia.py que ya maneja la lógica de búsqueda por URL
-        const resultado = await ejecutarScriptPython('buscar_noticia.py', args);
+        const { resultado, version } = await buscarNoticiaConVersion(args, 'chat_context');
 
         if (!resultado || resultado.mensaje === "Noticia no encontrada.") {
             return res.status(404).json({ ok: false, error: "Noticia no encontrada" });
         }
+        if (responderSiNoModificado(req, res, version, 'context')) {
+            return;
+        }
 
         // Limpiamos el resultado si fuera necesario, pero el script ya devuelve lo que necesitamos
         // Mapeamos a la estructura esperada por la extensión si hace falta, 
@@ -697,10 +785,13 @@ app.get('/api/news/:id/alerts', requireAuth(), async (req, res) => {
     }
 
     try {
-        const news = await ejecutarScriptPython('buscar_noticia.py', [id]);
+        const { resultado: news, version } = await buscarNoticiaConVersion([id], 'alerts');
         if (!news || news.mensaje === "Noticia no encontrada.") {
             return res.status(404).json({ ok: false, error: "Noticia no encontrada." });
         }
+        if (responderSiNoModificado(req, res, version, 'alerts')) {
+            return;
+        }
 
         const alerts = news?.evaluation_result?.alerts ?? [];
         const alerts_summary = news?.evaluation_result?.alerts_summary ?? {
@@ -761,7 +852,7 @@ app.post('/api/chat/news', async (req, res) => {
     try {
         // 2. Recuperar el contexto de la noticia desde MongoDB usando el newsId
         const args = [newsId];
-        const contexto = await ejecutarScriptPython('buscar_noticia.py', args);
+        const contexto = await buscarNoticiaPython(args, 'chat_context');
 
         if (!contexto || contexto.mensaje === "Noticia no encontrada.") {
             return res.status(404).json({ ok: false, error: "Noticia no encontrada para generar respuesta." });
@@ -902,7 +993,7 @@ app.get('/api/history', requireAuth(), async (req, res) => {
     }
 
     try {
-        const result = await ejecutarScriptPythonPorStdin(HISTORY_SCRIPT, {
+        const result = await ejecutarAccionPython('history', HISTORY_SCRIPT, {
             action: 'get_history',
             userId,
             limit: HISTORY_LIMIT,
@@ -933,7 +1024,7 @@ app.post('/api/history', requireAuth(), async (req, res) => {
     }
 
     try {
-        const result = await ejecutarScriptPythonPorStdin(HISTORY_SCRIPT, {
+        const result = await ejecutarAccionPython('history', HISTORY_SCRIPT, {
             action: 'push_history',
             userId,
             limit: HISTORY_LIMIT,
@@ -983,6 +1074,34 @@ app.post('/api/check-urls', (req, res) => {
         });
     }
 
+    if (queryService.isAvailable()) {
+        queryService.call('buscar_noticias_batch', { urls }, 30000)
+            .then((resultado) => {
+                if (resultado.ok === false) {
+                    return res.status(500).json(resultado);
+                }
+                console.log(`[/api/check-urls] resultados length: ${(resultado.resultados || []).length}`);
+                return res.json(resultado);
+            })
+            .catch((error) => {
+                if (error.unavailable) {
+                    return buscarNoticiasBatchPorSpawn(urls, res);
+                }
+                console.error('[/api/check-urls] Error en query_service:', error);
+                return res.status(500).json({
+                    ok: false,
+                    error: error.error || 'Error en script Python',
+                    details: error.details || null,
+                });
+            });
+        return;
+    }
+
+    buscarNoticiasBatchPorSpawn(urls, res);
+});
+
+// Camino clásico de /api/check-urls: un proceso buscar_noticias_batch.py por petición.
+function buscarNoticiasBatchPorSpawn(urls, res) {
     const scriptName = 'buscar_noticias_batch.py';
     const scriptPath = path.join(PYTHON_SCRIPT_DIR, scriptName);
     
@@ -1094,7 +1213,7 @@ app.post('/api/check-urls', (req, res) => {
             res.status(500).json({ ok: false, error: "Error de comunicación con script Python" });
         }
     }
-});
+}
 
 /**
  * POST /api/buscar
@@ -1114,7 +1233,7 @@ app.post('/api/buscar', requireAuth(), async (req, res) => {
     }
 
     try {
-        const resultado = await ejecutarScriptPython('buscar_noticia.py', args);
+        const resultado = await buscarNoticiaPython(args);
         
         if (resultado.mensaje === "Noticia no encontrada.") {
              return res.status(404).json(resultado);
@@ -1162,6 +1281,8 @@ app.use((req, res) => {
 
 // Inicio del servidor
 // CRÍTICO: Escuchar en 0.0.0.0 para que Render pueda acceder
+queryService.start();
+
 app.listen(PORT, '0.0.0.0', () => {
     console.log(`✅ API escuchando en puerto ${PORT}...`);
     console.log(`🐍 Ruta de intérprete Python: ${PYTHON_INTERPRETER}`);
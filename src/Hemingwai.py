@@ -7,15 +7,16 @@ import uuid
 import pymongo
 import time
 from decimal import Decimal, ROUND_HALF_UP
+from functools import lru_cache
 from datetime import datetime, timezone
 from bson.objectid import ObjectId
-from pymongo.mongo_client import MongoClient
-from pymongo.server_api import ServerApi
 from Utils import Utils
 from dotenv import load_dotenv
 load_dotenv()
+import mongo_clients
 from MongoDB import MongoDBService
 from deterministic_engine import compute_evaluation_result
+from fact_checking_wrapper import FACT_CHECK_OVERLAP, finish_fact_checking, merge_fact_checking, start_fact_checking
 from llm_alert_extractor import extract_alerts_with_llm
 from section_summaries import (
     build_section_summaries_meta,
@@ -52,7 +53,6 @@ MONGO_READ_URI = get_env_first(("MONGO_READ_URI", "OLD_MONGODB_URI", "MONGODB_UR
 MONGO_WRITE_URI = get_env_first(("MONGO_WRITE_URI", "NEW_MONGODB_URI", "MONGODB_URI"))
 MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "Base_de_datos_noticias")
 MONGO_COLLECTION_NAME = os.getenv("MONGO_COLLECTION_NAME", "Noticias")
-MONGO_SERVER_API_VERSION = os.getenv("MONGO_SERVER_API_VERSION", "1")
 
 
 def round_half_up(value, ndigits):
@@ -60,7 +60,19 @@ def round_half_up(value, ndigits):
     return float(Decimal(str(value)).quantize(quant, rounding=ROUND_HALF_UP))
 
 
-def procesar_noticias():
+@lru_cache(maxsize=None)
+def _anthropic_client(api_key):
+    return anthropic.Anthropic(api_key=api_key)
+
+
+def procesar_noticias(noticia_id_str=None, run_id=None, output_dir=None):
+    """
+    Analiza la noticia `noticia_id_str` (o la primera sin puntuación) y guarda el resultado en la BD nueva.
+    Con FACT_CHECK_OVERLAP el fact-check corre a la vez que el análisis y se guarda con él; si hay
+    `output_dir` (o PIPELINE_OUTPUT_DIR) deja ahí fact_check_analisis.json para render_latex.py.
+    Devuelve el ID analizado, o None si no se analizó ninguna.
+    """
+    output_dir = output_dir or os.getenv("PIPELINE_OUTPUT_DIR")
     try:
         Utils.reset_anthropic_runtime_state()
         validate_required(["OPENAI_API_KEY"], active=True, context="Hemingwai")
@@ -84,7 +96,7 @@ def procesar_noticias():
         if not FEATURE_ENABLE_ANTHROPIC:
             anthropic_step.update({"status": "disabled", "ok": False, "error": "feature_disabled"})
         elif anthropic_api_key:
-            anthropic_client = anthropic.Anthropic(api_key=anthropic_api_key)
+            anthropic_client = _anthropic_client(anthropic_api_key)
             anthropic_step.update({"status": "ok", "ok": True})
         elif not FEATURE_FAIL_OPEN_ANTHROPIC:
             print("Falta ANTHROPIC_API_KEY en el .env")
@@ -98,16 +110,14 @@ def procesar_noticias():
             print("Faltan MONGO_READ_URI/MONGO_WRITE_URI (o OLD_MONGODB_URI/NEW_MONGODB_URI) en el .env")
             return
         # Conexiones
-        old_client = MongoClient(MONGO_READ_URI, server_api=ServerApi(MONGO_SERVER_API_VERSION))
-        old_collection = old_client[MONGO_DB_NAME][MONGO_COLLECTION_NAME]
-        new_client = MongoClient(MONGO_WRITE_URI, server_api=ServerApi(MONGO_SERVER_API_VERSION))
-        new_collection = new_client[MONGO_DB_NAME][MONGO_COLLECTION_NAME]
+        # Clients compartidos del proceso (mongo_clients): el lote analiza varias noticias con los mismos
+        old_collection = mongo_clients.get_collection(MONGO_READ_URI, MONGO_DB_NAME, MONGO_COLLECTION_NAME, workload="pipeline")
+        new_collection = mongo_clients.get_collection(MONGO_WRITE_URI, MONGO_DB_NAME, MONGO_COLLECTION_NAME, workload="pipeline")
         
         doc_to_analyze = None
 
         # Si se pasa un ID, se busca esa noticia, se asegura de que esté en la nueva DB y se procesa.
-        if len(sys.argv) > 1:
-            noticia_id_str = sys.argv[1]
+        if noticia_id_str:
             if not re.match(r"^[a-fA-F0-9]{24}$", noticia_id_str):
                 print(f"El ID proporcionado '{noticia_id_str}' no es válido.")
                 return
@@ -145,7 +155,8 @@ def procesar_noticias():
             return
 
         # --- Pipeline run metadata (traceability) ---
-        RUN_ID = str(uuid.uuid4())
+        # analiza_y_guarda pasa el run_id de su directorio de trabajo (workspace.py)
+        RUN_ID = run_id or os.getenv("PIPELINE_RUN_ID") or str(uuid.uuid4())
         NOW_ISO = datetime.now(timezone.utc).isoformat()
         print(f"Run ID: {RUN_ID}")
 
@@ -182,6 +193,8 @@ def procesar_noticias():
             )
             return
         print(f"Procesando noticia: {titulo}")
+        # El fact-check solo necesita el cuerpo: arranca ya y corre mientras dura el análisis
+        fact_check_future = start_fact_checking(noticia) if FACT_CHECK_OVERLAP else None
         resultados = Utils.analizar_noticia(anthropic_client, openai, titulo, noticia)
         # --- Generar embedding del cuerpo de la noticia y guardarlo (con reintentos) ---
         noticia_embedding = None
@@ -432,6 +445,9 @@ def procesar_noticias():
             value = doc_to_analyze.get(field)
             if value is not None and value != '':
                 update_fields[field] = value
+        if fact_check_future is not None:
+            fact_check = finish_fact_checking(fact_check_future, str(doc_to_analyze['_id']), output_dir)
+            merge_fact_checking(update_fields, fact_check)
         safe_fields = Utils.sanitize(update_fields)
         # Guardar en la base de datos nueva
         new_collection.update_one({"_id": doc_to_analyze['_id']}, {"$set": safe_fields}, upsert=True)
@@ -443,6 +459,7 @@ def procesar_noticias():
             f"Es clickbait: {es_clickbait}\n"
             f"Título reformulado: {titular_reformulado}\n"
         )
+        return str(doc_to_analyze['_id'])
 
     except pymongo.errors.ConnectionFailure as e:
         print(f"Error de conexión a MongoDB: {e}")
@@ -454,4 +471,4 @@ def procesar_noticias():
         print(f"Error inesperado: {e}")
 
 if __name__ == "__main__":
-    procesar_noticias()
+    procesar_noticias(sys.argv[1] if len(sys.argv) > 1 else None)
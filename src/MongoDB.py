@@ -1,8 +1,8 @@
-from pymongo import MongoClient
 # Quiero importar load_dotenv desde el archivo .env
 from dotenv import load_dotenv
 import os
-from pymongo.server_api import ServerApi
+
+import mongo_clients
 
 
 class MongoDBService:
@@ -10,12 +10,20 @@ class MongoDBService:
     Clase para manejar la conexión a MongoDB.
     Permite múltiples instancias para diferentes bases de datos.
     """
-    def __init__(self, uri, db_name="mydatabase"):
-        self.client = MongoClient(uri)
-        self.db = self.client[db_name]
+    def __init__(self, uri, db_name="mydatabase", client=None, workload="default"):
+        # Por defecto usa el client compartido del proceso (mongo_clients); close() solo
+        # cierra el client si es propio (client_for sin pooling).
+        if client is None:
+            client = mongo_clients.client_for(uri)
+            self._owns_client = not mongo_clients.pooling_enabled()
+        else:
+            self._owns_client = False
+        self.client = client
+        self.db = self.client.get_database(db_name, **mongo_clients.workload_options(workload))
 
     def get_collection(self, name):
         return self.db[name]
 
     def close(self):
-        self.client.close()
+        if self._owns_client:
+            self.client.close()
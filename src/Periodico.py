@@ -1,4 +1,5 @@
 import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from urllib.parse import urljoin, urlparse
 import requests
 from bs4 import BeautifulSoup
@@ -8,20 +9,175 @@ from pymongo.server_api import ServerApi
 import hashlib
 import os
 import sys
+import threading
 from dotenv import load_dotenv
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
 from MongoDB import *
 from Utils import *
+from crawler_http import CRAWL_MAX_WORKERS, HostLimiter, build_session, fetch, texto_html
+from env_config import get_env_bool, get_env_int
+import fast_extract
+from feed_discovery import FeedDiscovery
+from fetch_metadata import FetchMetadataStore, content_hash
+from html_cache import HTML_CACHE_ENABLED, HtmlCache
+from known_urls import KnownUrlIndex
 
 
+CRAWL_PARSE_PROCESSES = get_env_int("CRAWL_PARSE_PROCESSES", os.cpu_count() or 2)
+CRAWL_MAX_NEWSPAPERS_IN_PARALLEL = get_env_int("CRAWL_MAX_NEWSPAPERS_IN_PARALLEL", 4)
+CRAWL_REVISIT_LIMIT = get_env_int("CRAWL_REVISIT_LIMIT", 50)
+CRAWL_BATCH_SIZE = get_env_int("CRAWL_BATCH_SIZE", 100)
+CRAWL_FAST_EXTRACT = get_env_bool("CRAWL_FAST_EXTRACT", False)
+CRAWL_FAST_EXTRACT_IMAGES = get_env_bool("CRAWL_FAST_EXTRACT_IMAGES", False)
+DUPLICATE_KEY_ERROR = 11000
+_indexes_ensured = None
+_indexes_lock = threading.Lock()
+
+
+def ensure_indexes(collection):
+    """
+    Índices únicos sobre `url` e `identificador` para que la deduplicación la haga Mongo
+    (sin find_one previo y sin carreras entre crawlers en paralelo). Son parciales porque
+    en la colección conviven documentos sin URL (p. ej. las fake news generadas).
+    Devuelve True si los índices están disponibles.
+    """
+    global _indexes_ensured
+    if _indexes_ensured is not None:
+        return _indexes_ensured
+
+    with _indexes_lock:
+        if _indexes_ensured is not None:
+            return _indexes_ensured
+        try:
+            collection.create_index(
+                [("url", ASCENDING)],
+                unique=True,
+                name="ux_noticias_url",
+                partialFilterExpression={"url": {"$type": "string"}},
+            )
+            collection.create_index(
+                [("identificador", ASCENDING)],
+                unique=True,
+                name="ux_noticias_identificador",
+                partialFilterExpression={"identificador": {"$type": "string"}},
+            )
+            _indexes_ensured = True
+        except OperationFailure as e:
+            # Típicamente hay duplicados históricos: se sigue con la deduplicación por consulta.
+            print(f"Advertencia: no se pudieron crear los índices únicos de Noticias: {e}")
+            _indexes_ensured = False
+        return _indexes_ensured
+
+
+def _parsear_html_articulo(url, html, rapido=False, con_imagenes=False):
+    """
+    Parsea el HTML ya descargado de un artículo con newspaper.
+    Se ejecuta en un pool de procesos (el parseo es CPU-bound), por eso es una
+    función de módulo y solo devuelve tipos serializables.
+    :param rapido: Solo título, autores, fecha y cuerpo (ver fast_extract.parsear_articulo).
+    :param con_imagenes: En modo rápido, recoger también top_image e images.
+    :return: Campos del artículo; `extraccion` ("rapida" o "completa") indica el extractor usado.
+    """
+    if rapido:
+        campos = fast_extract.parsear_articulo(url, html, con_imagenes=con_imagenes)
+        campos["extraccion"] = "rapida"
+        return campos
+    articulo = Article(url)
+    articulo.download(input_html=html)
+    articulo.parse()
+    return {
+        "url": url,
+        "titulo": articulo.title.strip() if articulo.title else "Sin título",
+        "cuerpo": articulo.text.strip() if articulo.text else "Sin contenido",
+        "fecha_publicacion": articulo.publish_date.isoformat() if articulo.publish_date else None,
+        "autor": articulo.authors,
+        'tags': list(articulo.tags) if articulo.tags else [],
+        'keywords': list(articulo.meta_keywords) if articulo.meta_keywords else [],
+        'top_image': articulo.top_image if articulo.top_image else None,
+        'images': list(articulo.images) if articulo.images else [],
+        'is_media_news': articulo.is_media_news(),
+        # Las noticias guardadas sin `extraccion` también se extrajeron con newspaper completo
+        'extraccion': 'completa',
+    }
+
 
 class Periodico:
-    def __init__(self, nombre, url):
+    # Patrones por defecto para reconocer enlaces de noticias (cada fuente puede sobrescribirlos)
+    PATRONES_NOTICIAS = [
+        r'/noticia/',  # patrón simple
+        r'/noticias/',  # patrón simple
+        r'/espana/',  # patrón simple
+        r'/internacional/',  # patrón simple
+        r'/news/',  # patrón simple
+        r'\d{4}/\d{2}/\d{2}/',  # fechas tipo 2024/04/08/
+        r'\d{4}-\d{2}-\d{2}/',  # fechas tipo 2024-04-08/
+        r'\d{2}/\d{2}/\d{4}/',  # fechas tipo 20/04/2024
+        r'\d{2}-\d{2}-\d{4}/',  # fechas tipo 20-04-2024
+        r'/\d{4}/[a-z]{3}/\d{2}/[\w\-]+',     # tipo /2025/abr/18/titulo-noticia
+        r'/articulo/',  # patrón simple
+        r'/articulos/',  # patrón simple
+        r'/article/',  # patrón simple
+        r'/[\w\-]*news[\w\-]*/\d{4}/\d{2}/\d{2}/[\w\-]+',   # con "news" en el path antes de la fecha
+        r'/[\w\-]*noticia[\w\-]*/\d{4}/\d{2}/\d{2}/[\w\-]+', # con "noticia" y fecha
+    ]
+    PATRONES_DESCARTAR = [
+        r'/opinion/', r'/columna/', r'/editorial/', r'/cronica/', r'/ensayo/', r'/entrevista/',
+        r'/analisis/', r'/review/', r'/reseña/', r'/blog/', r'/comentario/', r'/debate/', r'/podcast/',
+        r'/especial/', r'/reportaje/', r'/investigacion/', r'/suplemento/', r'/revista/', r'/magazine/',
+        r'/humor/', r'/cartas/', r'/obituario/', r'/agenda/', r'/tendencias/', r'/opinión/', r'/perspectiva/'
+    ]
+
+    def __init__(self, nombre, url, usar_indice_urls=True, patrones_noticias=None, patrones_descartar=None, feeds=None,
+                 cache_html=None, modo_rapido=None, con_imagenes=None):
         load_dotenv()
         self.nombre = nombre
         self.url = url
+        self.feeds = list(feeds or [])
+        self.patrones_noticias = patrones_noticias or Periodico.PATRONES_NOTICIAS
+        self.patrones_descartar = patrones_descartar or Periodico.PATRONES_DESCARTAR
+        self.usar_indice_urls = usar_indice_urls
+        self._indice_urls = None
         # Prioritize NEW_MONGODB_URI, fall back to MONGODB_URI
         mongodb_uri = os.getenv('NEW_MONGODB_URI') or os.getenv('MONGODB_URI')
-        self.db = MongoDBService(uri=mongodb_uri, db_name='Base_de_datos_noticias')
+        self.db = MongoDBService(uri=mongodb_uri, db_name='Base_de_datos_noticias', workload="bulk")
+        self._fetch_metadata = None
+        self._feed_discovery = None
+        self.cache_html = HTML_CACHE_ENABLED if cache_html is None else cache_html
+        self.modo_rapido = CRAWL_FAST_EXTRACT if modo_rapido is None else modo_rapido
+        self.con_imagenes = CRAWL_FAST_EXTRACT_IMAGES if con_imagenes is None else con_imagenes
+
+    @property
+    def fetch_metadata(self):
+        if self._fetch_metadata is None:
+            self._fetch_metadata = FetchMetadataStore(self.db.db)
+        return self._fetch_metadata
+
+    @property
+    def indice_urls(self):
+        if self._indice_urls is None:
+            self._indice_urls = KnownUrlIndex.shared(self.db.get_collection('Noticias'))
+        return self._indice_urls
+
+    @property
+    def html_cache(self):
+        return HtmlCache.shared() if self.cache_html else None
+
+    def _cachear_html(self, url, html):
+        cache = self.html_cache
+        if cache is None:
+            return
+        try:
+            cache.put(url, html)
+        except OSError as e:
+            print(f"No se pudo guardar el HTML en caché: {url} - {e}")
+
+    def _guardar_indice_urls(self):
+        if self._indice_urls is not None:
+            try:
+                self._indice_urls.save()
+            except OSError as e:
+                print(f"No se pudo guardar el índice de URLs conocidas: {e}")
 
     @staticmethod
     def deducir_fuente(url):
@@ -37,6 +193,16 @@ class Periodico:
         except:
             return "Desconocido"
 
+    def _construir_noticia(self, campos) -> dict:
+        """
+        Completa los campos extraídos de un artículo con los metadatos de ingesta.
+        """
+        noticia = dict(campos)
+        noticia["identificador"] = Utils.codificar_url_sha256(noticia["url"])  # Se añade el hash de la URL
+        noticia["fuente"] = self.nombre
+        noticia["fecha_extraccion"] = Utils.obtener_fecha_hora_actual_iso()
+        return noticia
+
     def extraer_noticia(self, url) -> dict:
         """
         Extrae el contenido de una noticia a partir de su URL.
@@ -46,27 +212,92 @@ class Periodico:
         try:
             articulo = Article(url)
             articulo.download()
-            articulo.parse()
-            noticia = {
-                "url": url,
-                "titulo": articulo.title.strip() if articulo.title else "Sin título",
-                "cuerpo": articulo.text.strip() if articulo.text else "Sin contenido",
-                "fecha_publicacion": articulo.publish_date.isoformat() if articulo.publish_date else None,
-                "autor": articulo.authors,
-                "identificador": Utils.codificar_url_sha256(url),  # Se añade el hash de la URL
-                "fuente": self.nombre,
-                "fecha_extraccion": Utils.obtener_fecha_hora_actual_iso(),
-                'tags': list(articulo.tags) if articulo.tags else [],
-                'keywords': list(articulo.meta_keywords) if articulo.meta_keywords else [],
-                'top_image': articulo.top_image if articulo.top_image else None,
-                'images': list(articulo.images) if articulo.images else [],
-                'is_media_news': articulo.is_media_news(),
-            }
-            return noticia
+            self._cachear_html(url, articulo.html)
+            campos = _parsear_html_articulo(url, articulo.html, self.modo_rapido, self.con_imagenes)
+            return self._construir_noticia(campos)
         except Exception as e:
             print(f"Error al procesar la URL: {url} - {e}")
             return None
 
+    def extraer_noticia_http(self, url, session, limiter=None, parse_pool=None) -> dict:
+        """
+        Descarga una noticia con la sesión compartida y la parsea (en parse_pool si se indica).
+        Lanza excepción si la descarga o el parseo fallan.
+        """
+        response = fetch(session, limiter, url)
+        response.raise_for_status()
+        self.fetch_metadata.record(url, response, content_hash(response.content), "article")
+        html = texto_html(response)
+        self._cachear_html(url, html)
+        if parse_pool is not None:
+            campos = parse_pool.submit(
+                _parsear_html_articulo, url, html, self.modo_rapido, self.con_imagenes
+            ).result()
+        else:
+            campos = _parsear_html_articulo(url, html, self.modo_rapido, self.con_imagenes)
+        return self._construir_noticia(campos)
+
+    @staticmethod
+    def completar_con_pistas(noticia, pistas):
+        """Rellena título y fecha que newspaper no encontró con los que traía el feed."""
+        if not noticia or not pistas:
+            return noticia
+        if pistas.get("titulo") and noticia.get("titulo") in (None, "", "Sin título"):
+            noticia["titulo"] = pistas["titulo"]
+        if pistas.get("fecha_publicacion") and not noticia.get("fecha_publicacion"):
+            noticia["fecha_publicacion"] = pistas["fecha_publicacion"]
+        return noticia
+
+    def extraer_noticias_concurrente(self, urls, session, limiter=None, io_pool=None, parse_pool=None) -> list:
+        """
+        Descarga los artículos en paralelo (threads + sesión keep-alive compartida) y
+        los parsea en un pool de procesos a medida que llegan.
+        :param urls: URLs de los artículos.
+        :param session: requests.Session compartida (ver crawler_http.build_session).
+        :param limiter: HostLimiter con los límites de cortesía por host.
+        :return: Lista de noticias extraídas (las que fallan se descartan con un aviso).
+        """
+        urls = list(urls)
+        if not urls:
+            return []
+
+        def descargar(url):
+            response = fetch(session, limiter, url)
+            response.raise_for_status()
+            self.fetch_metadata.record(url, response, content_hash(response.content), "article")
+            html = texto_html(response)
+            self._cachear_html(url, html)
+            return url, html
+
+        own_io_pool = io_pool is None
+        own_parse_pool = parse_pool is None
+        io_pool = io_pool or ThreadPoolExecutor(max_workers=min(CRAWL_MAX_WORKERS, len(urls)))
+        parse_pool = parse_pool or ProcessPoolExecutor(max_workers=CRAWL_PARSE_PROCESSES)
+        noticias = []
+        try:
+            parse_futures = {}
+            for future in as_completed([io_pool.submit(descargar, url) for url in urls]):
+                try:
+                    url, html = future.result()
+                except Exception as e:
+                    print(f"Error al descargar la URL: {e}")
+                    continue
+                parse_futures[parse_pool.submit(
+                    _parsear_html_articulo, url, html, self.modo_rapido, self.con_imagenes
+                )] = url
+
+            for future in as_completed(parse_futures):
+                try:
+                    noticias.append(self._construir_noticia(future.result()))
+                except Exception as e:
+                    print(f"Error al procesar la URL: {parse_futures[future]} - {e}")
+        finally:
+            if own_io_pool:
+                io_pool.shutdown(wait=True)
+            if own_parse_pool:
+                parse_pool.shutdown(wait=True)
+        return noticias
+
     # Función para guardar una noticia en MongoDB
     def guardar_noticia(self, noticia):
         """
@@ -77,13 +308,32 @@ class Periodico:
         collection = self.db.get_collection('Noticias')
         try:
             if noticia and noticia['cuerpo']:
+                if ensure_indexes(collection):
+                    # Una sola ida y vuelta: el índice único resuelve los duplicados.
+                    try:
+                        result = collection.insert_one(noticia)
+                        print(f"Noticia guardada con éxito: {noticia['titulo']}")
+                        inserted_id = result.inserted_id
+                    except DuplicateKeyError:
+                        noticia.pop('_id', None)
+                        existente = collection.find_one({"url": noticia['url']}, {"_id": 1})
+                        print(f"La noticia ya existe en la base de datos: {noticia['url']}")
+                        inserted_id = existente['_id'] if existente else None
+                    if self._indice_urls is not None:
+                        self._indice_urls.add(noticia['url'])
+                    return inserted_id
+
                 existente = collection.find_one({"url": noticia['url']})
                 if not existente:  # Evitar duplicados
                     result = collection.insert_one(noticia)
                     print(f"Noticia guardada con éxito: {noticia['titulo']}")
+                    if self._indice_urls is not None:
+                        self._indice_urls.add(noticia['url'])
                     return result.inserted_id
                 else:
                     print(f"La noticia ya existe en la base de datos: {noticia['url']}")
+                    if self._indice_urls is not None:
+                        self._indice_urls.add(noticia['url'])
                     return existente['_id']
             else:
                 print("Noticia vacía o incompleta. No se guarda.")
@@ -92,68 +342,282 @@ class Periodico:
             print(f"Error al guardar la noticia en MongoDB: {e}")
             return None
 
+    def guardar_noticias(self, noticias) -> dict:
+        """
+        Guarda un lote de noticias con un único insert_many desordenado.
+        Los errores de clave duplicada (índices únicos sobre url/identificador) se tratan
+        como "ya presente", así que es seguro con varios crawlers en paralelo.
+        :param noticias: Lista de diccionarios de noticias (las vacías se ignoran).
+        :return: {"insertadas": int, "existentes": int, "descartadas": int, "errores": int,
+                  "ids": {url: _id insertado}, "fallidas": [urls que no se pudieron guardar]}
+        """
+        resumen = {"insertadas": 0, "existentes": 0, "descartadas": 0, "errores": 0, "ids": {}, "fallidas": []}
+        lote = {}
+        for noticia in noticias or []:
+            if noticia and noticia.get('cuerpo') and noticia.get('url'):
+                lote.setdefault(noticia['url'], noticia)
+            else:
+                resumen["descartadas"] += 1
+        if not lote:
+            return resumen
+
+        collection = self.db.get_collection('Noticias')
+        docs = list(lote.values())
+        # Solo estas URL van al índice de conocidas: las que fallaron deben reintentarse
+        presentes = set()
+        try:
+            if not ensure_indexes(collection):
+                ya_presentes = {
+                    doc["url"] for doc in collection.find({"url": {"$in": list(lote)}}, {"_id": 0, "url": 1})
+                }
+                resumen["existentes"] += len(ya_presentes)
+                presentes |= ya_presentes
+                docs = [doc for doc in docs if doc['url'] not in ya_presentes]
+                if not docs:
+                    return resumen
+
+            fallidos = set()
+            try:
+                collection.insert_many(docs, ordered=False)
+            except BulkWriteError as e:
+                for error in e.details.get("writeErrors", []):
+                    fallidos.add(error["index"])
+                    if error.get("code") == DUPLICATE_KEY_ERROR:
+                        resumen["existentes"] += 1
+                        presentes.add(docs[error["index"]]['url'])
+                    else:
+                        resumen["errores"] += 1
+                        print(f"Error al guardar la noticia {docs[error['index']]['url']}: {error.get('errmsg')}")
+
+            for index, doc in enumerate(docs):
+                if index in fallidos:
+                    doc.pop('_id', None)
+                    continue
+                resumen["insertadas"] += 1
+                resumen["ids"][doc['url']] = doc['_id']
+                presentes.add(doc['url'])
+        except Exception as e:
+            print(f"Error al guardar el lote de noticias en MongoDB: {e}")
+            resumen["errores"] += len(docs)
+            resumen["fallidas"] = [url for url in lote if url not in presentes]
+            return resumen
+
+        resumen["fallidas"] = [url for url in lote if url not in presentes]
+        if self._indice_urls is not None:
+            for url in presentes:
+                self._indice_urls.add(url)
+        print(
+            f"{self.nombre}: lote guardado ({resumen['insertadas']} nuevas, "
+            f"{resumen['existentes']} ya existentes, {resumen['errores']} errores)"
+        )
+        return resumen
+
     # Función para filtrar enlaces que parecen ser noticias y descartar los que no lo son
-    def filtrar_enlaces_noticias(self, enlaces) -> set:
+    def filtrar_enlaces_noticias(self, enlaces, solo_descartar=False) -> set:
         """
         Filtra los enlaces para encontrar aquellos que parecen ser noticias.
+        Si usar_indice_urls está activo, descarta además los ya ingeridos (sin tocar la red).
         :param enlaces: Un conjunto de enlaces a filtrar.
+        :param solo_descartar: Si es True (enlaces de feeds, que ya son noticias) solo se aplican
+                               los patrones de descarte.
         :return: Un conjunto de enlaces que parecen ser noticias.
         """
-        patrones_noticias = [
-            r'/noticia/',  # patrón simple
-            r'/noticias/',  # patrón simple
-            r'/espana/',  # patrón simple
-            r'/internacional/',  # patrón simple
-            r'/news/',  # patrón simple
-            r'\d{4}/\d{2}/\d{2}/',  # fechas tipo 2024/04/08/
-            r'\d{4}-\d{2}-\d{2}/',  # fechas tipo 2024-04-08/
-            r'\d{2}/\d{2}/\d{4}/',  # fechas tipo 20/04/2024
-            r'\d{2}-\d{2}-\d{4}/',  # fechas tipo 20-04-2024
-            r'/\d{4}/[a-z]{3}/\d{2}/[\w\-]+',     # tipo /2025/abr/18/titulo-noticia
-            r'/articulo/',  # patrón simple
-            r'/articulos/',  # patrón simple
-            r'/article/',  # patrón simple
-            r'/[\w\-]*news[\w\-]*/\d{4}/\d{2}/\d{2}/[\w\-]+',   # con "news" en el path antes de la fecha
-            r'/[\w\-]*noticia[\w\-]*/\d{4}/\d{2}/\d{2}/[\w\-]+', # con "noticia" y fecha
-        ]
-        patrones_descartar = [
-            r'/opinion/', r'/columna/', r'/editorial/', r'/cronica/', r'/ensayo/', r'/entrevista/',
-            r'/analisis/', r'/review/', r'/reseña/', r'/blog/', r'/comentario/', r'/debate/', r'/podcast/',
-            r'/especial/', r'/reportaje/', r'/investigacion/', r'/suplemento/', r'/revista/', r'/magazine/',
-            r'/humor/', r'/cartas/', r'/obituario/', r'/agenda/', r'/tendencias/', r'/opinión/', r'/perspectiva/'
-        ]
+        patrones_noticias = self.patrones_noticias
+        patrones_descartar = self.patrones_descartar
         enlaces_filtrados = set()
         for enlace in enlaces:
-            if any(re.search(patron, enlace) for patron in patrones_noticias) and not any(
+            if (solo_descartar or any(re.search(patron, enlace) for patron in patrones_noticias)) and not any(
                     re.search(patron, enlace) for patron in patrones_descartar):
                 enlaces_filtrados.add(enlace)
+        if self.usar_indice_urls and enlaces_filtrados:
+            indice = self.indice_urls
+            nuevos = {enlace for enlace in enlaces_filtrados if enlace not in indice}
+            descartados = len(enlaces_filtrados) - len(nuevos)
+            if descartados:
+                print(f"{self.nombre}: {descartados} enlaces ya ingeridos descartados antes de descargar")
+            enlaces_filtrados = nuevos
         return enlaces_filtrados
     
     # Función para extraer todas las URLs de una página principal con límite opcional
-    def extraer_enlaces(self, limite=None) -> set:
+    def extraer_enlaces(self, limite=None, session=None, limiter=None, condicional=False) -> set:
         """
         Extrae todos los enlaces de una página principal.
         :param url: URL de la página principal.
         :param limite: Límite opcional de enlaces a extraer.
+        :param session: Sesión HTTP opcional (keep-alive) para reutilizar conexiones.
+        :param limiter: HostLimiter opcional para respetar los límites por host.
+        :param condicional: Si es True, hace un GET condicional (ETag/Last-Modified) y devuelve
+                            un conjunto vacío cuando la portada no ha cambiado desde la última vez.
         :return: Un conjunto de enlaces extraídos.
         """
         try:
-            response = requests.get(self.url, timeout=10)
+            http = session if session is not None else requests
+            if condicional:
+                estado, response, body_hash = self.fetch_metadata.fetch_conditional(
+                    http, self.url, "homepage", limiter=limiter, fetcher=fetch
+                )
+                if estado != "changed":
+                    print(f"Portada sin cambios ({estado}): {self.url}")
+                    return set()
+                enlaces = self._enlaces_desde_html(response.content, limite)
+                # Solo con los enlaces ya sacados: si algo falla, la próxima vez se vuelve a leer
+                self.fetch_metadata.record(self.url, response, body_hash, "homepage")
+                return enlaces
+            response = fetch(http, limiter, self.url)
             response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
-            enlaces = set()
-            for a_tag in soup.find_all('a', href=True):
-                enlace = urljoin(self.url, a_tag['href'])
-                if enlace.startswith("http"):
-                    enlaces.add(enlace)
-                if limite and len(enlaces) >= limite:
-                    break
-            # print(f"Se encontraron {len(enlaces)} enlaces en la página principal (límite: {limite}).")
-            return enlaces
+            return self._enlaces_desde_html(response.content, limite)
         except Exception as e:
             print(f"Error al procesar la página principal: {self.url} - {e}")
             return set()
 
+    def extraer_enlaces_feeds(self, session=None, limiter=None):
+        """
+        Descubre noticias en los feeds RSS/Atom y sitemaps del periódico (ver feed_discovery).
+        :return: Diccionario url -> {"titulo", "fecha_publicacion"} con las entradas nuevas,
+                 o None si el periódico no tiene feeds o fallaron todos (usar la portada).
+        """
+        if not self.feeds:
+            return None
+        discovery = FeedDiscovery(self.fetch_metadata, session if session is not None else requests, limiter)
+        # La marca de agua de los feeds se avanza en confirmar_descubrimiento()
+        self._feed_discovery = discovery
+        entradas = {}
+        fallidos = 0
+        for feed_url in self.feeds:
+            try:
+                entradas.update(discovery.discover(feed_url))
+            except Exception as e:
+                fallidos += 1
+                print(f"Error al leer el feed: {feed_url} - {e}")
+        if fallidos == len(self.feeds):
+            return None
+        return entradas
+
+    def descubrir_enlaces(self, limite=None, session=None, limiter=None) -> dict:
+        """
+        Enlaces de noticias nuevas del periódico: por feeds si los tiene, si no por la portada.
+        :return: Diccionario url -> pistas conocidas ({"titulo", "fecha_publicacion"} o {}).
+        """
+        entradas = self.extraer_enlaces_feeds(session=session, limiter=limiter)
+        if entradas is not None:
+            nuevos = self.filtrar_enlaces_noticias(entradas.keys(), solo_descartar=True)
+            return {url: entradas[url] for url in nuevos}
+        enlaces = self.extraer_enlaces(limite=limite, session=session, limiter=limiter, condicional=True)
+        return {url: {} for url in self.filtrar_enlaces_noticias(enlaces)}
+
+    def confirmar_descubrimiento(self, fallidas=()):
+        """
+        Avanza la marca de agua de los feeds del último descubrir_enlaces() una vez descargadas
+        (o encoladas) sus noticias; las URL de `fallidas` se volverán a descubrir.
+        """
+        discovery, self._feed_discovery = self._feed_discovery, None
+        if discovery is not None:
+            discovery.confirmar(fallidas)
+
+    def _enlaces_desde_html(self, html, limite=None) -> set:
+        if self.modo_rapido:
+            return fast_extract.extraer_enlaces(html, self.url, limite)
+        soup = BeautifulSoup(html, 'html.parser')
+        enlaces = set()
+        for a_tag in soup.find_all('a', href=True):
+            enlace = urljoin(self.url, a_tag['href'])
+            if enlace.startswith("http"):
+                enlaces.add(enlace)
+            if limite and len(enlaces) >= limite:
+                break
+        # print(f"Se encontraron {len(enlaces)} enlaces en la página principal (límite: {limite}).")
+        return enlaces
+
+    def revisar_noticias_conocidas(self, limite=None, session=None, limiter=None, io_pool=None, parse_pool=None) -> dict:
+        """
+        Vuelve a pedir (con GET condicional) las noticias más recientes ya guardadas de este
+        periódico. Solo se parsean (en parse_pool) las que devuelven un cuerpo distinto, con el
+        mismo extractor con el que se guardó la noticia para no confundir las diferencias entre
+        extractores con cambios; si el texto extraído cambia se actualiza la noticia y, si ya
+        estaba analizada, se encola un re-análisis. El hash nuevo del cuerpo se guarda al final:
+        si el parseo o la escritura fallan, la próxima revisión la vuelve a ver como cambiada.
+        :param limite: Número máximo de noticias a revisar (por defecto CRAWL_REVISIT_LIMIT).
+        :return: Contadores {"revisadas", "sin_cambios", "actualizadas", "reanalisis"}.
+        """
+        limite = CRAWL_REVISIT_LIMIT if limite is None else limite
+        contadores = {"revisadas": 0, "sin_cambios": 0, "actualizadas": 0, "reanalisis": 0}
+        if limite <= 0:
+            return contadores
+
+        collection = self.db.get_collection('Noticias')
+        conocidas = list(
+            collection.find({"fuente": self.nombre}, {"url": 1, "cuerpo": 1, "puntuacion": 1, "extraccion": 1})
+            .sort("fecha_extraccion", -1)
+            .limit(limite)
+        )
+        http = session if session is not None else requests
+
+        def revisar(doc):
+            estado, response, body_hash = self.fetch_metadata.fetch_conditional(
+                http, doc["url"], "article", limiter=limiter, fetcher=fetch
+            )
+            if estado != "changed":
+                return doc, None, None, None
+            html = texto_html(response)
+            self._cachear_html(doc["url"], html)
+            return doc, html, response, body_hash
+
+        own_io_pool = io_pool is None
+        own_parse_pool = parse_pool is None
+        io_pool = io_pool or ThreadPoolExecutor(max_workers=min(CRAWL_MAX_WORKERS, max(1, len(conocidas))))
+        parse_pool = parse_pool or ProcessPoolExecutor(max_workers=CRAWL_PARSE_PROCESSES)
+        try:
+            parse_futures = {}
+            for future in as_completed([io_pool.submit(revisar, doc) for doc in conocidas]):
+                try:
+                    doc, html, response, body_hash = future.result()
+                except Exception as e:
+                    print(f"Error al revisar noticia conocida: {e}")
+                    continue
+                contadores["revisadas"] += 1
+                if response is None:
+                    contadores["sin_cambios"] += 1
+                    continue
+                rapido = doc.get("extraccion") == "rapida"
+                parse_futures[parse_pool.submit(
+                    _parsear_html_articulo, doc["url"], html, rapido, self.con_imagenes
+                )] = (doc, response, body_hash)
+
+            for future in as_completed(parse_futures):
+                doc, response, body_hash = parse_futures[future]
+                try:
+                    campos = future.result()
+                except Exception as e:
+                    print(f"Error al procesar la URL: {doc['url']} - {e}")
+                    continue
+                if not campos.get("cuerpo") or campos["cuerpo"] == doc.get("cuerpo"):
+                    contadores["sin_cambios"] += 1
+                    self.fetch_metadata.record(doc["url"], response, body_hash, "article")
+                    continue
+
+                collection.update_one(
+                    {"_id": doc["_id"]},
+                    {"$set": {
+                        "titulo": campos["titulo"],
+                        "cuerpo": campos["cuerpo"],
+                        "fecha_publicacion": campos["fecha_publicacion"],
+                        "autor": campos["autor"],
+                        "fecha_actualizacion": Utils.obtener_fecha_hora_actual_iso(),
+                    }},
+                )
+                contadores["actualizadas"] += 1
+                if doc.get("puntuacion") not in (None, '', -1):
+                    self.fetch_metadata.enqueue_reanalysis(doc["_id"], doc["url"])
+                    contadores["reanalisis"] += 1
+                    print(f"Noticia analizada con cambios, re-análisis encolado: {doc['url']}")
+                self.fetch_metadata.record(doc["url"], response, body_hash, "article")
+        finally:
+            if own_io_pool:
+                io_pool.shutdown(wait=True)
+            if own_parse_pool:
+                parse_pool.shutdown(wait=True)
+        return contadores
+
     # Función principal para procesar todas las noticias de un periódico
     def procesar_periodico(self, limite_enlaces=None) -> None:
         """
@@ -168,12 +632,160 @@ class Periodico:
         for enlace in enlaces_noticias:
             noticia = self.extraer_noticia(enlace)
             self.guardar_noticia(noticia)
+        self._guardar_indice_urls()
 
+    def procesar_periodico_concurrente(self, limite_enlaces=None, session=None, limiter=None, io_pool=None, parse_pool=None) -> int:
+        """
+        Variante concurrente de procesar_periodico: descarga en paralelo con una sesión
+        compartida y límites por host, y parsea en un pool de procesos.
+        :param limite_enlaces: Límite opcional de enlaces a extraer.
+        :return: Número de noticias extraídas.
+        """
+        own_session = session is None
+        session = session or build_session()
+        limiter = limiter or HostLimiter()
+        try:
+            enlaces_noticias = self.descubrir_enlaces(limite=limite_enlaces, session=session, limiter=limiter)
+            noticias = self.extraer_noticias_concurrente(
+                enlaces_noticias, session, limiter=limiter, io_pool=io_pool, parse_pool=parse_pool
+            )
+            for noticia in noticias:
+                self.completar_con_pistas(noticia, enlaces_noticias.get(noticia["url"]))
+            fallidas = set(enlaces_noticias) - {noticia["url"] for noticia in noticias}
+            for inicio in range(0, len(noticias), max(1, CRAWL_BATCH_SIZE)):
+                fallidas.update(self.guardar_noticias(noticias[inicio:inicio + CRAWL_BATCH_SIZE])["fallidas"])
+            self.confirmar_descubrimiento(fallidas)
+            revision = self.revisar_noticias_conocidas(
+                session=session, limiter=limiter, io_pool=io_pool, parse_pool=parse_pool
+            )
+            if revision["actualizadas"]:
+                print(f"{self.nombre}: {revision['actualizadas']} noticias actualizadas, {revision['reanalisis']} re-análisis encolados")
+            return len(noticias)
+        finally:
+            self._guardar_indice_urls()
+            if own_session:
+                session.close()
+
+
+def procesar_periodicos_concurrente(periodicos, limite_enlaces=200, max_workers=None) -> dict:
+    """
+    Procesa varios periódicos en una sola ejecución compartiendo sesión HTTP,
+    límites por host y pools de descarga/parseo.
+    :param periodicos: Diccionario nombre -> URL de la portada.
+    :return: Diccionario nombre -> número de noticias extraídas (None si falló).
+    """
+    max_workers = max_workers or CRAWL_MAX_WORKERS
+    session = build_session(pool_size=max_workers)
+    limiter = HostLimiter()
+    resultados = {}
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as io_pool, \
+                ProcessPoolExecutor(max_workers=CRAWL_PARSE_PROCESSES) as parse_pool, \
+                ThreadPoolExecutor(max_workers=CRAWL_MAX_NEWSPAPERS_IN_PARALLEL) as periodicos_pool:
+            futures = {}
+            for nombre, url in periodicos.items():
+                periodico = Periodico(nombre, url)
+                futures[periodicos_pool.submit(
+                    periodico.procesar_periodico_concurrente,
+                    limite_enlaces,
+                    session,
+                    limiter,
+                    io_pool,
+                    parse_pool,
+                )] = nombre
+            for future in as_completed(futures):
+                nombre = futures[future]
+                try:
+                    resultados[nombre] = future.result()
+                    print(f"Periódico procesado: {nombre} ({resultados[nombre]} noticias)")
+                except Exception as e:
+                    resultados[nombre] = None
+                    print(f"Error al procesar el periódico {nombre}: {e}")
+    finally:
+        session.close()
+    return resultados
+
+
+def reparsear_desde_cache(limite=None, batch_size=None, rapido=None) -> dict:
+    """
+    Regenera título, cuerpo y metadatos de las noticias a partir del HTML en caché,
+    sin acceso a la red. Solo actualiza noticias que ya existen (por `url`) y solo con los
+    campos que el extractor llegó a sacar: las listas vacías del modo rápido o un "Sin
+    contenido" no borran lo guardado. Si cambia el cuerpo de una noticia ya analizada se
+    encola su re-análisis, como en revisar_noticias_conocidas.
+    :param limite: Número máximo de entradas de caché a procesar.
+    :param rapido: Usar la extracción rápida (por defecto CRAWL_FAST_EXTRACT).
+    :return: Contadores {"parseadas", "actualizadas", "reanalisis", "errores"}.
+    """
+    load_dotenv()
+    batch_size = max(1, batch_size or CRAWL_BATCH_SIZE)
+    rapido = CRAWL_FAST_EXTRACT if rapido is None else rapido
+    mongodb_uri = os.getenv('NEW_MONGODB_URI') or os.getenv('MONGODB_URI')
+    db = MongoDBService(uri=mongodb_uri, db_name='Base_de_datos_noticias', workload="bulk")
+    collection = db.get_collection('Noticias')
+    cache = HtmlCache.shared()
+    fetch_metadata = FetchMetadataStore(db.db)
+    contadores = {"parseadas": 0, "actualizadas": 0, "reanalisis": 0, "errores": 0}
 
+    def procesar_lote(parse_pool, lote):
+        ops = []
+        reanalisis = []
+        fecha_reparseo = Utils.obtener_fecha_hora_actual_iso()
+        guardadas = {
+            doc["url"]: doc
+            for doc in collection.find({"url": {"$in": [url for url, _html in lote]}}, {"url": 1, "cuerpo": 1, "puntuacion": 1})
+        }
+        futures = [
+            parse_pool.submit(_parsear_html_articulo, url, html, rapido, CRAWL_FAST_EXTRACT_IMAGES)
+            for url, html in lote
+        ]
+        for future in as_completed(futures):
+            try:
+                campos = future.result()
+            except Exception as e:
+                contadores["errores"] += 1
+                print(f"Error al re-parsear desde caché: {e}")
+                continue
+            contadores["parseadas"] += 1
+            url = campos.pop("url")
+            guardada = guardadas.get(url)
+            if guardada is None:
+                continue
+            campos = {
+                campo: valor for campo, valor in campos.items()
+                if valor not in (None, [], "", "Sin título", "Sin contenido")
+            }
+            campos["fecha_reparseo"] = fecha_reparseo
+            ops.append(UpdateOne({"_id": guardada["_id"]}, {"$set": campos}))
+            if (campos.get("cuerpo", guardada.get("cuerpo")) != guardada.get("cuerpo")
+                    and guardada.get("puntuacion") not in (None, '', -1)):
+                reanalisis.append(guardada)
+        if ops:
+            contadores["actualizadas"] += collection.bulk_write(ops, ordered=False).modified_count
+        for guardada in reanalisis:
+            fetch_metadata.enqueue_reanalysis(guardada["_id"], guardada["url"])
+            contadores["reanalisis"] += 1
+
+    try:
+        # Por lotes, para no cargar toda la caché en memoria
+        with ProcessPoolExecutor(max_workers=CRAWL_PARSE_PROCESSES) as parse_pool:
+            lote = []
+            for i, entrada in enumerate(cache.iter_entries()):
+                if limite is not None and i >= limite:
+                    break
+                lote.append(entrada)
+                if len(lote) >= batch_size:
+                    procesar_lote(parse_pool, lote)
+                    lote = []
+            if lote:
+                procesar_lote(parse_pool, lote)
+    finally:
+        db.close()
+    return contadores
 
 
 # Menú interactivo
-def menu_principal():
+def menu_principal(concurrente=False):
 
 
     periodico = Periodico('BBC', 'https://www.bbc.com/')
@@ -197,6 +809,10 @@ def menu_principal():
         'ABC': 'https://www.abc.es/'
     }
 
+    if concurrente:
+        procesar_periodicos_concurrente(periodicos, limite_enlaces=200)
+        return
+
     for nombre, url in periodicos.items():
         print(f"Procesando periódico: {nombre}")
         periodico = Periodico(nombre, url)
@@ -223,7 +839,15 @@ def menu_principal():
     #     print("Opción no válida. Intente nuevamente.")
 # Ejecutar menú principal
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
+    if len(sys.argv) > 1 and sys.argv[1] == "--concurrente":
+        # Modo batch concurrente (todas las portadas en una ejecución)
+        menu_principal(concurrente=True)
+    elif len(sys.argv) > 1 and sys.argv[1] == "--reparse":
+        # Re-extracción sin red desde la caché HTML: Periodico.py --reparse [limite]
+        limite_arg = int(sys.argv[2]) if len(sys.argv) > 2 else None
+        resultado = reparsear_desde_cache(limite=limite_arg)
+        print(f"Re-parseo desde caché: {resultado}")
+    elif len(sys.argv) > 1:
         # Modo single-url
         url_arg = sys.argv[1]
         print(f"Modo de extracción individual para URL: {url_arg}")
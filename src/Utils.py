@@ -1254,10 +1254,10 @@ Responde únicamente con el número, sin texto adicional.
     ):
         import time
         from bson import ObjectId
-        from pymongo import MongoClient
         from datetime import datetime, timedelta
-        read_client = MongoClient(read_mongo_uri)
-        read_col = read_client[db_name][collection_name]
+        import mongo_clients
+        # Clients compartidos: el escaneo de embeddings tolera leer de un secundario
+        read_col = mongo_clients.get_collection(read_mongo_uri, db_name, collection_name, workload="read")
         noticia = read_col.find_one({'_id': ObjectId(noticia_id)})
         if not noticia or 'embedding' not in noticia:
             print('Noticia no encontrada o sin embedding.')
@@ -1296,8 +1296,7 @@ Responde únicamente con el número, sin texto adicional.
         fake_news_docs = []
         fake_news_texts = []
         fake_news_meta = []  # Para asociar cada texto a su noticia original y título
-        write_client = MongoClient(write_mongo_uri)
-        write_col = write_client[db_name][collection_name]
+        write_col = mongo_clients.get_collection(write_mongo_uri, db_name, collection_name, workload="pipeline")
         for doc in grupo:
             cuerpo = doc.get('cuerpo', '')
             titulo = doc.get('titulo', '')
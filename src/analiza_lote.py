@@ -0,0 +1,324 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+analiza_lote.py: el pipeline de analiza_y_guarda.py para muchas noticias a la vez.
+
+Cada noticia pasa por las mismas etapas (análisis de Hemingwai, fact-checking, PDF y subida
+a MEGA) en su propio directorio de trabajo (workspace.py), pero sin arrancar un intérprete
+por noticia y etapa:
+
+- Análisis: pool de BATCH_ANALYSIS_WORKERS procesos que importan Hemingwai una vez y
+  reutilizan sus clientes (Mongo, Anthropic) de una noticia a otra.
+- Fact-checking: con FACT_CHECK_OVERLAP lo hace el propio análisis, en paralelo con él; si no,
+  un pool de BATCH_FACT_CHECK_WORKERS procesos que llaman a fact_check_perplexity en proceso
+  (fact_checking_wrapper.run_fact_check_in_process).
+- PDF: el .tex se renderiza en este proceso con el entorno Jinja compartido y se compila en un
+  pool de BATCH_RENDER_WORKERS procesos (render_batch.compile_item), con el formato del
+  preámbulo y el almacén de artefactos.
+- Subida: BATCH_UPLOAD_WORKERS hilos sobre una única sesión de mega-cmd, o a la cola de
+  mega_uploader.py con MEGA_UPLOAD_MODE=queue.
+
+Una noticia pasa a la etapa siguiente en cuanto termina la anterior, así que las etapas se
+solapan. La salida del análisis y del fact-check de cada noticia queda en analisis.log y
+fact_check.log de su directorio de trabajo; al final se imprime un resumen por noticia.
+
+Uso:
+  python analiza_lote.py ID [ID ...]
+  python analiza_lote.py --ids-file ids.txt --analysis-workers 4 --render-workers 8
+  python analiza_lote.py --from-reanalysis-queue   (noticias que cambiaron tras analizarse)
+  cat ids.txt | python analiza_y_guarda.py --ids-file - --json
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+
+from bson import ObjectId
+from dotenv import load_dotenv
+
+# Antes de los módulos locales: MEGA_UPLOAD_MODE, PDF_ARTIFACTS_ENABLED, FACT_CHECK_OVERLAP y las
+# BATCH_* se leen al importarlos (y los procesos hijos del pool vuelven a importar este módulo)
+load_dotenv(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".env"))
+
+from env_config import get_env_bool, get_env_int
+from fact_checking_wrapper import run_fact_check_in_process, run_fact_checking
+from fetch_metadata import FetchMetadataStore
+from mega_cmd import MegaSession
+from mega_uploader import MEGA_FOLDER_PATH, MEGA_UPLOAD_MODE, enqueue_upload, news_collection, queue_collection
+from pdf_artifacts import PDF_ARTIFACTS_ENABLED, PdfArtifactStore
+from render_batch import compile_item, fetch_news_items, read_ids, render_item, reuse_artifact
+from render_latex import prepare_preamble_format
+from workspace import cleanup_old_workspaces, create_workspace
+
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SRC_DIR)
+BATCH_ANALYSIS_WORKERS = get_env_int("BATCH_ANALYSIS_WORKERS", 2)
+BATCH_FACT_CHECK_WORKERS = get_env_int("BATCH_FACT_CHECK_WORKERS", 4)
+BATCH_RENDER_WORKERS = get_env_int("BATCH_RENDER_WORKERS", os.cpu_count() or 2)
+BATCH_UPLOAD_WORKERS = get_env_int("BATCH_UPLOAD_WORKERS", 3)
+ENABLE_FACT_CHECKING = get_env_bool(
+    "ENABLE_FACT_CHECKING",
+    get_env_bool("FEATURE_ENABLE_PERPLEXITY", True),
+)
+CAMPOS_CLAVE = ("puntuacion", "texto_referencia", "valoracion_general")
+_OBJECT_ID_RE = re.compile(r"^[a-fA-F0-9]{24}$")
+
+
+def _analysis_job(noticia_id, run_id, workspace):
+    """Trabajo del pool de análisis: Hemingwai sobre una noticia, con su salida en analisis.log."""
+    started = time.monotonic()
+    with open(os.path.join(workspace, "analisis.log"), "w", encoding="utf-8") as log, \
+            contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        import Hemingwai
+
+        analizada = Hemingwai.procesar_noticias(noticia_id, run_id=run_id, output_dir=workspace)
+    outcome = {"ok": analizada == noticia_id, "seconds": round(time.monotonic() - started, 2), "fact_check": None}
+    try:
+        # Con FACT_CHECK_OVERLAP el fact-check se hizo durante el análisis y ya está guardado
+        with open(os.path.join(workspace, "fact_check_analisis.json"), "r", encoding="utf-8") as f:
+            artifact = json.load(f)
+        outcome["fact_check"] = {"status": artifact.get("status"), "reason": artifact.get("reason"), "seconds": 0}
+    except (OSError, ValueError):
+        pass
+    return outcome
+
+
+def _fact_check_job(noticia_id, workspace, enable_fact_checking):
+    """Trabajo del pool de fact-checking; como en analiza_y_guarda.py, nunca hace fallar la noticia."""
+    started = time.monotonic()
+    with open(os.path.join(workspace, "fact_check.log"), "w", encoding="utf-8") as log, \
+            contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        try:
+            block = run_fact_checking(
+                {
+                    "noticia_id": noticia_id,
+                    "output_dir": workspace,
+                    "src_dir": SRC_DIR,
+                    "executor": run_fact_check_in_process,
+                    "enable_fact_checking": enable_fact_checking,
+                }
+            ).get("fact_checking") or {}
+        except Exception as e:
+            print(f"Warning: fact-checking wrapper error ({type(e).__name__}). Continuando.")
+            block = {"status": "unavailable", "reason": "wrapper_error"}
+    return {"status": block.get("status"), "reason": block.get("reason"), "seconds": round(time.monotonic() - started, 2)}
+
+
+def _render(noticia_id, workspace, collection):
+    """Lee la noticia analizada y renderiza su .tex en el directorio de trabajo; (tex, hash, PDF reutilizado o None)."""
+    _id, news_item, error = next(fetch_news_items(collection, [noticia_id]))
+    if error:
+        raise RuntimeError(error)
+    vacios = [campo for campo in CAMPOS_CLAVE if not news_item.get(campo)]
+    if vacios:
+        raise RuntimeError(f"campos vacíos tras el análisis: {', '.join(vacios)}")
+    tex_path, tex_sha256 = render_item(news_item, workspace)
+    return tex_path, tex_sha256, reuse_artifact(noticia_id, tex_path, tex_sha256)
+
+
+def _upload_job(noticia_id, pdf_path, tex_sha256, session, store, news):
+    """Publica el PDF (o reutiliza su enlace) y anota pipeline.steps.pdf como render_latex.py."""
+    meta = store.get(tex_sha256) if store else None
+    link = store.link_for(meta, MEGA_FOLDER_PATH) if store else None
+    outcome = {"upload": "reused", "link": link}
+    if link is None and session is None:
+        job = enqueue_upload(queue_collection(), pdf_path, noticia_id, MEGA_FOLDER_PATH, job_id=tex_sha256)
+        if job.get("status") == "done":
+            outcome = {"upload": "reused", "link": job.get("link")}
+        else:
+            outcome = {"upload": "queued", "upload_job": job["_id"]}
+    elif link is None:
+        outcome = {"upload": "done", "link": session.upload(pdf_path, MEGA_FOLDER_PATH)}
+        if meta:
+            try:
+                store.record_link(tex_sha256, outcome["link"], MEGA_FOLDER_PATH)
+            except OSError as e:
+                print(f"Advertencia: no se pudo anotar el enlace en el almacén de artefactos: {e}")
+
+    step = {
+        "ok": True,
+        "at": datetime.now(timezone.utc).isoformat(),
+        "artifact": pdf_path,
+        "tex_sha256": tex_sha256,
+    }
+    if outcome.get("link"):
+        step.update({"reused": outcome["upload"] == "reused", "mega_link": outcome["link"]})
+    else:
+        step.update({"upload": "queued", "upload_job": outcome["upload_job"]})
+    news.update_one({"_id": ObjectId(noticia_id)}, {"$set": {"pipeline.status": "pdf_generated", "pipeline.steps.pdf": step}})
+    return outcome
+
+
+def _finish(state, error=None):
+    result = {key: value for key, value in state.items() if key != "started"}
+    result["ok"] = error is None
+    if error:
+        result["error"] = error
+    result["seconds"] = round(time.monotonic() - state["started"], 2)
+    return result
+
+
+def analiza_lote(ids, analysis_workers=None, fact_check_workers=None, render_workers=None, upload_workers=None,
+                 enable_fact_checking=None):
+    """
+    Lleva `ids` por análisis, fact-checking, PDF y subida, y va devolviendo un resultado por
+    noticia según terminan. Un fallo en una etapa cierra esa noticia sin afectar a las demás.
+    """
+    enable_fact_checking = ENABLE_FACT_CHECKING if enable_fact_checking is None else enable_fact_checking
+    timeout_sec = int(os.getenv("LATEX_BUILD_TIMEOUT", "60"))
+    news = news_collection()
+    store = PdfArtifactStore.shared() if PDF_ARTIFACTS_ENABLED else None
+    session = None
+    if MEGA_UPLOAD_MODE != "queue":
+        if not (os.getenv("MEGA_EMAIL") and os.getenv("MEGA_PASSWORD")):
+            raise RuntimeError("Faltan MEGA_EMAIL/MEGA_PASSWORD en el .env (o usa MEGA_UPLOAD_MODE=queue)")
+        session = MegaSession(os.getenv("MEGA_EMAIL"), os.getenv("MEGA_PASSWORD"))
+
+    # spawn: los procesos no heredan los MongoClient de este (no son seguros tras un fork)
+    ctx = multiprocessing.get_context("spawn")
+    pending = {}
+    format_ready = False
+    with ProcessPoolExecutor(max(1, analysis_workers or BATCH_ANALYSIS_WORKERS), mp_context=ctx) as analysis_pool, \
+            ProcessPoolExecutor(max(1, fact_check_workers or BATCH_FACT_CHECK_WORKERS), mp_context=ctx) as fact_check_pool, \
+            ProcessPoolExecutor(max(1, render_workers or BATCH_RENDER_WORKERS), mp_context=ctx) as render_pool, \
+            ThreadPoolExecutor(max(1, upload_workers or BATCH_UPLOAD_WORKERS)) as upload_pool:
+        for noticia_id in ids:
+            state = {"id": noticia_id, "started": time.monotonic()}
+            if not _OBJECT_ID_RE.match(noticia_id):
+                yield _finish(state, "id_invalido")
+                continue
+            state["run_id"], state["workspace"] = create_workspace()
+            pending[analysis_pool.submit(_analysis_job, noticia_id, state["run_id"], state["workspace"])] = ("analysis", state)
+
+        while pending:
+            done, _not_done = wait(list(pending), return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, state = pending.pop(future)
+                noticia_id = state["id"]
+                try:
+                    outcome = future.result()
+                except Exception as e:
+                    yield _finish(state, f"{stage}: {type(e).__name__}: {e}")
+                    continue
+
+                if stage == "analysis":
+                    state["analysis_s"] = outcome["seconds"]
+                    if not outcome["ok"]:
+                        yield _finish(state, "analysis: la noticia no se analizó (ver analisis.log)")
+                        continue
+                    if outcome["fact_check"] is None:
+                        pending[fact_check_pool.submit(_fact_check_job, noticia_id, state["workspace"], enable_fact_checking)] = ("fact_check", state)
+                        continue
+                    stage, outcome = "fact_check", outcome["fact_check"]
+
+                if stage == "fact_check":
+                    state["fact_check"] = f"{outcome['status']}/{outcome['reason']}"
+                    state["fact_check_s"] = outcome["seconds"]
+                    try:
+                        tex_path, tex_sha256, reused = _render(noticia_id, state["workspace"], news)
+                    except Exception as e:
+                        yield _finish(state, f"render: {type(e).__name__}: {e}")
+                        continue
+                    state["tex_sha256"] = tex_sha256
+                    if reused is not None:
+                        state.update({"pdf": reused["pdf"], "cached": True})
+                        pending[upload_pool.submit(_upload_job, noticia_id, reused["pdf"], tex_sha256, session, store, news)] = ("upload", state)
+                        continue
+                    if not format_ready:
+                        # El formato del preámbulo se construye una vez antes de repartir las compilaciones
+                        prepare_preamble_format(tex_path, timeout_sec)
+                        format_ready = True
+                    pending[render_pool.submit(compile_item, noticia_id, tex_path, tex_sha256, timeout_sec)] = ("render", state)
+
+                elif stage == "render":
+                    state["compile_ms"] = outcome["compile_ms"]
+                    if not outcome["ok"]:
+                        yield _finish(state, f"render: {outcome.get('error')}")
+                        continue
+                    state.update({"pdf": outcome["pdf"], "cached": False})
+                    pending[upload_pool.submit(_upload_job, noticia_id, outcome["pdf"], state["tex_sha256"], session, store, news)] = ("upload", state)
+
+                else:
+                    state.update(outcome)
+                    yield _finish(state)
+
+
+def _print_report(results):
+    print(f"{'noticia':<26}{'estado':<8}{'fact-check':<34}{'pdf':<10}{'subida':<9}{'s':>8}  detalle")
+    for r in results:
+        pdf = ("caché" if r.get("cached") else f"{r['compile_ms']}ms") if r.get("pdf") else "-"
+        detalle = r.get("error") or r.get("link") or (f"trabajo {r['upload_job'][:12]}" if r.get("upload_job") else "")
+        print(
+            f"{r['id']:<26}{'ok' if r['ok'] else 'error':<8}{r.get('fact_check') or '-':<34}{pdf:<10}"
+            f"{r.get('upload') or '-':<9}{r['seconds']:>8}  {detalle}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analiza, verifica y publica en lote una lista de noticias.")
+    parser.add_argument("ids", nargs="*", help="IDs de noticia (ObjectId).")
+    parser.add_argument("--ids-file", metavar="FICHERO", help="Fichero con un ID por línea ('-' para stdin).")
+    parser.add_argument("--analysis-workers", type=int, default=None, help="Análisis simultáneos (BATCH_ANALYSIS_WORKERS).")
+    parser.add_argument("--fact-check-workers", type=int, default=None, help="Fact-checks simultáneos (BATCH_FACT_CHECK_WORKERS).")
+    parser.add_argument("--render-workers", type=int, default=None, help="Compilaciones pdflatex simultáneas (BATCH_RENDER_WORKERS).")
+    parser.add_argument("--upload-workers", type=int, default=None, help="Subidas simultáneas a MEGA (BATCH_UPLOAD_WORKERS).")
+    parser.add_argument("--json", action="store_true", help="Un resultado NDJSON por noticia en lugar de la tabla final.")
+    parser.add_argument(
+        "--from-reanalysis-queue", action="store_true",
+        help="Añade las noticias pendientes de reanalysis_queue (las que cambiaron tras analizarse).",
+    )
+    args = parser.parse_args(argv)
+
+    ids = read_ids(args.ids, args.ids_file)
+    reanalysis, reanalysis_ids = None, {}
+    if args.from_reanalysis_queue:
+        reanalysis = FetchMetadataStore(news_collection().database)
+        reanalysis_ids = {str(noticia_id): noticia_id for noticia_id in reanalysis.claim_reanalysis()}
+        ids += [noticia_id for noticia_id in reanalysis_ids if noticia_id not in ids]
+    if not ids:
+        if args.from_reanalysis_queue:
+            print("No hay re-análisis pendientes", file=sys.stderr)
+            return 0
+        parser.error("Indica al menos un ID (argumentos o --ids-file)")
+
+    removed = cleanup_old_workspaces()
+    if removed:
+        print(f"Eliminados {removed} directorios de trabajo antiguos", file=sys.stderr)
+
+    started = time.monotonic()
+    results = []
+    try:
+        for result in analiza_lote(ids, args.analysis_workers, args.fact_check_workers, args.render_workers, args.upload_workers):
+            results.append(result)
+            if result["id"] in reanalysis_ids:
+                reanalysis.complete_reanalysis(reanalysis_ids.pop(result["id"]), result.get("error"))
+            if args.json:
+                print(json.dumps(result, ensure_ascii=False), flush=True)
+            else:
+                print(f"[{len(results)}/{len(ids)}] {result['id']} {'ok' if result['ok'] else 'error'}", file=sys.stderr, flush=True)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+    finally:
+        # Lo que no llegó a terminar vuelve a la cola
+        for noticia_id in reanalysis_ids.values():
+            reanalysis.release_reanalysis(noticia_id)
+
+    if not args.json:
+        orden = {noticia_id: i for i, noticia_id in enumerate(ids)}
+        _print_report(sorted(results, key=lambda r: orden.get(r["id"], 0)))
+    ok = sum(1 for r in results if r["ok"])
+    summary = {"ok": ok, "errors": len(results) - ok, "seconds": round(time.monotonic() - started, 2)}
+    print(json.dumps({"summary": summary}, ensure_ascii=False), file=sys.stderr)
+    return 0 if summary["errors"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,6 +5,7 @@ import sys
 import json
 from env_config import get_env_bool, get_env_int
 from fact_checking_wrapper import run_fact_checking
+from workspace import RUN_ID_ENV, cleanup_old_workspaces, create_workspace, workspaces_root
 
 
 # Definir directorios base para que el script sea robusto
@@ -20,8 +21,6 @@ def _resolve_path(path_value, default_path):
 
 
 # Construir rutas basadas en los directorios base
-OUTPUT_DIR = _resolve_path(os.getenv("PATH_OUTPUT_DIR"), os.path.join(ROOT_DIR, "output_temporal"))
-RETRIEVED_FILE = _resolve_path(os.getenv("PATH_RETRIEVED_FILE"), os.path.join(OUTPUT_DIR, "retrieved_news_item.txt"))
 VENV_DIR = _resolve_path(os.getenv("PATH_VENV_DIR"), os.path.join(ROOT_DIR, ".venv"))
 VENV_PYTHON = os.path.join(VENV_DIR, "bin", "python")
 SUBPROCESS_TIMEOUT_SECONDS = get_env_int("PATH_SUBPROCESS_TIMEOUT_SECONDS", 0)
@@ -30,22 +29,29 @@ ENABLE_FACT_CHECKING = get_env_bool(
     get_env_bool("FEATURE_ENABLE_PERPLEXITY", True),
 )
 
-# --- Preparar directorio de salida ---
-if not os.path.exists(OUTPUT_DIR):
-    os.makedirs(OUTPUT_DIR)
-else:
-    # Limpiar el directorio para asegurar que solo contiene artefactos de esta ejecución
-    print(f"Limpiando directorio: {OUTPUT_DIR}")
-    for f in os.listdir(OUTPUT_DIR):
-        try:
-            os.remove(os.path.join(OUTPUT_DIR, f))
-        except Exception as e:
-            print(f"No se pudo eliminar {f}: {e}")
+# --- Modo lote: varias noticias (argumentos o --ids-file) las procesa analiza_lote.py ---
+# Con el mismo intérprete del venv que los demás pasos, no con el que lanzó este script
+if len(sys.argv) > 2 or "--ids-file" in sys.argv[1:]:
+    os.execv(VENV_PYTHON, [VENV_PYTHON, os.path.join(SRC_DIR, "analiza_lote.py")] + sys.argv[1:])
+
+# --- Preparar directorio de trabajo de esta ejecución ---
+# Cada ejecución escribe en <PATH_OUTPUT_DIR>/runs/<run_id>/, así que varias pueden convivir;
+# en vez de vaciar una carpeta compartida se borran los directorios de ejecuciones antiguas.
+RUN_ID, OUTPUT_DIR = create_workspace()
+RETRIEVED_FILE = os.path.join(OUTPUT_DIR, "retrieved_news_item.txt")
+removed = cleanup_old_workspaces(keep=(RUN_ID,))
+if removed:
+    print(f"Eliminados {removed} directorios de trabajo antiguos de {workspaces_root()}")
+print(f"Directorio de trabajo: {OUTPUT_DIR}")
 
 # --- Configuración del entorno para subprocesos ---
 env_utf8 = os.environ.copy()
 env_utf8["LC_ALL"] = "C.UTF-8"
 env_utf8["LANG"] = "C.UTF-8"
+# Hemingwai guarda este run_id en pipeline.run_id: el documento apunta a su directorio de trabajo
+env_utf8[RUN_ID_ENV] = RUN_ID
+# Con FACT_CHECK_OVERLAP, Hemingwai deja aquí el fact-check que hace durante el análisis
+env_utf8["PIPELINE_OUTPUT_DIR"] = OUTPUT_DIR
 
 # --- 1. Ejecutar Hemingwai.py y capturar el ID de la noticia procesada ---
 
@@ -88,7 +94,7 @@ print(f"ID de la noticia procesada: {noticia_id}")
 # 2. Ejecutar fetch_news_item.py con ese ID
 print("Extrayendo noticia procesada...")
 proc2 = subprocess.run([
-    VENV_PYTHON, "fetch_news_item.py", noticia_id
+    VENV_PYTHON, "fetch_news_item.py", noticia_id, "--output-dir", OUTPUT_DIR
 ], cwd=SRC_DIR, capture_output=True, text=False, env=env_utf8, timeout=(SUBPROCESS_TIMEOUT_SECONDS if SUBPROCESS_TIMEOUT_SECONDS > 0 else None))
 out2 = (proc2.stdout or b"") + (proc2.stderr or b"")
 try:
@@ -111,48 +117,58 @@ for campo in CAMPOS_CLAVE:
         sys.exit(1)
 print("Todos los campos clave están presentes en la noticia extraída.")
 
-# 3. Ejecutar fact-checking robusto (nunca tumba el pipeline)
-print("Ejecutando paso de fact-checking...")
-try:
-    fact_check_exec = run_fact_checking(
-        {
-            "noticia_id": noticia_id,
-            "output_dir": OUTPUT_DIR,
-            "src_dir": SRC_DIR,
-            "venv_python": VENV_PYTHON,
-            "env": env_utf8,
-            "timeout_seconds": (SUBPROCESS_TIMEOUT_SECONDS if SUBPROCESS_TIMEOUT_SECONDS > 0 else None),
-            "enable_fact_checking": ENABLE_FACT_CHECKING,
-        }
-    )
-except Exception as e:
-    fact_check_exec = {
-        "fact_checking": {
-            "status": "unavailable",
-            "provider": "perplexity",
-            "reason": "wrapper_error",
-            "message": "Fact-checking no disponible.",
-        }
-    }
-    fallback_fact_check_file = os.path.join(OUTPUT_DIR, "fact_check_analisis.json")
+# 3. Fact-checking: normalmente ya lo hizo Hemingwai en paralelo con el análisis (FACT_CHECK_OVERLAP)
+#    y lo guardó con él; si no, se ejecuta ahora (robusto: nunca tumba el pipeline)
+fact_check_file = os.path.join(OUTPUT_DIR, "fact_check_analisis.json")
+if os.path.exists(fact_check_file):
+    print("Fact-checking hecho durante el análisis.")
     try:
-        with open(fallback_fact_check_file, "w", encoding="utf-8") as f:
-            json.dump(
-                {
-                    "noticia_id": noticia_id,
-                    "analisis": "Fact-checking no disponible.",
-                    "fuentes": [],
-                    "status": "unavailable",
-                    "reason": "wrapper_error",
-                    "warning": f"{type(e).__name__}",
-                },
-                f,
-                ensure_ascii=False,
-                indent=2,
-            )
-    except Exception as write_err:
-        print(f"Warning: no se pudo escribir placeholder de fact-check ({type(write_err).__name__}).")
-    print(f"Warning: fact-checking wrapper error ({type(e).__name__}). Continuando.")
+        with open(fact_check_file, "r", encoding="utf-8") as f:
+            fact_check_exec = {"fact_checking": json.load(f)}
+    except (OSError, ValueError):
+        fact_check_exec = {}
+else:
+    print("Ejecutando paso de fact-checking...")
+    try:
+        fact_check_exec = run_fact_checking(
+            {
+                "noticia_id": noticia_id,
+                "output_dir": OUTPUT_DIR,
+                "src_dir": SRC_DIR,
+                "venv_python": VENV_PYTHON,
+                "env": env_utf8,
+                "timeout_seconds": (SUBPROCESS_TIMEOUT_SECONDS if SUBPROCESS_TIMEOUT_SECONDS > 0 else None),
+                "enable_fact_checking": ENABLE_FACT_CHECKING,
+            }
+        )
+    except Exception as e:
+        fact_check_exec = {
+            "fact_checking": {
+                "status": "unavailable",
+                "provider": "perplexity",
+                "reason": "wrapper_error",
+                "message": "Fact-checking no disponible.",
+            }
+        }
+        fallback_fact_check_file = os.path.join(OUTPUT_DIR, "fact_check_analisis.json")
+        try:
+            with open(fallback_fact_check_file, "w", encoding="utf-8") as f:
+                json.dump(
+                    {
+                        "noticia_id": noticia_id,
+                        "analisis": "Fact-checking no disponible.",
+                        "fuentes": [],
+                        "status": "unavailable",
+                        "reason": "wrapper_error",
+                        "warning": f"{type(e).__name__}",
+                    },
+                    f,
+                    ensure_ascii=False,
+                    indent=2,
+                )
+        except Exception as write_err:
+            print(f"Warning: no se pudo escribir placeholder de fact-check ({type(write_err).__name__}).")
+        print(f"Warning: fact-checking wrapper error ({type(e).__name__}). Continuando.")
 
 fact_check_block = fact_check_exec.get("fact_checking") or {}
 print(
@@ -165,7 +181,7 @@ print(
 # 4. Ejecutar render_latex.py para generar y subir el PDF
 print("Generando y subiendo PDF...")
 proc3 = subprocess.run([
-    VENV_PYTHON, "render_latex.py"
+    VENV_PYTHON, "render_latex.py", "--output-dir", OUTPUT_DIR
 ], cwd=SRC_DIR, capture_output=True, text=False, env=env_utf8, timeout=(SUBPROCESS_TIMEOUT_SECONDS if SUBPROCESS_TIMEOUT_SECONDS > 0 else None))
 out3 = (proc3.stdout or b"") + (proc3.stderr or b"")
 try:
@@ -184,9 +200,13 @@ else:
     print(f"PDF generado: {pdfs[0]}")
 
 # 4. Buscar y mostrar el enlace de Mega si está disponible
-match_link = re.search(r"Link: (https://mega\\.nz/\\S+)", out3)
+match_link = re.search(r"Link: (https://mega\.nz/\S+)", out3)
+match_queued = re.search(r"Upload queued: (\S+)", out3)
 if match_link:
     print(f"Enlace de Mega: {match_link.group(1)}")
+elif match_queued:
+    # MEGA_UPLOAD_MODE=queue: mega_uploader.py escribirá el enlace en pipeline.steps.pdf
+    print(f"Subida a Mega encolada (trabajo {match_queued.group(1)[:12]}).")
 else:
     print("Error: no se obtuvo enlace de Mega en la salida. La subida no se considera correcta.")
     print("Salida de render_latex.py (recortada):")
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compara la extracción completa (newspaper.Article + BeautifulSoup) con la rápida
+(fast_extract) en páginas por segundo y pico de memoria, sin red. Cada modo se mide en un
+proceso nuevo con el RSS máximo del sistema (getrusage), que incluye la memoria que reserva
+lxml en C y que tracemalloc no ve.
+
+Artículos: por defecto, el HTML de la caché del crawler (CRAWL_HTML_CACHE); o ficheros
+.html de un directorio. Portadas: ficheros .html indicados con --portadas.
+
+Uso:
+  python bench_extraccion.py --limite 200
+  python bench_extraccion.py --html-dir muestras/ --portadas portada_elpais.html
+"""
+import argparse
+import glob
+import json
+import os
+import multiprocessing
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bs4 import BeautifulSoup
+
+import fast_extract
+from Periodico import _parsear_html_articulo
+from html_cache import HtmlCache
+
+
+def cargar_articulos(html_dir=None, limite=None):
+    paginas = []
+    if html_dir:
+        for path in sorted(glob.glob(os.path.join(html_dir, "*.html"))):
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                paginas.append((f"https://example.com/{os.path.basename(path)}", f.read()))
+            if limite and len(paginas) >= limite:
+                break
+    else:
+        for entrada in HtmlCache.shared().iter_entries():
+            paginas.append(entrada)
+            if limite and len(paginas) >= limite:
+                break
+    return paginas
+
+
+def enlaces_bs4(html, base_url):
+    # Réplica del camino clásico de Periodico._enlaces_desde_html
+    from urllib.parse import urljoin
+    soup = BeautifulSoup(html, "html.parser")
+    return {
+        urljoin(base_url, a["href"])
+        for a in soup.find_all("a", href=True)
+        if urljoin(base_url, a["href"]).startswith("http")
+    }
+
+
+def articulo_completo(url, html):
+    return _parsear_html_articulo(url, html)
+
+
+def articulo_rapido(url, html):
+    return _parsear_html_articulo(url, html, rapido=True)
+
+
+def articulo_rapido_imagenes(url, html):
+    return _parsear_html_articulo(url, html, rapido=True, con_imagenes=True)
+
+
+def portada_bs4(url, html):
+    return enlaces_bs4(html, url)
+
+
+def portada_lxml(url, html):
+    return fast_extract.extraer_enlaces(html, url)
+
+
+MODOS = {
+    "articulo_completo": articulo_completo,
+    "articulo_rapido": articulo_rapido,
+    "articulo_rapido_imagenes": articulo_rapido_imagenes,
+    "portada_bs4": portada_bs4,
+    "portada_lxml": portada_lxml,
+}
+
+
+def _rss_maximo_mb():
+    # ru_maxrss va en KB en Linux y en bytes en macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / (1024 * 1024) if sys.platform == "darwin" else maxrss / 1024
+
+
+def medir(nombre, paginas):
+    """
+    Una pasada cronometrada del modo `nombre`. Se ejecuta en un proceso nuevo (medir_en_proceso):
+    el pico de memoria es lo que crece el RSS máximo del proceso durante la pasada.
+    """
+    funcion = MODOS[nombre]
+    rss_inicial = _rss_maximo_mb()
+    errores = 0
+    inicio = time.perf_counter()
+    for url, html in paginas:
+        try:
+            funcion(url, html)
+        except Exception:
+            errores += 1
+    segundos = time.perf_counter() - inicio
+
+    return {
+        "modo": nombre,
+        "paginas": len(paginas),
+        "errores": errores,
+        "segundos": round(segundos, 3),
+        "paginas_por_segundo": round(len(paginas) / segundos, 2) if segundos > 0 else None,
+        "pico_memoria_mb": round(_rss_maximo_mb() - rss_inicial, 2),
+    }
+
+
+def medir_en_proceso(nombre, paginas):
+    # spawn: el proceso no hereda la memoria (ni el pico de RSS) de este ni de las medidas anteriores
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(medir, nombre, paginas).result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de extracción completa vs rápida.")
+    parser.add_argument("--html-dir", default=None, help="Directorio con artículos .html (por defecto, la caché HTML).")
+    parser.add_argument("--portadas", nargs="*", default=[], help="Ficheros .html de portadas para medir la extracción de enlaces.")
+    parser.add_argument("--limite", type=int, default=100, help="Máximo de artículos a medir.")
+    parser.add_argument("--json", action="store_true", help="Salida en JSON.")
+    args = parser.parse_args()
+
+    resultados = []
+    articulos = cargar_articulos(args.html_dir, args.limite)
+    if articulos:
+        for nombre in ("articulo_completo", "articulo_rapido", "articulo_rapido_imagenes"):
+            resultados.append(medir_en_proceso(nombre, articulos))
+
+    portadas = []
+    for path in args.portadas:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            portadas.append(("https://example.com/", f.read()))
+    if portadas:
+        for nombre in ("portada_bs4", "portada_lxml"):
+            resultados.append(medir_en_proceso(nombre, portadas))
+
+    if not resultados:
+        print("No hay páginas que medir (caché HTML vacía y sin --html-dir/--portadas).")
+        return 1
+
+    if args.json:
+        print(json.dumps(resultados, ensure_ascii=False, indent=2))
+    else:
+        print(f"{'modo':<28}{'páginas':>9}{'errores':>9}{'pág/s':>10}{'pico MB':>10}")
+        for r in resultados:
+            print(f"{r['modo']:<28}{r['paginas']:>9}{r['errores']:>9}{r['paginas_por_segundo'] or 0:>10}{r['pico_memoria_mb']:>10}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
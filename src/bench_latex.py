@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compara el tiempo de compilación de un PDF de news_template.tex.j2 con y sin el formato
+precompilado del preámbulo (render_latex.LATEX_PRECOMPILED_PREAMBLE).
+
+La noticia sale de un JSON como output_temporal/retrieved_news_item.txt (--noticia) o, si
+no existe, de una noticia mínima de ejemplo. El formato se construye antes de medir y su
+coste se informa aparte (se paga una vez por cambio de preámbulo).
+
+Uso:
+  python bench_latex.py --repeticiones 10
+  python bench_latex.py --noticia output_temporal/retrieved_news_item.txt --json
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import render_latex
+from render_latex import (
+    LATEX_TEMPLATE_FILE,
+    ROOT_DIR,
+    build_render_context,
+    compile_latex_to_pdf,
+    preamble_format_name,
+    prepare_preamble_format,
+    render_to_string,
+    split_preamble,
+)
+
+
+NOTICIA_EJEMPLO = {
+    "_id": "000000000000000000000000",
+    "titulo": "Noticia de ejemplo para medir pdflatex",
+    "cuerpo": "Cuerpo de la noticia. " * 200,
+    "autor": ["Redacción"],
+    "fecha_publicacion": "2024-01-01T00:00:00",
+    "fuente": "Ejemplo",
+    "url": "https://example.com/noticia",
+    "puntuacion": 6.5,
+    "valoracion_general": "Valoración general de ejemplo.",
+    "resumen_valoracion": "Resumen de la valoración.",
+}
+
+
+def cargar_noticia(path):
+    if path and os.path.isfile(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return dict(NOTICIA_EJEMPLO)
+
+
+def medir(nombre, tex_path, repeticiones, use_format, timeout_sec):
+    tiempos = []
+    errores = 0
+    out_dir = os.path.dirname(tex_path)
+    for _ in range(repeticiones):
+        for ext in (".aux", ".pdf"):
+            try:
+                os.remove(os.path.splitext(tex_path)[0] + ext)
+            except OSError:
+                pass
+        inicio = time.perf_counter()
+        ok, _err = compile_latex_to_pdf(
+            tex_path, out_dir, os.path.join(out_dir, f"{nombre}.log"), timeout_sec=timeout_sec, use_format=use_format
+        )
+        tiempos.append(time.perf_counter() - inicio)
+        errores += int(not ok)
+    return {
+        "modo": nombre,
+        "repeticiones": repeticiones,
+        "errores": errores,
+        "media_s": round(statistics.mean(tiempos), 3),
+        "mediana_s": round(statistics.median(tiempos), 3),
+        "min_s": round(min(tiempos), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de pdflatex con y sin preámbulo precompilado.")
+    parser.add_argument("--noticia", default=os.path.join(ROOT_DIR, "output_temporal", "retrieved_news_item.txt"),
+                        help="JSON de la noticia (por defecto retrieved_news_item.txt o una de ejemplo).")
+    parser.add_argument("--repeticiones", type=int, default=5, help="Compilaciones por modo.")
+    parser.add_argument("--json", action="store_true", help="Salida en JSON.")
+    args = parser.parse_args()
+
+    timeout_sec = int(os.getenv("LATEX_BUILD_TIMEOUT", "60"))
+    work_dir = tempfile.mkdtemp(prefix="bench_latex_")
+    try:
+        tex_path = os.path.join(work_dir, "bench.tex")
+        context = build_render_context(cargar_noticia(args.noticia))
+        with open(tex_path, "w", encoding="utf-8") as f:
+            f.write(render_to_string(LATEX_TEMPLATE_FILE, context))
+
+        with open(tex_path, "r", encoding="utf-8") as f:
+            preamble, _body = split_preamble(f.read())
+        fmt_dir = render_latex.LATEX_FORMAT_CACHE_DIR
+        existia = bool(fmt_dir) and os.path.isfile(os.path.join(fmt_dir, preamble_format_name(preamble or "") + ".fmt"))
+        inicio = time.perf_counter()
+        render_latex.LATEX_PRECOMPILED_PREAMBLE = True
+        fmt_name = prepare_preamble_format(tex_path, timeout_sec)
+        construccion = {
+            "formato": fmt_name,
+            "ya_existia": existia,
+            "construccion_s": round(time.perf_counter() - inicio, 3),
+        }
+
+        resultados = [medir("sin_formato", tex_path, args.repeticiones, False, timeout_sec)]
+        if fmt_name:
+            resultados.append(medir("con_formato", tex_path, args.repeticiones, True, timeout_sec))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps({"formato": construccion, "resultados": resultados}, ensure_ascii=False, indent=2))
+        return 0
+
+    origen = "ya existía" if construccion["ya_existia"] else f"construido en {construccion['construccion_s']}s"
+    print(f"Formato: {construccion['formato'] or 'no disponible'} ({origen})")
+    print(f"{'modo':<16}{'rep.':>6}{'errores':>9}{'media s':>10}{'mediana s':>11}{'mín s':>9}")
+    for r in resultados:
+        print(f"{r['modo']:<16}{r['repeticiones']:>6}{r['errores']:>9}{r['media_s']:>10}{r['mediana_s']:>11}{r['min_s']:>9}")
+    if len(resultados) == 2 and resultados[1]["mediana_s"] > 0:
+        print(f"Aceleración (mediana): x{resultados[0]['mediana_s'] / resultados[1]['mediana_s']:.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,13 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import os
 import sys
 import json
 from decimal import Decimal, ROUND_HALF_UP
-from pymongo import MongoClient
 from bson import ObjectId
-from dotenv import load_dotenv
+
+from news_read_layer import NewsReadLayer
+from projections import PERFIL_POR_DEFECTO, proyeccion
 
 
 def round_half_up(value, ndigits):
@@ -70,40 +70,15 @@ def enrich_global_scores(noticia):
 
     return noticia
 
-def buscar_noticia(identificador, solo_antigua=False):
+def consultar_noticia(identificador, solo_antigua=False, perfil=PERFIL_POR_DEFECTO):
     """
-    Busca una noticia por su URL o ID.
-    Por defecto, busca en la BD nueva y luego en la antigua.
-    Si solo_antigua es True, busca únicamente en la antigua.
-    
-    Args:
-        identificador (str): URL o ID de la noticia.
-        solo_antigua (bool): Si es True, busca solo en la BD antigua.
-
-    Returns:
-        dict: Los datos de la noticia encontrada o None.
+    Igual que buscar_noticia, pero lanza RuntimeError en vez de terminar el proceso
+    cuando falta configuración o no hay conexión (para uso desde un proceso residente).
+    Lanza ValueError si el perfil de proyección no existe.
     """
-    # Cargar variables de entorno
-    load_dotenv()
-    old_mongo_uri = os.getenv("OLD_MONGODB_URI")
-    new_mongo_uri = os.getenv("NEW_MONGODB_URI")
-
-    if not all([old_mongo_uri, new_mongo_uri]):
-        print(json.dumps({"error": "Las variables de entorno OLD_MONGODB_URI y NEW_MONGODB_URI son necesarias."}), file=sys.stderr)
-        sys.exit(1)
-
-    # Conexión a las bases de datos
-    try:
-        new_client = MongoClient(new_mongo_uri)
-        new_db = new_client.get_database("Base_de_datos_noticias")
-        new_collection = new_db.get_collection("Noticias")
-
-        old_client = MongoClient(old_mongo_uri)
-        old_db = old_client.get_database("Base_de_datos_noticias")
-        old_collection = old_db.get_collection("Noticias")
-    except Exception as e:
-        print(json.dumps({"error": f"Error al conectar a MongoDB: {e}"}), file=sys.stderr)
-        sys.exit(1)
+    projection = proyeccion(perfil)
+    # Clients compartidos; BD nueva y antigua se consultan a la vez (gana la nueva)
+    read_layer = NewsReadLayer.shared()
 
     # Preparar la consulta
     query = {}
@@ -111,35 +86,53 @@ def buscar_noticia(identificador, solo_antigua=False):
         query = {"_id": ObjectId(identificador)}
     else:
         query = {"url": identificador}
-        
-    # 🌟 PROYECCIÓN: Excluir el campo 'embedding' del resultado
-    projection = {"embedding": 0}
-
-    # Búsqueda condicional
-    if not solo_antigua:
-        noticia = new_collection.find_one(query, projection)
-        if noticia:
-            noticia["_id"] = str(noticia["_id"])
-            return enrich_global_scores(noticia)
-
-    # Búsqueda en la antigua base de datos
-    noticia = old_collection.find_one(query, projection)
+
+    noticia = read_layer.find_one(query, projection, solo_antigua=solo_antigua)
     if noticia:
         noticia["_id"] = str(noticia["_id"])
         return enrich_global_scores(noticia)
 
     return None
 
+
+def buscar_noticia(identificador, solo_antigua=False, perfil=PERFIL_POR_DEFECTO):
+    """
+    Busca una noticia por su URL o ID.
+    Por defecto, busca en la BD nueva y luego en la antigua.
+    Si solo_antigua es True, busca únicamente en la antigua.
+    
+    Args:
+        identificador (str): URL o ID de la noticia.
+        solo_antigua (bool): Si es True, busca solo en la BD antigua.
+        perfil (str): Perfil de proyección (projections.PROYECCIONES); por defecto
+            el documento completo sin embedding.
+
+    Returns:
+        dict: Los datos de la noticia encontrada o None.
+    """
+    try:
+        return consultar_noticia(identificador, solo_antigua=solo_antigua, perfil=perfil)
+    except (RuntimeError, ValueError) as e:
+        print(json.dumps({"error": str(e)}), file=sys.stderr)
+        sys.exit(1)
+
 if __name__ == "__main__":
-    if len(sys.argv) < 2 or len(sys.argv) > 3:
-        usage = "Uso: ./buscar_noticia.py <URL_o_ID> [--solo-antigua]"
+    argumentos = sys.argv[1:]
+    perfil = PERFIL_POR_DEFECTO
+    if "--perfil" in argumentos:
+        posicion = argumentos.index("--perfil")
+        perfil = argumentos[posicion + 1] if posicion + 1 < len(argumentos) else ""
+        del argumentos[posicion:posicion + 2]
+
+    if not argumentos or len(argumentos) > 2 or not perfil:
+        usage = "Uso: ./buscar_noticia.py <URL_o_ID> [--solo-antigua] [--perfil badge|alerts|chat_context|pdf|full]"
         print(json.dumps({"error": usage}), file=sys.stderr)
         sys.exit(1)
 
-    identificador_noticia = sys.argv[1]
-    solo_antigua_flag = len(sys.argv) == 3 and sys.argv[2] == '--solo-antigua'
+    identificador_noticia = argumentos[0]
+    solo_antigua_flag = len(argumentos) == 2 and argumentos[1] == '--solo-antigua'
     
-    resultado = buscar_noticia(identificador_noticia, solo_antigua=solo_antigua_flag)
+    resultado = buscar_noticia(identificador_noticia, solo_antigua=solo_antigua_flag, perfil=perfil)
 
     if resultado:
         print(json.dumps(resultado, indent=4, ensure_ascii=False))
@@ -1,14 +1,14 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import os
 import sys
 import json
 from urllib.parse import urlparse, urlunparse
-from pymongo import MongoClient
-from dotenv import load_dotenv
 from bson import ObjectId
 
+from news_read_layer import NewsReadLayer
+from projections import proyeccion
+
 def normalize_url(url):
     """
     Normaliza una URL eliminando query parameters y fragmentos (hash).
@@ -34,25 +34,11 @@ def buscar_noticias_batch(urls):
     Returns:
         dict: Resultado con la lista de objetos encontrados o estado de no analizado.
     """
-    # Cargar variables de entorno
-    load_dotenv()
-    old_mongo_uri = os.getenv("OLD_MONGODB_URI")
-    new_mongo_uri = os.getenv("NEW_MONGODB_URI")
-
-    if not all([old_mongo_uri, new_mongo_uri]):
-        return {"ok": False, "error": "Las variables de entorno OLD_MONGODB_URI y NEW_MONGODB_URI son necesarias."}
-
-    # Conexión a las bases de datos
+    # Clients compartidos de la capa de lectura (BD nueva y antigua)
     try:
-        new_client = MongoClient(new_mongo_uri)
-        new_db = new_client.get_database("Base_de_datos_noticias")
-        new_collection = new_db.get_collection("Noticias")
-
-        old_client = MongoClient(old_mongo_uri)
-        old_db = old_client.get_database("Base_de_datos_noticias")
-        old_collection = old_db.get_collection("Noticias")
-    except Exception as e:
-        return {"ok": False, "error": "Error al conectar a MongoDB", "details": str(e)}
+        read_layer = NewsReadLayer.shared()
+    except RuntimeError as e:
+        return {"ok": False, "error": str(e)}
 
     # 1. Normalizar URLs y eliminar duplicados para la búsqueda
     unique_normalized_urls = set()
@@ -64,41 +50,15 @@ def buscar_noticias_batch(urls):
     lista_busqueda = list(unique_normalized_urls)
     
     # 2. Proyección para optimizar (solo campos necesarios)
-    projection = {
-        "url": 1,
-        "puntuacion": 1, 
-        "puntuacion_global": 1,
-        "puntuacionTotal": 1,
-        "resumen_valoracion": 1, 
-        "resumen_global": 1,
-        "resumen_valoracion_titular": 1,
-        "valoracion_titular": 1
-    }
-
-    resultados_map = {} # normalized_url -> data
+    projection = proyeccion("check_urls")
 
     try:
-        # 3. Buscar en BD Nueva
-        cursor_new = new_collection.find({"url": {"$in": lista_busqueda}}, projection)
-        for doc in cursor_new:
-            url_encontrada = doc.get("url")
-            if url_encontrada:
-                resultados_map[url_encontrada] = doc
-
-        # 4. Identificar faltantes
-        faltantes = [url for url in lista_busqueda if url not in resultados_map]
-
-        # 5. Buscar en BD Antigua (solo los faltantes)
-        if faltantes:
-            cursor_old = old_collection.find({"url": {"$in": faltantes}}, projection)
-            for doc in cursor_old:
-                url_encontrada = doc.get("url")
-                if url_encontrada:
-                    resultados_map[url_encontrada] = doc
+        # 3. Buscar en ambas BD a la vez; la nueva tiene precedencia sobre la antigua
+        resultados_map = read_layer.find_by_urls(lista_busqueda, projection)  # normalized_url -> data
     except Exception as e:
         return {"ok": False, "error": "Error durante la consulta a MongoDB", "details": str(e)}
 
-    # 6. Construir respuesta
+    # 4. Construir respuesta
     output_list = []
     
     # Iteramos sobre las URLs ÚNICAS solicitadas (normalizadas)
@@ -0,0 +1,361 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+crawl_scheduler.py: crawler continuo multi-periódico.
+
+- Lee el registro de fuentes (crawl_sources.json): portada, intervalo y patrones de enlaces.
+- Descubre enlaces de cada fuente cuando le toca (por sus feeds RSS/sitemaps si los tiene,
+  si no por la portada) y los encola en la frontera persistente
+  (colección `crawl_frontier`) con prioridad y fecha de próxima descarga.
+- Un pool de workers reclama URLs de la frontera y las descarga/parsea/guarda sin parar.
+- El intervalo de cada fuente se adapta: se acorta si aparecen noticias nuevas y se alarga
+  si no, de modo que la capacidad de crawling va donde se publican noticias.
+
+Uso:
+  python crawl_scheduler.py            # bucle continuo
+  python crawl_scheduler.py --once     # una pasada por todas las fuentes y vaciar la frontera
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from dotenv import load_dotenv
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import PyMongoError
+
+from Periodico import CRAWL_PARSE_PROCESSES, Periodico
+from crawler_http import HostLimiter, build_session
+from env_config import get_env, get_env_float, get_env_int
+
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+CRAWL_SOURCES_PATH = get_env("CRAWL_SOURCES_PATH", os.path.join(SRC_DIR, "crawl_sources.json"))
+CRAWL_SCHEDULER_WORKERS = get_env_int("CRAWL_SCHEDULER_WORKERS", 8)
+CRAWL_FRONTIER_LEASE_SECONDS = get_env_int("CRAWL_FRONTIER_LEASE_SECONDS", 300)
+CRAWL_FRONTIER_MAX_ATTEMPTS = get_env_int("CRAWL_FRONTIER_MAX_ATTEMPTS", 3)
+CRAWL_INTERVAL_MIN_MINUTES = get_env_float("CRAWL_INTERVAL_MIN_MINUTES", 5)
+CRAWL_INTERVAL_MAX_MINUTES = get_env_float("CRAWL_INTERVAL_MAX_MINUTES", 240)
+CRAWL_LINKS_PER_HOMEPAGE = get_env_int("CRAWL_LINKS_PER_HOMEPAGE", 200)
+FRONTIER_COLLECTION_NAME = "crawl_frontier"
+SOURCES_STATE_COLLECTION_NAME = "crawl_sources_state"
+IDLE_SLEEP_SECONDS = 2
+RETRY_MAX_SECONDS = 60
+# Factores de adaptación del intervalo de cada fuente
+INTERVAL_SHRINK = 0.66
+INTERVAL_GROW = 1.5
+
+
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+
+def load_sources(path=None):
+    """
+    Carga y normaliza el registro de fuentes. Cada entrada admite:
+    nombre, url, intervalo_minutos, intervalo_min_minutos, intervalo_max_minutos,
+    prioridad, patrones, descartar, feeds, activo.
+    """
+    with open(path or CRAWL_SOURCES_PATH, "r", encoding="utf-8") as f:
+        raw_sources = json.load(f)
+
+    sources = []
+    for raw in raw_sources:
+        if not isinstance(raw, dict) or not raw.get("nombre") or not raw.get("url"):
+            raise ValueError(f"Fuente inválida en el registro: {raw!r}")
+        if raw.get("activo", True) is False:
+            continue
+        interval = float(raw.get("intervalo_minutos", 30))
+        sources.append(
+            {
+                "nombre": str(raw["nombre"]),
+                "url": str(raw["url"]),
+                "intervalo_minutos": interval,
+                "intervalo_min_minutos": float(raw.get("intervalo_min_minutos", CRAWL_INTERVAL_MIN_MINUTES)),
+                "intervalo_max_minutos": float(raw.get("intervalo_max_minutos", CRAWL_INTERVAL_MAX_MINUTES)),
+                "prioridad": int(raw.get("prioridad", 1)),
+                "patrones": raw.get("patrones") or None,
+                "descartar": raw.get("descartar") or None,
+                "feeds": list(raw.get("feeds") or []),
+            }
+        )
+    return sources
+
+
+class CrawlScheduler:
+    def __init__(self, sources, workers=None):
+        load_dotenv()
+        self.sources = {source["nombre"]: source for source in sources}
+        self.workers = max(1, int(workers or CRAWL_SCHEDULER_WORKERS))
+        self.periodicos = {
+            source["nombre"]: Periodico(
+                source["nombre"],
+                source["url"],
+                patrones_noticias=source["patrones"],
+                patrones_descartar=source["descartar"],
+                feeds=source["feeds"],
+            )
+            for source in sources
+        }
+        # Todas las fuentes escriben en la misma base de datos; se reutiliza su conexión.
+        self.db = next(iter(self.periodicos.values())).db.db
+        self.frontier = self.db[FRONTIER_COLLECTION_NAME]
+        self.sources_state = self.db[SOURCES_STATE_COLLECTION_NAME]
+        self.session = build_session(pool_size=self.workers)
+        self.limiter = HostLimiter()
+        self.stop_event = threading.Event()
+        self.ensure_indexes()
+
+    def ensure_indexes(self):
+        self.frontier.create_index([("url", ASCENDING)], unique=True, name="ux_crawl_frontier_url")
+        self.frontier.create_index(
+            [("status", ASCENDING), ("priority", DESCENDING), ("next_fetch_at", ASCENDING)],
+            name="ix_crawl_frontier_claim",
+        )
+        self.sources_state.create_index([("nombre", ASCENDING)], unique=True, name="ux_crawl_sources_state_nombre")
+
+    # --- Descubrimiento por fuente ---
+
+    def _state(self, source):
+        state = self.sources_state.find_one({"nombre": source["nombre"]}) or {}
+        interval = state.get("interval_minutes") or source["intervalo_minutos"]
+        return interval, state.get("next_crawl_at")
+
+    def due_sources(self, now=None):
+        now = now or _utcnow()
+        due = []
+        for source in self.sources.values():
+            _interval, next_crawl_at = self._state(source)
+            if next_crawl_at is None or next_crawl_at.replace(tzinfo=timezone.utc) <= now:
+                due.append(source)
+        return due
+
+    def seconds_until_next_discovery(self):
+        now = _utcnow()
+        waits = []
+        for source in self.sources.values():
+            _interval, next_crawl_at = self._state(source)
+            if next_crawl_at is None:
+                return 0
+            waits.append((next_crawl_at.replace(tzinfo=timezone.utc) - now).total_seconds())
+        return max(0, min(waits)) if waits else IDLE_SLEEP_SECONDS
+
+    def enqueue(self, urls, fuente, priority, hints=None):
+        """
+        Añade URLs a la frontera. Las ya presentes no se tocan ($setOnInsert).
+        :param hints: dict opcional url -> metadatos ya conocidos (título, fecha...).
+        :return: Número de URLs realmente nuevas en la frontera.
+        """
+        now = _utcnow()
+        ops = []
+        for url in urls:
+            doc = {
+                "url": url,
+                "fuente": fuente,
+                "priority": priority,
+                "status": "pending",
+                "attempts": 0,
+                "next_fetch_at": now,
+                "discovered_at": now,
+            }
+            if hints and hints.get(url):
+                doc["hints"] = hints[url]
+            ops.append(UpdateOne({"url": url}, {"$setOnInsert": doc}, upsert=True))
+        if not ops:
+            return 0
+        result = self.frontier.bulk_write(ops, ordered=False)
+        return result.upserted_count
+
+    def discover(self, source):
+        periodico = self.periodicos[source["nombre"]]
+        nuevos = periodico.descubrir_enlaces(
+            limite=CRAWL_LINKS_PER_HOMEPAGE, session=self.session, limiter=self.limiter
+        )
+        count = self.enqueue(nuevos.keys(), source["nombre"], source["prioridad"], hints=nuevos)
+        # Ya en la frontera (que reintenta las descargas): los feeds pueden avanzar su marca de agua
+        periodico.confirmar_descubrimiento()
+        self._reschedule(source, count)
+        return count
+
+    def _reschedule(self, source, new_count):
+        interval, _next = self._state(source)
+        if new_count > 0:
+            interval *= INTERVAL_SHRINK
+        else:
+            interval *= INTERVAL_GROW
+        interval = min(max(interval, source["intervalo_min_minutos"]), source["intervalo_max_minutos"])
+        now = _utcnow()
+        self.sources_state.update_one(
+            {"nombre": source["nombre"]},
+            {
+                "$set": {
+                    "interval_minutes": interval,
+                    "next_crawl_at": now + timedelta(minutes=interval),
+                    "last_crawl_at": now,
+                    "last_new_count": new_count,
+                },
+                "$inc": {"total_new": new_count},
+            },
+            upsert=True,
+        )
+        print(f"Fuente {source['nombre']}: {new_count} URLs nuevas, próximo crawl en {interval:.1f} min")
+
+    def run_discovery(self):
+        total = 0
+        for source in self.due_sources():
+            if self.stop_event.is_set():
+                break
+            try:
+                total += self.discover(source)
+            except Exception as e:
+                print(f"Error descubriendo enlaces de {source['nombre']}: {e}")
+        return total
+
+    # --- Workers de descarga ---
+
+    def claim(self):
+        now = _utcnow()
+        return self.frontier.find_one_and_update(
+            {
+                "$or": [
+                    {"status": "pending", "next_fetch_at": {"$lte": now}},
+                    {"status": "in_progress", "lease_until": {"$lt": now}},
+                ]
+            },
+            {
+                "$set": {
+                    "status": "in_progress",
+                    "lease_until": now + timedelta(seconds=CRAWL_FRONTIER_LEASE_SECONDS),
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("priority", DESCENDING), ("next_fetch_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def process(self, item, parse_pool=None):
+        periodico = self.periodicos.get(item.get("fuente"))
+        if periodico is None:
+            self.frontier.update_one({"_id": item["_id"]}, {"$set": {"status": "failed", "error": "unknown_source"}})
+            return False
+        try:
+            noticia = periodico.extraer_noticia_http(item["url"], self.session, self.limiter, parse_pool=parse_pool)
+            periodico.completar_con_pistas(noticia, item.get("hints"))
+            noticia_id = periodico.guardar_noticia(noticia)
+            if noticia_id is None:
+                # Noticia vacía o error al guardarla: se reintenta como cualquier otro fallo
+                raise ValueError("la noticia no se pudo guardar")
+            self.frontier.update_one(
+                {"_id": item["_id"]},
+                {"$set": {"status": "done", "fetched_at": _utcnow(), "noticia_id": noticia_id},
+                 "$unset": {"lease_until": "", "error": ""}},
+            )
+            return True
+        except Exception as e:
+            attempts = int(item.get("attempts") or 1)
+            failed = attempts >= CRAWL_FRONTIER_MAX_ATTEMPTS
+            self.frontier.update_one(
+                {"_id": item["_id"]},
+                {
+                    "$set": {
+                        "status": "failed" if failed else "pending",
+                        "next_fetch_at": _utcnow() + timedelta(minutes=2 ** attempts),
+                        "error": f"{type(e).__name__}: {e}"[:500],
+                    },
+                    "$unset": {"lease_until": ""},
+                },
+            )
+            print(f"Error descargando {item['url']} (intento {attempts}): {e}")
+            return False
+
+    def _worker_loop(self, parse_pool, drain=False):
+        processed = 0
+        delay = IDLE_SLEEP_SECONDS
+        while not self.stop_event.is_set():
+            try:
+                item = self.claim()
+                if item is None:
+                    if drain:
+                        return processed
+                    self.stop_event.wait(IDLE_SLEEP_SECONDS)
+                    continue
+                if self.process(item, parse_pool=parse_pool):
+                    processed += 1
+                delay = IDLE_SLEEP_SECONDS
+            except PyMongoError as e:
+                # Un corte de Mongo no debe matar el worker: si la URL quedó reservada,
+                # vuelve a la frontera cuando vence su lease
+                print(f"Error de MongoDB en el worker ({type(e).__name__}: {e}); reintento en {delay}s")
+                self.stop_event.wait(delay)
+                delay = min(delay * 2, RETRY_MAX_SECONDS)
+        return processed
+
+    def run(self, once=False):
+        """
+        Ejecuta el scheduler. Con once=True descubre todas las fuentes una vez,
+        vacía la frontera y termina; si no, corre hasta Ctrl+C.
+        """
+        try:
+            with ProcessPoolExecutor(max_workers=CRAWL_PARSE_PROCESSES) as parse_pool, \
+                    ThreadPoolExecutor(max_workers=self.workers) as workers_pool:
+                if once:
+                    self.run_discovery()
+                    futures = [workers_pool.submit(self._worker_loop, parse_pool, True) for _ in range(self.workers)]
+                    processed = sum(f.result() for f in futures)
+                    self._flush()
+                    print(f"Pasada completa: {processed} noticias descargadas")
+                    return processed
+
+                futures = [workers_pool.submit(self._worker_loop, parse_pool) for _ in range(self.workers)]
+                try:
+                    self._discovery_loop()
+                except KeyboardInterrupt:
+                    print("Deteniendo scheduler...")
+                finally:
+                    self.stop_event.set()
+                    for future in futures:
+                        future.result()
+                    self._flush()
+        finally:
+            self.session.close()
+        return None
+
+    def _discovery_loop(self):
+        delay = IDLE_SLEEP_SECONDS
+        while not self.stop_event.is_set():
+            try:
+                self.run_discovery()
+                self._flush()
+                self.stop_event.wait(min(max(self.seconds_until_next_discovery(), IDLE_SLEEP_SECONDS), 60))
+                delay = IDLE_SLEEP_SECONDS
+            except PyMongoError as e:
+                # Como en _worker_loop: un corte de Mongo (due_sources, próxima pasada...) no para el scheduler
+                print(f"Error de MongoDB en el descubrimiento ({type(e).__name__}: {e}); reintento en {delay}s")
+                self.stop_event.wait(delay)
+                delay = min(delay * 2, RETRY_MAX_SECONDS)
+
+    def _flush(self):
+        for periodico in self.periodicos.values():
+            periodico._guardar_indice_urls()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawler continuo multi-periódico con frontera persistente.")
+    parser.add_argument("--sources", default=None, help="Ruta al registro de fuentes (JSON).")
+    parser.add_argument("--workers", type=int, default=None, help="Workers de descarga.")
+    parser.add_argument("--once", action="store_true", help="Una pasada por todas las fuentes y terminar.")
+    args = parser.parse_args()
+
+    sources = load_sources(args.sources)
+    if not sources:
+        print("No hay fuentes activas en el registro.")
+        return 1
+    CrawlScheduler(sources, workers=args.workers).run(once=args.once)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+import os
+import sys
+import threading
+import uuid
+from datetime import timedelta
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SRC = os.path.join(ROOT, "src")
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from pymongo import MongoClient  # noqa: E402
+from pymongo.errors import AutoReconnect  # noqa: E402
+
+import crawl_scheduler  # noqa: E402
+from crawl_scheduler import CRAWL_FRONTIER_MAX_ATTEMPTS, CrawlScheduler, _utcnow  # noqa: E402
+
+SELFCHECK_URI = os.getenv("CRAWL_SCHEDULER_SELFCHECK_URI", "mongodb://localhost:27017/?directConnection=true")
+
+
+class _PeriodicoFalso:
+    """Descarga instantánea; las URL con "vacia" no se pueden guardar (guardar_noticia da None)."""
+
+    def extraer_noticia_http(self, url, session, limiter, parse_pool=None):
+        return {"url": url, "titulo": url, "cuerpo": "" if "vacia" in url else "cuerpo"}
+
+    def completar_con_pistas(self, noticia, hints):
+        return noticia
+
+    def guardar_noticia(self, noticia):
+        return "id-" + noticia["url"] if noticia["cuerpo"] else None
+
+
+def _scheduler(frontier):
+    # Sin __init__: no hace falta el registro de fuentes ni conexión de Periodico
+    scheduler = CrawlScheduler.__new__(CrawlScheduler)
+    scheduler.frontier = frontier
+    scheduler.periodicos = {"fuente": _PeriodicoFalso()}
+    scheduler.session = scheduler.limiter = None
+    scheduler.stop_event = threading.Event()
+    scheduler.workers = 1
+    return scheduler
+
+
+def run_selfcheck() -> None:
+    client = MongoClient(SELFCHECK_URI, serverSelectionTimeoutMS=5000)
+    db = client[f"crawl_scheduler_selfcheck_{uuid.uuid4().hex[:8]}"]
+    crawl_scheduler.IDLE_SLEEP_SECONDS = 0.1
+    try:
+        frontier = db["crawl_frontier"]
+        scheduler = _scheduler(frontier)
+        frontier.create_index("url", unique=True)
+
+        # Reserva: por prioridad, y una URL reservada no se vuelve a dar mientras dura su lease
+        assert scheduler.enqueue(["https://a/baja", "https://a/alta"], "fuente", 1) == 2
+        frontier.update_one({"url": "https://a/alta"}, {"$set": {"priority": 5}})
+        assert scheduler.enqueue(["https://a/alta"], "fuente", 1) == 0, "una URL ya encolada se volvió a encolar"
+        primero = scheduler.claim()
+        assert primero["url"] == "https://a/alta" and primero["status"] == "in_progress", primero
+        assert scheduler.claim()["url"] == "https://a/baja"
+        assert scheduler.claim() is None, "se reservó una URL con el lease vigente"
+
+        # Lease vencido: la URL vuelve a estar disponible y cuenta un intento más
+        frontier.update_one({"_id": primero["_id"]}, {"$set": {"lease_until": _utcnow() - timedelta(seconds=1)}})
+        recuperado = scheduler.claim()
+        assert recuperado["_id"] == primero["_id"] and recuperado["attempts"] == 2, recuperado
+        assert scheduler.process(recuperado) is True
+        assert frontier.find_one({"_id": primero["_id"]})["status"] == "done"
+
+        # Fallos: guardar_noticia sin ID se reintenta con espera y, agotados los intentos, queda failed
+        scheduler.enqueue(["https://a/vacia"], "fuente", 9)
+        vacia = scheduler.claim()
+        assert scheduler.process(vacia) is False
+        doc = frontier.find_one({"_id": vacia["_id"]})
+        assert doc["status"] == "pending" and doc["next_fetch_at"].replace(tzinfo=None) > _utcnow().replace(tzinfo=None), doc
+        assert "lease_until" not in doc and doc["error"], doc
+        frontier.update_one({"_id": vacia["_id"]}, {"$set": {"attempts": CRAWL_FRONTIER_MAX_ATTEMPTS - 1, "next_fetch_at": _utcnow()}})
+        assert scheduler.process(scheduler.claim()) is False
+        assert frontier.find_one({"_id": vacia["_id"]})["status"] == "failed", "no se agotaron los intentos"
+
+        scheduler.enqueue(["https://otra/x"], "desconocida", 9)
+        assert scheduler.process(scheduler.claim()) is False
+        assert frontier.find_one({"url": "https://otra/x"})["error"] == "unknown_source"
+
+        # Un error de Mongo en claim() no mata al worker: reintenta y sigue vaciando la frontera
+        scheduler.enqueue(["https://a/tras-corte"], "fuente", 1)
+        claim_real, fallos = scheduler.claim, []
+
+        def _claim_con_corte():
+            if not fallos:
+                fallos.append(1)
+                raise AutoReconnect("corte simulado")
+            return claim_real()
+
+        scheduler.claim = _claim_con_corte
+        crawl_scheduler.RETRY_MAX_SECONDS = 0.1
+        assert scheduler._worker_loop(None, drain=True) == 1, "el worker no sobrevivió al error de Mongo"
+        assert frontier.find_one({"url": "https://a/tras-corte"})["status"] == "done"
+
+        # Ni un error de Mongo en el bucle de descubrimiento para el scheduler
+        cortes = []
+
+        def _due_sources_con_corte():
+            cortes.append(1)
+            if len(cortes) == 1:
+                raise AutoReconnect("corte simulado")
+            scheduler.stop_event.set()
+            return []
+
+        scheduler.due_sources = _due_sources_con_corte
+        scheduler.seconds_until_next_discovery = lambda: 0
+        scheduler._flush = lambda: None
+        scheduler._discovery_loop()
+        assert len(cortes) == 2, "el descubrimiento no se reintentó tras el error de Mongo"
+    finally:
+        client.drop_database(db.name)
+        client.close()
+
+    print("OK: crawl_scheduler self-check passed")
+
+
+if __name__ == "__main__":
+    run_selfcheck()
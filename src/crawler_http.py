@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import codecs
+import re
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from env_config import get_env_float, get_env_int
+
+
+CRAWL_MAX_WORKERS = get_env_int("CRAWL_MAX_WORKERS", 16)
+CRAWL_PER_HOST_CONCURRENCY = get_env_int("CRAWL_PER_HOST_CONCURRENCY", 4)
+CRAWL_POLITENESS_SECONDS = get_env_float("CRAWL_POLITENESS_SECONDS", 0.25)
+CRAWL_REQUEST_TIMEOUT_SECONDS = get_env_int("CRAWL_REQUEST_TIMEOUT_SECONDS", 10)
+CRAWL_HTTP_RETRIES = get_env_int("CRAWL_HTTP_RETRIES", 2)
+_META_CHARSET_RE = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?([A-Za-z0-9_.:-]+)""", re.IGNORECASE)
+CRAWL_USER_AGENT = "Mozilla/5.0 (compatible; HemingwAI-crawler/1.0; +https://github.com/AdeSantosSierra/hemingwai)"
+
+
+def build_session(pool_size=None, retries=None):
+    """
+    Crea una sesión HTTP keep-alive compartida por todos los workers del crawler.
+    El pool de conexiones por host se dimensiona con el número de workers para no
+    abrir (y cerrar) una conexión TLS nueva por cada artículo.
+    """
+    pool_size = max(1, int(pool_size or CRAWL_MAX_WORKERS))
+    retries = CRAWL_HTTP_RETRIES if retries is None else retries
+
+    retry = Retry(
+        total=retries,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("GET", "HEAD"),
+        respect_retry_after_header=True,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(
+        {
+            "User-Agent": CRAWL_USER_AGENT,
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+            "Accept-Language": "es-ES,es;q=0.9,en;q=0.8",
+        }
+    )
+    return session
+
+
+class HostLimiter:
+    """
+    Limita la concurrencia y el ritmo de peticiones por host.
+    - max_concurrent: peticiones simultáneas como máximo contra un mismo host.
+    - min_interval: segundos mínimos entre el inicio de dos peticiones al mismo host.
+    """
+
+    def __init__(self, max_concurrent=None, min_interval=None):
+        self.max_concurrent = max(1, int(max_concurrent or CRAWL_PER_HOST_CONCURRENCY))
+        self.min_interval = max(0.0, float(CRAWL_POLITENESS_SECONDS if min_interval is None else min_interval))
+        self._lock = threading.Lock()
+        self._semaphores = {}
+        self._next_slot = {}
+
+    @staticmethod
+    def host_of(url):
+        netloc = urlparse(url).netloc.lower()
+        return netloc[4:] if netloc.startswith("www.") else netloc
+
+    def _semaphore(self, host):
+        with self._lock:
+            sem = self._semaphores.get(host)
+            if sem is None:
+                sem = threading.BoundedSemaphore(self.max_concurrent)
+                self._semaphores[host] = sem
+            return sem
+
+    def _reserve_start(self, host):
+        with self._lock:
+            now = time.monotonic()
+            start_at = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = start_at + self.min_interval
+            return start_at - now
+
+    @contextmanager
+    def slot(self, url):
+        host = self.host_of(url)
+        sem = self._semaphore(host)
+        sem.acquire()
+        try:
+            wait = self._reserve_start(host)
+            if wait > 0:
+                time.sleep(wait)
+            yield
+        finally:
+            sem.release()
+
+
+def fetch(session, limiter, url, timeout=None, headers=None):
+    """
+    GET respetando los límites por host. Devuelve el objeto Response (sin raise_for_status,
+    para que el llamador pueda tratar 304 y otros códigos).
+    """
+    timeout = timeout or CRAWL_REQUEST_TIMEOUT_SECONDS
+    if limiter is None:
+        return session.get(url, timeout=timeout, headers=headers)
+    with limiter.slot(url):
+        return session.get(url, timeout=timeout, headers=headers)
+
+
+def texto_html(response):
+    """
+    Cuerpo de la respuesta como str. Sin charset en Content-Type, requests decodifica como
+    ISO-8859-1 (mojibake en las páginas UTF-8); como hacía la descarga de newspaper, se usa
+    entonces el <meta charset> de la página o, si no lo hay, la codificación detectada.
+    """
+    if "charset" not in (response.headers.get("Content-Type") or "").lower():
+        match = _META_CHARSET_RE.search(response.content[:4096])
+        encoding = None
+        if match:
+            try:
+                encoding = codecs.lookup(match.group(1).decode("ascii")).name
+            except LookupError:
+                pass
+        response.encoding = encoding or response.apparent_encoding
+    return response.text
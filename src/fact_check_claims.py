@@ -0,0 +1,368 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Fact-check afirmación por afirmación (FACT_CHECK_MODE=claims).
+
+En vez de mandar el cuerpo entero a Perplexity en una consulta de investigación profunda,
+se extraen las afirmaciones comprobables de la noticia (cifras, fechas, citas, hechos
+atribuidos) y se verifica cada una por separado, en paralelo y con concurrencia acotada
+(FACT_CHECK_CLAIM_WORKERS). Los veredictos se guardan en la colección
+FACT_CHECK_CLAIM_CACHE_COLLECTION por hash de la afirmación normalizada, con índice TTL, así
+que las mismas cifras y declaraciones que repiten varios medios sobre una misma historia se
+verifican una vez por ciclo informativo. Dentro del proceso, dos noticias que piden a la vez
+la misma afirmación comparten la consulta en curso.
+
+El bloque fact_checking de la noticia se compone con los resultados: un análisis en texto
+(con las citas renumeradas sobre la lista de fuentes conjunta) y `claims` con el detalle.
+Si la extracción falla o no encuentra afirmaciones, se verifica la noticia entera como antes.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+from env_config import get_env_first, get_env_int
+
+
+FACT_CHECK_MAX_CLAIMS = get_env_int("FACT_CHECK_MAX_CLAIMS", 8)
+FACT_CHECK_CLAIM_WORKERS = get_env_int("FACT_CHECK_CLAIM_WORKERS", 4)
+FACT_CHECK_CLAIM_CACHE_TTL_HOURS = get_env_int("FACT_CHECK_CLAIM_CACHE_TTL_HOURS", 72)
+# Lo no verificable hoy puede serlo mañana: caduca antes
+FACT_CHECK_CLAIM_UNVERIFIABLE_TTL_HOURS = get_env_int("FACT_CHECK_CLAIM_UNVERIFIABLE_TTL_HOURS", 6)
+FACT_CHECK_CLAIM_CACHE_COLLECTION = os.getenv("FACT_CHECK_CLAIM_CACHE_COLLECTION", "fact_check_claims")
+FACT_CHECK_CLAIM_EXTRACTION_MODEL = os.getenv("FACT_CHECK_CLAIM_EXTRACTION_MODEL", "gpt-4o-mini")
+PERPLEXITY_MODEL_CLAIM_CHECK = os.getenv("PERPLEXITY_MODEL_CLAIM_CHECK", "sonar-pro")
+PERPLEXITY_CLAIM_MAX_TOKENS = get_env_int("PERPLEXITY_CLAIM_MAX_TOKENS", 400)
+MONGO_WRITE_URI = get_env_first(("MONGO_WRITE_URI", "NEW_MONGODB_URI", "MONGODB_URI"))
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "Base_de_datos_noticias")
+
+# Forma parte de la clave de caché: cambiar los prompts invalida los veredictos anteriores
+CLAIM_PROMPT_VERSION = 1
+VERDICTS = ("supported", "contradicted", "misleading", "unverifiable")
+VERDICT_LABELS = {
+    "supported": "Confirmada",
+    "contradicted": "Desmentida",
+    "misleading": "Engañosa o imprecisa",
+    "unverifiable": "No verificable",
+    "error": "No comprobada (error del proveedor)",
+}
+_VERDICT_ALIASES = {
+    "verdadero": "supported",
+    "verdadera": "supported",
+    "confirmada": "supported",
+    "true": "supported",
+    "falso": "contradicted",
+    "falsa": "contradicted",
+    "desmentida": "contradicted",
+    "false": "contradicted",
+    "enganosa": "misleading",
+    "enganoso": "misleading",
+    "imprecisa": "misleading",
+    "no_verificable": "unverifiable",
+}
+
+EXTRACTION_PROMPT = (
+    "Extrae de la noticia las afirmaciones concretas que se pueden comprobar con fuentes públicas: "
+    "cifras, fechas, lugares, cargos, resultados, citas textuales atribuidas y hechos atribuidos a personas u organismos. "
+    "Cada afirmación debe entenderse sola, sin la noticia: sustituye pronombres y referencias por los nombres completos "
+    "e incluye la fecha o el lugar si son necesarios. No incluyas opiniones, valoraciones ni predicciones. "
+    "Prioriza las afirmaciones centrales de la noticia y devuelve como máximo {max_claims}. "
+    'Responde solo con JSON: {{"afirmaciones": ["...", "..."]}}'
+)
+VERIFICATION_PROMPT = (
+    "Eres un verificador de hechos riguroso e imparcial. Comprueba la afirmación que te da el usuario "
+    "consultando fuentes fiables y compárala con declaraciones o comunicados oficiales cuando existan. "
+    "Basa tu explicación únicamente en las fuentes devueltas en 'search_results' y cítalas con marcadores numéricos ([1], [2]); "
+    "no inventes citas. Responde solo con JSON: "
+    '{"veredicto": "supported" | "contradicted" | "misleading" | "unverifiable", '
+    '"explicacion": "dos o tres frases en texto plano con la corrección si la hay"}'
+)
+
+_executor = None
+_executor_lock = threading.Lock()
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def normalize_claim(claim: str) -> str:
+    """Forma canónica para la caché: minúsculas, sin tildes ni comillas, espacios colapsados."""
+    text = unicodedata.normalize("NFKD", str(claim or "").lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    # Se conservan los separadores de los números ("3,5%", "1.200")
+    text = re.sub(r"[^\w\s%.,]", " ", text)
+    text = re.sub(r"(?<!\d)[.,]|[.,](?!\d)", " ", text)
+    text = re.sub(r"\s+%", "%", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def claim_key(claim: str) -> str:
+    return hashlib.sha256(f"v{CLAIM_PROMPT_VERSION}:{normalize_claim(claim)}".encode("utf-8")).hexdigest()
+
+
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+
+class ClaimVerdictCache:
+    """Veredictos por afirmación en Mongo; el índice TTL sobre expires_at borra los caducados."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self._indexes_ensured = False
+        self._lock = threading.Lock()
+
+    def ensure_indexes(self):
+        if self._indexes_ensured:
+            return
+        with self._lock:
+            if self._indexes_ensured:
+                return
+            from pymongo import ASCENDING
+
+            self.collection.create_index(
+                [("expires_at", ASCENDING)], expireAfterSeconds=0, name="ttl_fact_check_claims_expires_at"
+            )
+            self._indexes_ensured = True
+
+    def get(self, key):
+        # El monitor TTL pasa cada minuto: se filtra también por expires_at
+        return self.collection.find_one_and_update(
+            {"_id": key, "expires_at": {"$gt": _utcnow()}},
+            {"$inc": {"hits": 1}, "$set": {"last_hit_at": _utcnow()}},
+            projection={"_id": 0, "verdict": 1, "explanation": 1, "sources": 1},
+        )
+
+    def put(self, key, claim, result):
+        ttl_hours = FACT_CHECK_CLAIM_CACHE_TTL_HOURS
+        if result["verdict"] == "unverifiable":
+            ttl_hours = min(ttl_hours, FACT_CHECK_CLAIM_UNVERIFIABLE_TTL_HOURS)
+        if ttl_hours <= 0:
+            return
+        now = _utcnow()
+        self.collection.update_one(
+            {"_id": key},
+            {
+                "$set": {
+                    "claim": claim,
+                    "normalized": normalize_claim(claim),
+                    "verdict": result["verdict"],
+                    "explanation": result["explanation"],
+                    "sources": result["sources"],
+                    "model": PERPLEXITY_MODEL_CLAIM_CHECK,
+                    "created_at": now,
+                    "expires_at": now + timedelta(hours=ttl_hours),
+                },
+                "$setOnInsert": {"hits": 0},
+            },
+            upsert=True,
+        )
+
+
+@lru_cache(maxsize=None)
+def _default_cache():
+    """Caché compartida del proceso, o None si no hay Mongo (se verifica sin caché)."""
+    if not MONGO_WRITE_URI or FACT_CHECK_CLAIM_CACHE_TTL_HOURS <= 0:
+        return None
+    try:
+        import mongo_clients
+
+        cache = ClaimVerdictCache(
+            mongo_clients.get_collection(MONGO_WRITE_URI, MONGO_DB_NAME, FACT_CHECK_CLAIM_CACHE_COLLECTION, workload="pipeline")
+        )
+        cache.ensure_indexes()
+        return cache
+    except Exception as e:
+        print(f"fact_check_claims cache_disabled err={type(e).__name__}")
+        return None
+
+
+def _claim_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(1, FACT_CHECK_CLAIM_WORKERS), thread_name_prefix="fact-check-claim")
+        return _executor
+
+
+def _parse_json_object(raw_text: str) -> dict:
+    text = re.sub(r"<think>.*?</think>", "", raw_text or "", flags=re.DOTALL).strip()
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        return {}
+    try:
+        data = json.loads(text[start : end + 1])
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+@lru_cache(maxsize=None)
+def _openai_client(api_key):
+    from openai import OpenAI
+
+    return OpenAI(api_key=api_key)
+
+
+def extraer_afirmaciones(cuerpo: str, max_claims: int = None) -> list:
+    """Afirmaciones comprobables del cuerpo (OpenAI, FACT_CHECK_CLAIM_EXTRACTION_MODEL), sin duplicados."""
+    max_claims = FACT_CHECK_MAX_CLAIMS if max_claims is None else max_claims
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise RuntimeError("missing_openai_api_key")
+    response = _openai_client(api_key).chat.completions.create(
+        model=FACT_CHECK_CLAIM_EXTRACTION_MODEL,
+        messages=[
+            {"role": "system", "content": EXTRACTION_PROMPT.format(max_claims=max_claims)},
+            {"role": "user", "content": cuerpo},
+        ],
+        temperature=0,
+        response_format={"type": "json_object"},
+        timeout=get_env_int("OPENAI_TIMEOUT_SECONDS", 60),
+    )
+    payload = _parse_json_object(response.choices[0].message.content)
+    claims, seen = [], set()
+    for item in payload.get("afirmaciones") or []:
+        claim = re.sub(r"\s+", " ", str(item or "")).strip()
+        key = normalize_claim(claim)
+        if key and key not in seen:
+            seen.add(key)
+            claims.append(claim)
+    return claims[:max_claims]
+
+
+def verificar_afirmacion(claim: str) -> dict:
+    """Veredicto de Perplexity para una afirmación: {"verdict", "explanation", "sources"}."""
+    from fact_check_perplexity import _respuesta_a_texto, completar_con_reintentos
+
+    response_dict = completar_con_reintentos(
+        [
+            {"role": "system", "content": VERIFICATION_PROMPT},
+            {"role": "user", "content": claim},
+        ],
+        PERPLEXITY_MODEL_CLAIM_CHECK,
+        PERPLEXITY_CLAIM_MAX_TOKENS,
+    )
+    texto, fuentes = _respuesta_a_texto(response_dict)
+    payload = _parse_json_object(texto)
+    verdict = normalize_claim(payload.get("veredicto")).replace(" ", "_")
+    verdict = verdict if verdict in VERDICTS else _VERDICT_ALIASES.get(verdict, "unverifiable")
+    explanation = str(payload.get("explicacion") or "").strip() or (texto if not payload else "")
+    return {"verdict": verdict, "explanation": explanation, "sources": fuentes}
+
+
+def _check_claim(claim, verifier, cache) -> dict:
+    key = claim_key(claim)
+    if cache is not None:
+        try:
+            cached = cache.get(key)
+        except Exception:
+            cached = None
+        if cached:
+            return dict(cached, claim=claim, cached=True)
+    result = verifier(claim)
+    if cache is not None:
+        try:
+            cache.put(key, claim, result)
+        except Exception as e:
+            print(f"fact_check_claims cache_write_failed err={type(e).__name__}")
+    return dict(result, claim=claim, cached=False)
+
+
+def _submit_claim(claim, verifier, cache) -> Future:
+    """Una consulta por afirmación normalizada a la vez en el proceso: las concurrentes comparten el Future."""
+    key = claim_key(claim)
+    with _inflight_lock:
+        future = _inflight.get(key)
+        if future is not None:
+            return future
+        future = _claim_executor().submit(_check_claim, claim, verifier, cache)
+        _inflight[key] = future
+    # Fuera del lock: si el Future ya terminó, el callback se ejecuta aquí mismo
+    future.add_done_callback(lambda _f, key=key: _forget_inflight(key, _f))
+    return future
+
+
+def _forget_inflight(key, future):
+    with _inflight_lock:
+        if _inflight.get(key) is future:
+            del _inflight[key]
+
+
+def _componer_analisis(results: list):
+    """Texto del análisis y fuentes conjuntas; los [n] de cada veredicto se renumeran sobre esa lista."""
+    sources, index = [], {}
+    counts = {verdict: 0 for verdict in VERDICTS}
+    lines = []
+    for i, result in enumerate(results, 1):
+        local = []
+        for url in result.get("sources") or []:
+            if url not in index:
+                sources.append(url)
+                index[url] = len(sources)
+            local.append(index[url])
+
+        def _renumber(match, local=local):
+            n = int(match.group(1))
+            return f"[{local[n - 1]}]" if 0 < n <= len(local) else ""
+
+        explanation = re.sub(r"\[(\d+)\]", _renumber, result.get("explanation") or "").strip()
+        verdict = result["verdict"]
+        if verdict in counts:
+            counts[verdict] += 1
+        lines.append(f"{i}. «{result['claim']}» — {VERDICT_LABELS.get(verdict, verdict)}. {explanation}".rstrip())
+
+    resumen = (
+        f"Verificación por afirmaciones: {len(results)} afirmaciones comprobadas "
+        f"({counts['supported']} confirmadas, {counts['contradicted']} desmentidas, "
+        f"{counts['misleading']} engañosas o imprecisas, {counts['unverifiable']} no verificables)."
+    )
+    analysis = "\n\n".join([resumen] + lines)
+    if not sources:
+        analysis += "\n\nNo se encontraron fuentes para este análisis."
+    return analysis, sources
+
+
+def verificar_afirmaciones(cuerpo: str, extractor=None, verifier=None, cache=False) -> dict:
+    """
+    Fact-check de la noticia por afirmaciones. Devuelve {"analysis", "sources", "claims",
+    "mode", "cache_hits"}. `cache=False` usa la caché de Mongo del proceso; None la desactiva.
+    Lanza PerplexityUnavailable si no se pudo verificar ninguna afirmación.
+    """
+    extractor = extractor or extraer_afirmaciones
+    verifier = verifier or verificar_afirmacion
+    cache = _default_cache() if cache is False else cache
+
+    try:
+        claims = list(extractor(cuerpo))[: max(1, FACT_CHECK_MAX_CLAIMS)]
+    except Exception as e:
+        print(f"fact_check_claims extraction_failed err={type(e).__name__}: {e}")
+        claims = []
+    if not claims:
+        # Sin afirmaciones que comprobar por separado: la noticia entera, como en modo article
+        from fact_check_perplexity import consultar_perplexity
+
+        analysis, sources = consultar_perplexity(cuerpo)
+        return {"analysis": analysis, "sources": sources, "claims": None, "mode": "article", "cache_hits": 0}
+
+    futures = [_submit_claim(claim, verifier, cache) for claim in claims]
+    results, last_error = [], None
+    for claim, future in zip(claims, futures):
+        try:
+            results.append(future.result())
+        except Exception as e:
+            last_error = getattr(e, "last_error", None) or e
+            results.append({"claim": claim, "verdict": "error", "explanation": "", "sources": [], "cached": False})
+    if all(result["verdict"] == "error" for result in results):
+        from fact_check_perplexity import PerplexityUnavailable
+
+        raise PerplexityUnavailable(last_error)
+
+    analysis, sources = _componer_analisis(results)
+    cache_hits = sum(1 for result in results if result.get("cached"))
+    print(f"fact_check_claims claims={len(results)} cache_hits={cache_hits} errors={sum(r['verdict'] == 'error' for r in results)}")
+    return {"analysis": analysis, "sources": sources, "claims": results, "mode": "claims", "cache_hits": cache_hits}
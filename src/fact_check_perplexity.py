@@ -4,6 +4,7 @@ import sys
 import json
 import re
 import time
+from functools import lru_cache
 from openai import OpenAI
 from dotenv import load_dotenv
 from bson import ObjectId
@@ -27,10 +28,11 @@ from env_config import (
 
 # --- Cargar variables de entorno ---
 dotenv_path = os.path.join(ROOT_DIR, '.env')
-if not os.path.exists(dotenv_path):
+if os.path.exists(dotenv_path):
+    load_dotenv(dotenv_path=dotenv_path)
+elif __name__ == "__main__":
     print(f"Error: El archivo .env no se encuentra en {ROOT_DIR}")
     sys.exit(1)
-load_dotenv(dotenv_path=dotenv_path)
 
 # --- Configuración de variables ---
 PERPLEXITY_API_KEY = os.getenv("PERPLEXITY_API_KEY")
@@ -49,44 +51,51 @@ FEATURE_FAIL_OPEN_PERPLEXITY = get_env_bool("FEATURE_FAIL_OPEN_PERPLEXITY", Fals
 MONGO_URI = get_env_first(("MONGO_WRITE_URI", "NEW_MONGODB_URI", "MONGODB_URI"))
 DB_NAME = os.getenv("MONGO_DB_NAME", "Base_de_datos_noticias")
 COLLECTION_NAME = os.getenv("MONGO_COLLECTION_NAME", "Noticias")
+# "article": la noticia entera en una consulta; "claims": afirmación por afirmación (fact_check_claims.py)
+FACT_CHECK_MODE = (os.getenv("FACT_CHECK_MODE", "article") or "article").strip().lower()
+if FACT_CHECK_MODE not in ("article", "claims"):
+    FACT_CHECK_MODE = "article"
 
-# --- Validar configuración ---
-try:
-    validate_required_any(
-        {"mongo_write_uri": ("MONGO_WRITE_URI", "NEW_MONGODB_URI", "MONGODB_URI")},
-        active=FEATURE_ENABLE_PERPLEXITY,
-        context="fact_check_perplexity",
-    )
-    validate_required(
-        ["PERPLEXITY_API_KEY"],
-        active=FEATURE_ENABLE_PERPLEXITY and not FEATURE_FAIL_OPEN_PERPLEXITY,
-        context="fact_check_perplexity",
-    )
-except RuntimeError as e:
-    print(f"Error: {e}")
-    sys.exit(1)
 
 
-def _build_perplexity_step(status: str, error: str = None, ok: bool = False) -> dict:
+def validar_configuracion():
+    """Comprueba la configuración al ejecutarse como script; importado (Hemingwai, lotes) no sale del proceso."""
+    try:
+        validate_required_any(
+            {"mongo_write_uri": ("MONGO_WRITE_URI", "NEW_MONGODB_URI", "MONGODB_URI")},
+            active=FEATURE_ENABLE_PERPLEXITY,
+            context="fact_check_perplexity",
+        )
+        validate_required(
+            ["PERPLEXITY_API_KEY"],
+            active=FEATURE_ENABLE_PERPLEXITY and not FEATURE_FAIL_OPEN_PERPLEXITY,
+            context="fact_check_perplexity",
+        )
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+def _build_perplexity_step(status: str, artifact_ref: str, error: str = None, ok: bool = False) -> dict:
     from datetime import datetime, timezone
     step = {
         "ok": bool(ok),
         "at": datetime.now(timezone.utc).isoformat(),
         "provider": "perplexity",
         "status": status,
-        "artifact": "output_temporal/fact_check_analisis.json",
+        "artifact": artifact_ref,
     }
     if error:
         step["error"] = str(error)[:1000]
     return step
 
 
-def _persist_perplexity_step(collection, obj_id, status: str, error: str = None, ok: bool = False, analisis: str = None, fuentes=None):
+def _persist_perplexity_step(collection, obj_id, status: str, artifact_ref: str, error: str = None, ok: bool = False, analisis: str = None, fuentes=None, afirmaciones=None):
     if collection is None or obj_id is None:
         return
     from datetime import datetime, timezone
     fuentes = fuentes or []
-    step = _build_perplexity_step(status=status, error=error, ok=ok)
+    step = _build_perplexity_step(status=status, artifact_ref=artifact_ref, error=error, ok=ok)
     error_reason = str(error or "").strip().lower()
     if ok:
         fact_status = "available"
@@ -110,6 +119,8 @@ def _persist_perplexity_step(collection, obj_id, status: str, error: str = None,
             "analysis": str(analisis or ""),
             "sources": list(fuentes),
         }
+        if afirmaciones is not None:
+            fact_checking_block["result"]["claims"] = list(afirmaciones)
 
     step_fact_checking = {
         "ok": bool(ok),
@@ -133,12 +144,117 @@ def _persist_perplexity_step(collection, obj_id, status: str, error: str = None,
         update_doc["pipeline.status"] = "fact_checked"
     collection.update_one({"_id": obj_id}, {"$set": update_doc})
 
-def verificar_noticia(noticia_id: str) -> dict:
+class PerplexityUnavailable(RuntimeError):
+    """Todos los intentos contra Perplexity fallaron."""
+
+    def __init__(self, last_error):
+        super().__init__(f"Perplexity unavailable: {last_error}")
+        self.last_error = last_error
+
+
+@lru_cache(maxsize=None)
+def _perplexity_client(api_key):
+    return OpenAI(api_key=api_key, base_url=PERPLEXITY_BASE_URL)
+
+
+def consultar_perplexity(cuerpo_noticia: str):
+    """
+    Envía la noticia a Perplexity (con reintentos) y devuelve (análisis, fuentes).
+    No toca Mongo: la usan verificar_noticia y el fact-check en proceso de fact_checking_wrapper.
+    Lanza PerplexityUnavailable si fallan todos los intentos.
+    """
+    messages = [
+        {
+            "role": "system",
+            "content": (
+                "Eres un verificador de hechos altamente cualificado y objetivo. Tu tarea es analizar la siguiente noticia y determinar su veracidad. "
+                "Verifica puntualmente todos los datos numéricos y afirmaciones concretas (cifras, fechas, lugares, nombres) consultando fuentes fiables. "
+                "Señala explícitamente cualquier dato inexacto o contradictorio, proporcionando las correcciones fundamentadas. "
+                "Incluye en la evaluación la precisión de dichos datos y cómo impactan en la comprensión global de la noticia. "
+                "Es vital confrontar las formulaciones de la noticia con declaraciones o comunicados oficiales y comparar cómo se expresan en medios de referencia, detectando rápidamente cambios de sentido en verbos y expresiones clave. "
+                "Basa tu análisis únicamente en las fuentes que la API devuelve en el campo 'search_results'. "
+                "Es crucial que cites estas fuentes en tu respuesta usando marcadores numéricos (ej. [1], [2]). "
+                "¡MUY IMPORTANTE! Solo debes incluir un marcador de cita si corresponde a una de las URLs proporcionadas en los resultados de búsqueda de la API. No inventes citas ni uses información externa a las fuentes proporcionadas. "
+                "Si no se devuelven fuentes, indica claramente al final de tu análisis: 'No se encontraron fuentes para este análisis.'. "
+                "Evita las expresiones “hecho objetivo”, “dato objetivo”, “interpretación subjetiva”, “verdad objetiva”, “neutral”. Utiliza, en cambio, “hecho”, “dato”, “interpretación”, “verdad”, “imparcial”, “ecuánime”, “adecuado”. "
+                "La respuesta solo puede ser texto plano, sin emoticonos ni tablas."
+            )
+        },
+        {
+            "role": "user",
+            "content": f"Por favor, verifica la siguiente noticia:\n\n{cuerpo_noticia}"
+        }
+    ]
+
+    analisis, fuentes = _respuesta_a_texto(
+        completar_con_reintentos(messages, PERPLEXITY_MODEL_FACT_CHECK, PERPLEXITY_MAX_TOKENS, "Enviando la noticia a Perplexity AI para su análisis...")
+    )
+    return analisis, fuentes
+
+
+def completar_con_reintentos(messages, model, max_tokens, aviso=None) -> dict:
+    """Llamada a Perplexity con reintentos y backoff; devuelve la respuesta como dict o lanza PerplexityUnavailable."""
+    client = _perplexity_client(PERPLEXITY_API_KEY)
+    if aviso:
+        print(aviso)
+    response = None
+    last_error = None
+    attempts = max(1, PERPLEXITY_RETRIES)
+    for attempt in range(attempts):
+        try:
+            response = client.chat.completions.create(
+                model=model,
+                messages=messages,
+                max_tokens=max_tokens,
+                timeout=PERPLEXITY_TIMEOUT_SECONDS,
+            )
+            break
+        except Exception as e:
+            last_error = e
+            if attempt < attempts - 1:
+                time.sleep((2 ** attempt) * PERPLEXITY_RETRY_BASE_SECONDS)
+    if response is None:
+        raise PerplexityUnavailable(last_error)
+    # Convertir la respuesta a un diccionario para un acceso seguro
+    return response.model_dump()
+
+
+def _respuesta_a_texto(response_dict: dict):
+    """(texto sin bloques <think>, URLs de search_results) de una respuesta de Perplexity."""
+    # Extraer análisis y citas de la respuesta
+    analisis_bruto = response_dict.get("choices", [{}])[0].get("message", {}).get("content", "")
+    # Limpiar el análisis de cualquier bloque de "pensamiento" interno del modelo
+    analisis = re.sub(r'<think>.*?</think>', '', analisis_bruto or "", flags=re.DOTALL).strip()
+
+    # El campo correcto es 'search_results'. Extraemos la URL de cada resultado.
+    search_results = response_dict.get("search_results") or []
+    fuentes = [result.get("url") for result in search_results if result.get("url")]
+    return analisis, fuentes
+
+
+def verificar_cuerpo(cuerpo_noticia: str):
+    """
+    Fact-check del cuerpo según FACT_CHECK_MODE. Devuelve (análisis, fuentes, afirmaciones):
+    en modo "article" afirmaciones es None; en modo "claims" es la lista de veredictos por
+    afirmación de fact_check_claims (con caché entre noticias).
+    """
+    if FACT_CHECK_MODE == "claims":
+        from fact_check_claims import verificar_afirmaciones
+
+        resultado = verificar_afirmaciones(cuerpo_noticia)
+        return resultado["analysis"], resultado["sources"], resultado.get("claims")
+    analisis, fuentes = consultar_perplexity(cuerpo_noticia)
+    return analisis, fuentes, None
+
+
+def verificar_noticia(noticia_id: str, artifact_ref: str = "output_temporal/fact_check_analisis.json") -> dict:
     """
     Obtiene una noticia de MongoDB y utiliza Perplexity AI para verificar su veracidad.
 
     Args:
         noticia_id (str): El ID de la noticia a verificar.
+        artifact_ref (str): Ruta del artefacto (relativa a la raíz del repo) que se anota en
+            pipeline.steps.perplexity.
 
     Returns:
         dict: Un diccionario con el análisis y las fuentes, o un diccionario de error.
@@ -154,7 +270,7 @@ def verificar_noticia(noticia_id: str) -> dict:
     # --- Conexión a MongoDB ---
     print(f"Conectando a MongoDB en la base de datos '{DB_NAME}'...")
     try:
-        mongo_service = MongoDBService(MONGO_URI, db_name=DB_NAME)
+        mongo_service = MongoDBService(MONGO_URI, db_name=DB_NAME, workload="pipeline")
         collection = mongo_service.get_collection(COLLECTION_NAME)
     except Exception as e:
         return {"error": f"Error al conectar con MongoDB: {e}"}
@@ -180,7 +296,7 @@ def verificar_noticia(noticia_id: str) -> dict:
     try:
         if not PERPLEXITY_API_KEY:
             if FEATURE_FAIL_OPEN_PERPLEXITY:
-                _persist_perplexity_step(collection, obj_id, status="degraded", error="missing_api_key", ok=False, analisis="Fact-check no disponible por falta de credenciales.", fuentes=[])
+                _persist_perplexity_step(collection, obj_id, status="degraded", artifact_ref=artifact_ref, error="missing_api_key", ok=False, analisis="Fact-check no disponible por falta de credenciales.", fuentes=[])
                 result = {
                     "noticia_id": noticia_id,
                     "analisis": "Fact-check no disponible por falta de credenciales.",
@@ -192,75 +308,19 @@ def verificar_noticia(noticia_id: str) -> dict:
                 return result
             raise RuntimeError("Missing PERPLEXITY_API_KEY")
 
-        client = OpenAI(
-            api_key=PERPLEXITY_API_KEY,
-            base_url=PERPLEXITY_BASE_URL
-        )
-
-        messages = [
-            {
-                "role": "system",
-                "content": (
-                    "Eres un verificador de hechos altamente cualificado y objetivo. Tu tarea es analizar la siguiente noticia y determinar su veracidad. "
-                    "Verifica puntualmente todos los datos numéricos y afirmaciones concretas (cifras, fechas, lugares, nombres) consultando fuentes fiables. "
-                    "Señala explícitamente cualquier dato inexacto o contradictorio, proporcionando las correcciones fundamentadas. "
-                    "Incluye en la evaluación la precisión de dichos datos y cómo impactan en la comprensión global de la noticia. "
-                    "Es vital confrontar las formulaciones de la noticia con declaraciones o comunicados oficiales y comparar cómo se expresan en medios de referencia, detectando rápidamente cambios de sentido en verbos y expresiones clave. "
-                    "Basa tu análisis únicamente en las fuentes que la API devuelve en el campo 'search_results'. "
-                    "Es crucial que cites estas fuentes en tu respuesta usando marcadores numéricos (ej. [1], [2]). "
-                    "¡MUY IMPORTANTE! Solo debes incluir un marcador de cita si corresponde a una de las URLs proporcionadas en los resultados de búsqueda de la API. No inventes citas ni uses información externa a las fuentes proporcionadas. "
-                    "Si no se devuelven fuentes, indica claramente al final de tu análisis: 'No se encontraron fuentes para este análisis.'. "
-                    "Evita las expresiones “hecho objetivo”, “dato objetivo”, “interpretación subjetiva”, “verdad objetiva”, “neutral”. Utiliza, en cambio, “hecho”, “dato”, “interpretación”, “verdad”, “imparcial”, “ecuánime”, “adecuado”. "
-                    "La respuesta solo puede ser texto plano, sin emoticonos ni tablas."
-                )
-            },
-            {
-                "role": "user",
-                "content": f"Por favor, verifica la siguiente noticia:\n\n{cuerpo_noticia}"
-            }
-        ]
-
-        # --- Llamada a la API ---
-        print("Enviando la noticia a Perplexity AI para su análisis...")
-        response = None
-        last_error = None
-        attempts = max(1, PERPLEXITY_RETRIES)
-        for attempt in range(attempts):
-            try:
-                response = client.chat.completions.create(
-                    model=PERPLEXITY_MODEL_FACT_CHECK,
-                    messages=messages,
-                    max_tokens=PERPLEXITY_MAX_TOKENS,
-                    timeout=PERPLEXITY_TIMEOUT_SECONDS,
-                )
-                break
-            except Exception as e:
-                last_error = e
-                if attempt < attempts - 1:
-                    time.sleep((2 ** attempt) * PERPLEXITY_RETRY_BASE_SECONDS)
-        if response is None:
+        try:
+            analisis, fuentes, afirmaciones = verificar_cuerpo(cuerpo_noticia)
+        except PerplexityUnavailable as e:
             if FEATURE_FAIL_OPEN_PERPLEXITY:
-                _persist_perplexity_step(collection, obj_id, status="degraded", error=f"provider_unavailable: {last_error}", ok=False, analisis="Fact-check no disponible por error del proveedor Perplexity.", fuentes=[])
+                _persist_perplexity_step(collection, obj_id, status="degraded", artifact_ref=artifact_ref, error=f"provider_unavailable: {e.last_error}", ok=False, analisis="Fact-check no disponible por error del proveedor Perplexity.", fuentes=[])
                 return {
                     "noticia_id": noticia_id,
                     "analisis": "Fact-check no disponible por error del proveedor Perplexity.",
                     "fuentes": [],
-                    "warning": f"Perplexity unavailable: {last_error}",
+                    "warning": str(e),
                 }
-            raise RuntimeError(f"Perplexity unavailable: {last_error}")
-        
-        # Convertir la respuesta a un diccionario para un acceso seguro
-        response_dict = response.model_dump()
-        
-        # Extraer análisis y citas de la respuesta
-        analisis_bruto = response_dict.get("choices", [{}])[0].get("message", {}).get("content", "")
-        # Limpiar el análisis de cualquier bloque de "pensamiento" interno del modelo
-        analisis = re.sub(r'<think>.*?</think>', '', analisis_bruto, flags=re.DOTALL).strip()
-        
-        # El campo correcto es 'search_results'. Extraemos la URL de cada resultado.
-        search_results = response_dict.get("search_results", [])
-        fuentes = [result.get("url") for result in search_results if result.get("url")]
-        
+            raise
+
         print("Análisis recibido correctamente.")
 
         # Imprimir las fuentes en la terminal si se encontraron
@@ -274,12 +334,14 @@ def verificar_noticia(noticia_id: str) -> dict:
         
         # Guardar el análisis y las fuentes en MongoDB y actualizar pipeline.steps
         try:
-            _persist_perplexity_step(collection, obj_id, status="ok", ok=True, analisis=analisis, fuentes=fuentes)
+            _persist_perplexity_step(collection, obj_id, status="ok", artifact_ref=artifact_ref, ok=True, analisis=analisis, fuentes=fuentes, afirmaciones=afirmaciones)
             print("Análisis y estado de Perplexity guardados exitosamente en MongoDB.")
         except Exception as e:
             print(f"Error al guardar en MongoDB: {e}")
 
         result = {"noticia_id": noticia_id, "analisis": analisis, "fuentes": fuentes}
+        if afirmaciones is not None:
+            result["afirmaciones"] = afirmaciones
         if run_id:
             result["run_id"] = run_id
         return result
@@ -287,7 +349,7 @@ def verificar_noticia(noticia_id: str) -> dict:
     except Exception as e:
         if FEATURE_FAIL_OPEN_PERPLEXITY:
             if 'collection' in locals() and 'obj_id' in locals():
-                _persist_perplexity_step(collection, obj_id, status="degraded", error=f"fact_check_error: {e}", ok=False, analisis="Fact-check no disponible por error inesperado.", fuentes=[])
+                _persist_perplexity_step(collection, obj_id, status="degraded", artifact_ref=artifact_ref, error=f"fact_check_error: {e}", ok=False, analisis="Fact-check no disponible por error inesperado.", fuentes=[])
             return {
                 "noticia_id": noticia_id,
                 "analisis": "Fact-check no disponible por error inesperado.",
@@ -302,15 +364,24 @@ def verificar_noticia(noticia_id: str) -> dict:
             print("Conexión a MongoDB cerrada.")
 
 if __name__ == "__main__":
+    validar_configuracion()
+
     # --- Validar argumento de entrada ---
-    if len(sys.argv) != 2:
-        print("Uso: python verificar_noticia.py <ID_de_la_noticia>")
+    args = sys.argv[1:]
+    # Directorio de trabajo de la ejecución (analiza_y_guarda.py / workspace.py)
+    output_dir = os.path.join(ROOT_DIR, "output_temporal")
+    if len(args) == 3 and args[1] == "--output-dir":
+        output_dir = os.path.abspath(args[2])
+        args = args[:1]
+    if len(args) != 1:
+        print("Uso: python fact_check_perplexity.py <ID_de_la_noticia> [--output-dir DIR]")
         sys.exit(1)
 
-    noticia_id_arg = sys.argv[1]
-    
+    noticia_id_arg = args[0]
+    artifact_ref = os.path.relpath(os.path.join(output_dir, "fact_check_analisis.json"), ROOT_DIR)
+
     # --- Ejecutar la verificación ---
-    resultado_dict = verificar_noticia(noticia_id_arg)
+    resultado_dict = verificar_noticia(noticia_id_arg, artifact_ref)
     
     # Manejar posible error devuelto por la función
     if "error" in resultado_dict:
@@ -318,7 +389,6 @@ if __name__ == "__main__":
         sys.exit(1)
 
     # Crear el directorio de salida si no existe
-    output_dir = os.path.join(ROOT_DIR, "output_temporal")
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
     
@@ -3,7 +3,14 @@ import os
 import subprocess
 import tempfile
 
-from fact_checking_wrapper import run_fact_checking
+from fact_check_claims import verificar_afirmaciones
+from fact_checking_wrapper import (
+    _load_fact_check_artifact,
+    finish_fact_checking,
+    merge_fact_checking,
+    run_fact_checking,
+    start_fact_checking,
+)
 
 
 DOC_ID = "64b7d5f9a9f31d9a4f8b1234"
@@ -95,6 +102,68 @@ def run_selfcheck():
         _assert(available["fact_checking"]["status"] == "available", "Debe quedar available")
         _assert(available["pipeline_step"]["status"] == "success", "Pipeline step debe quedar success")
 
+        # Caso 4: fact-check en proceso, solapado con el análisis y volcado en su $set
+        quiet = lambda *_args, **_kwargs: None
+        future = start_fact_checking(
+            "Cuerpo de la noticia.",
+            enable_fact_checking=True,
+            perplexity_api_key="test-key",
+            checker=lambda cuerpo: ("Analisis en proceso.", ["https://example.com/a", ""]),
+        )
+        outcome = finish_fact_checking(future, DOC_ID, output_dir=tmpdir, logger=quiet)
+        _assert(outcome["fact_checking"]["result"]["sources"] == ["https://example.com/a"], "Fuentes mal normalizadas")
+        with open(os.path.join(tmpdir, "fact_check_analisis.json"), "r", encoding="utf-8") as f:
+            _assert(json.load(f)["analisis"] == "Analisis en proceso.", "Artefacto en proceso inválido")
+        update_fields = merge_fact_checking({"evaluation_result": {"alerts": []}, "pipeline": {"steps": {}}}, outcome)
+        _assert(update_fields["evaluation_result"]["fact_checking"]["status"] == "available", "Bloque no volcado")
+        _assert(update_fields["pipeline"]["steps"]["perplexity"]["status"] == "ok", "Paso legacy no volcado")
+        _assert(update_fields["fact_check_analisis"] == "Analisis en proceso.", "fact_check_analisis no volcado")
+
+        def _failing_checker(_cuerpo):
+            raise RuntimeError("Perplexity unavailable: 429 Too Many Requests")
+
+        failed = finish_fact_checking(
+            start_fact_checking("x", True, "test-key", checker=_failing_checker), DOC_ID, logger=quiet
+        )
+        _assert(failed["fact_checking"]["reason"] == "rate_limited", "Reason en proceso inválido")
+
+        # Caso 5: modo claims, veredictos por afirmación con caché compartida entre noticias
+        class _MemoryCache:
+            def __init__(self):
+                self.docs = {}
+
+            def get(self, key):
+                return self.docs.get(key)
+
+            def put(self, key, claim, result):
+                self.docs[key] = dict(result)
+
+        calls = []
+
+        def _verifier(claim):
+            calls.append(claim)
+            return {"verdict": "supported", "explanation": "Coincide con la fuente [1].", "sources": [f"https://example.com/{len(calls)}"]}
+
+        cache = _MemoryCache()
+        extractor = lambda _cuerpo: ["El paro bajó un 3,5% en 2023.", "El Gobierno aprobó el decreto."]
+        first = verificar_afirmaciones("a", extractor=extractor, verifier=_verifier, cache=cache)
+        _assert(first["mode"] == "claims" and first["cache_hits"] == 0, "Primera noticia no debe usar caché")
+        _assert(first["sources"] == ["https://example.com/1", "https://example.com/2"], "Fuentes conjuntas inválidas")
+        _assert("[2]" in first["analysis"], "Citas no renumeradas sobre las fuentes conjuntas")
+        second = verificar_afirmaciones(
+            "b", extractor=lambda _cuerpo: ["el  paro bajó un 3,5 % en 2023", "El Gobierno aprobó el decreto"], verifier=_verifier, cache=cache
+        )
+        _assert(len(calls) == 2 and second["cache_hits"] == 2, "Afirmaciones repetidas no reutilizadas")
+
+        outcome = finish_fact_checking(
+            start_fact_checking("a", True, "test-key", checker=lambda _c: (first["analysis"], first["sources"], first["claims"])),
+            DOC_ID,
+            output_dir=tmpdir,
+            logger=quiet,
+        )
+        _assert(len(outcome["fact_checking"]["result"]["claims"]) == 2, "Bloque sin afirmaciones")
+        _assert(len(_load_fact_check_artifact(os.path.join(tmpdir, "fact_check_analisis.json"))["result"]["claims"]) == 2, "Artefacto sin afirmaciones")
+
     print("OK: fact_checking self-check passed")
 
 
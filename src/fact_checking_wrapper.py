@@ -1,12 +1,17 @@
+import contextlib
+import io
 import json
 import os
 import re
 import subprocess
+import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from datetime import datetime, timezone
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Tuple
 
-from env_config import get_env_bool, get_env_first
+from env_config import get_env_bool, get_env_first, get_env_int
 
 
 FACT_CHECK_PLACEHOLDER_MESSAGE = "Fact-checking no disponible."
@@ -19,7 +24,12 @@ ENABLE_FACT_CHECKING_DEFAULT = get_env_bool(
 MONGO_WRITE_URI = get_env_first(("MONGO_WRITE_URI", "NEW_MONGODB_URI", "MONGODB_URI"))
 MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "Base_de_datos_noticias")
 MONGO_COLLECTION_NAME = os.getenv("MONGO_COLLECTION_NAME", "Noticias")
-MONGO_SERVER_API_VERSION = os.getenv("MONGO_SERVER_API_VERSION", "1")
+# Fact-check en proceso (start_fact_checking): Hemingwai lo lanza en cuanto tiene el cuerpo
+FACT_CHECK_OVERLAP = get_env_bool("FACT_CHECK_OVERLAP", True)
+FACT_CHECK_WORKERS = get_env_int("FACT_CHECK_WORKERS", 4)
+
+_executor = None
+_executor_lock = threading.Lock()
 
 
 def _utcnow_iso() -> str:
@@ -114,6 +124,9 @@ def _build_fact_checking_block(status: str, reason: str, result: Optional[Dict[s
             "analysis": analysis,
             "sources": sources,
         }
+        # FACT_CHECK_MODE=claims: veredictos por afirmación con los que se compuso el análisis
+        if isinstance(result.get("claims"), list):
+            block["result"]["claims"] = result["claims"]
 
     return block
 
@@ -139,7 +152,13 @@ def _build_fact_checking_step(block: Dict[str, Any], duration_ms: int) -> Dict[s
     }
 
 
-def _legacy_perplexity_step(step: Dict[str, Any]) -> Dict[str, Any]:
+def _artifact_ref(output_dir: str) -> str:
+    """Ruta del artefacto relativa a la raíz del repo (la que se anota en pipeline.steps)."""
+    root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.relpath(os.path.join(os.path.abspath(output_dir), FACT_CHECK_ARTIFACT), root_dir)
+
+
+def _legacy_perplexity_step(step: Dict[str, Any], artifact: Optional[str] = None) -> Dict[str, Any]:
     status = str(step.get("status") or "unavailable")
     legacy_status = {
         "success": "ok",
@@ -154,7 +173,7 @@ def _legacy_perplexity_step(step: Dict[str, Any]) -> Dict[str, Any]:
         "status": legacy_status,
         "reason": str(step.get("reason") or "unknown"),
         "duration_ms": int(step.get("duration_ms") or 0),
-        "artifact": f"output_temporal/{FACT_CHECK_ARTIFACT}",
+        "artifact": artifact or f"output_temporal/{FACT_CHECK_ARTIFACT}",
     }
     if not legacy["ok"]:
         legacy["error"] = legacy["reason"]
@@ -184,7 +203,9 @@ def _extract_block_from_payload(payload: Dict[str, Any]) -> Optional[Dict[str, A
     analysis = str(payload.get("analisis") or "").strip()
     sources = _normalize_sources(payload.get("fuentes", []))
     if analysis:
-        return _build_fact_checking_block("available", "ok", {"analysis": analysis, "sources": sources})
+        return _build_fact_checking_block(
+            "available", "ok", {"analysis": analysis, "sources": sources, "claims": payload.get("afirmaciones")}
+        )
 
     return None
 
@@ -215,6 +236,8 @@ def _write_fact_check_artifact(output_dir: str, noticia_id: str, block: Dict[str
         "message": block.get("message"),
         "created_at": block.get("created_at"),
     }
+    if isinstance(result.get("claims"), list):
+        payload["afirmaciones"] = result["claims"]
 
     output_file = os.path.join(output_dir, FACT_CHECK_ARTIFACT)
     try:
@@ -224,11 +247,27 @@ def _write_fact_check_artifact(output_dir: str, noticia_id: str, block: Dict[str
         logger(f"fact_checking artifact_write_failed err={type(e).__name__}")
 
 
-def _persist_fact_checking_mongo(noticia_id: str, block: Dict[str, Any], step: Dict[str, Any], logger=print) -> None:
+def _fact_checking_update_doc(block: Dict[str, Any], step: Dict[str, Any], artifact: Optional[str] = None) -> Dict[str, Any]:
+    """$set con el bloque, los pasos (nuevo y legacy) y los campos fact_check_* que lee render."""
+    result = block.get("result") if isinstance(block.get("result"), dict) else {}
+    legacy_analysis = str(result.get("analysis") or "").strip() if block.get("status") == "available" else FACT_CHECK_PLACEHOLDER_MESSAGE
+    legacy_sources = _normalize_sources(result.get("sources", [])) if block.get("status") == "available" else []
+    legacy_step = _legacy_perplexity_step(step, artifact)
+
+    return {
+        "evaluation_result.fact_checking": block,
+        "pipeline.steps.fact_checking": step,
+        "pipeline.steps.perplexity": legacy_step,
+        "pipeline.steps.fact_check": legacy_step,
+        "fact_check_analisis": legacy_analysis,
+        "fact_check_fuentes": legacy_sources,
+    }
+
+
+def _persist_fact_checking_mongo(noticia_id: str, block: Dict[str, Any], step: Dict[str, Any], logger=print, artifact: Optional[str] = None) -> None:
     try:
         from bson import ObjectId
-        from pymongo.mongo_client import MongoClient
-        from pymongo.server_api import ServerApi
+        import mongo_clients
     except Exception:
         logger("fact_checking mongo_skip reason=missing_pymongo_or_bson")
         return
@@ -241,30 +280,148 @@ def _persist_fact_checking_mongo(noticia_id: str, block: Dict[str, Any], step: D
         logger("fact_checking mongo_skip reason=invalid_object_id")
         return
 
-    result = block.get("result") if isinstance(block.get("result"), dict) else {}
-    legacy_analysis = str(result.get("analysis") or "").strip() if block.get("status") == "available" else FACT_CHECK_PLACEHOLDER_MESSAGE
-    legacy_sources = _normalize_sources(result.get("sources", [])) if block.get("status") == "available" else []
-    legacy_step = _legacy_perplexity_step(step)
+    update_doc = _fact_checking_update_doc(block, step, artifact)
 
-    update_doc = {
-        "evaluation_result.fact_checking": block,
-        "pipeline.steps.fact_checking": step,
-        "pipeline.steps.perplexity": legacy_step,
-        "pipeline.steps.fact_check": legacy_step,
-        "fact_check_analisis": legacy_analysis,
-        "fact_check_fuentes": legacy_sources,
-    }
-
-    client = None
     try:
-        client = MongoClient(MONGO_WRITE_URI, server_api=ServerApi(MONGO_SERVER_API_VERSION))
-        collection = client[MONGO_DB_NAME][MONGO_COLLECTION_NAME]
+        collection = mongo_clients.get_collection(MONGO_WRITE_URI, MONGO_DB_NAME, MONGO_COLLECTION_NAME, workload="pipeline")
         collection.update_one({"_id": ObjectId(noticia_id)}, {"$set": update_doc}, upsert=False)
     except Exception as e:
         logger(f"fact_checking mongo_persist_failed doc_id={noticia_id} err={type(e).__name__}")
-    finally:
-        if client is not None:
-            client.close()
+
+
+def run_fact_check_in_process(command, cwd=None, env=None, timeout=None, **_kwargs) -> subprocess.CompletedProcess:
+    """
+    Ejecutor para payload["executor"] que llama a fact_check_perplexity en este proceso en
+    lugar de lanzar el script: el módulo y sus clientes se cargan una vez por proceso (lotes).
+    Devuelve lo mismo que subprocess.run. No aplica `timeout`: cuenta el de Perplexity
+    (PERPLEXITY_TIMEOUT_SECONDS). Redirige stdout, así que no es para varios hilos a la vez.
+    """
+    args = list(command[2:])
+    noticia_id = args[0] if args else ""
+    output_dir = args[args.index("--output-dir") + 1] if "--output-dir" in args[:-1] else "output_temporal"
+    buffer = io.StringIO()
+    returncode = 0
+    with contextlib.redirect_stdout(buffer), contextlib.redirect_stderr(buffer):
+        try:
+            import fact_check_perplexity
+
+            resultado = fact_check_perplexity.verificar_noticia(noticia_id, _artifact_ref(output_dir))
+            if "error" in resultado:
+                print(f"Error crítico durante la verificación: {resultado['error']}")
+                returncode = 1
+            else:
+                os.makedirs(output_dir, exist_ok=True)
+                with open(os.path.join(output_dir, FACT_CHECK_ARTIFACT), "w", encoding="utf-8") as f:
+                    json.dump(resultado, f, ensure_ascii=False, indent=4)
+        except SystemExit as e:
+            # fact_check_perplexity sale con sys.exit si falta configuración al importarse
+            returncode = e.code if isinstance(e.code, int) else 1
+        except Exception as e:
+            print(f"{type(e).__name__}: {e}")
+            returncode = 1
+    return subprocess.CompletedProcess(args=command, returncode=returncode, stdout=buffer.getvalue().encode("utf-8"), stderr=b"")
+
+
+def _background_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(1, FACT_CHECK_WORKERS), thread_name_prefix="fact-check")
+        return _executor
+
+
+def _perplexity_checker(cuerpo: str):
+    from fact_check_perplexity import verificar_cuerpo
+
+    return verificar_cuerpo(cuerpo)
+
+
+def _check_in_process(cuerpo: str, enable_fact_checking: bool, perplexity_api_key: Optional[str], checker) -> Tuple[Dict[str, Any], int]:
+    start = time.perf_counter()
+    if not enable_fact_checking:
+        block = _build_fact_checking_block("skipped", "disabled_by_flag")
+    elif not str(perplexity_api_key or "").strip():
+        block = _build_fact_checking_block("unavailable", "missing_api_key")
+    else:
+        try:
+            # (análisis, fuentes) o, en modo claims, (análisis, fuentes, afirmaciones)
+            analysis, sources, *rest = checker(cuerpo)
+            claims = rest[0] if rest else None
+            if str(analysis or "").strip():
+                block = _build_fact_checking_block("available", "ok", {"analysis": analysis, "sources": sources, "claims": claims})
+            else:
+                block = _build_fact_checking_block("unavailable", "empty_response")
+        except Exception as e:
+            block = _build_fact_checking_block("unavailable", _classify_reason(str(e), returncode=1))
+    return block, int((time.perf_counter() - start) * 1000)
+
+
+def start_fact_checking(
+    cuerpo: str,
+    enable_fact_checking: Optional[bool] = None,
+    perplexity_api_key: Optional[str] = None,
+    checker=None,
+) -> Future:
+    """
+    Lanza el fact-check de `cuerpo` en un hilo de este proceso, sin subproceso ni relectura de
+    la noticia, para solaparlo con el análisis. El Future da (bloque, duración en ms) y no
+    falla: los errores del proveedor dan un bloque unavailable. Se recoge con finish_fact_checking.
+    """
+    if enable_fact_checking is None:
+        enable_fact_checking = ENABLE_FACT_CHECKING_DEFAULT
+    if perplexity_api_key is None:
+        perplexity_api_key = os.getenv("PERPLEXITY_API_KEY")
+    return _background_executor().submit(
+        _check_in_process, cuerpo, bool(enable_fact_checking), perplexity_api_key, checker or _perplexity_checker
+    )
+
+
+def finish_fact_checking(
+    future: Future,
+    noticia_id: str,
+    output_dir: Optional[str] = None,
+    timeout: Optional[float] = None,
+    logger=print,
+) -> Dict[str, Any]:
+    """
+    Espera el fact-check de start_fact_checking. Devuelve el bloque, el paso y `update_doc` (el
+    mismo $set que run_fact_checking) para guardarlo junto con el análisis; con output_dir
+    escribe además fact_check_analisis.json para render_latex.py.
+    """
+    try:
+        block, duration_ms = future.result(timeout=timeout)
+    except FutureTimeoutError:
+        block, duration_ms = _build_fact_checking_block("unavailable", "timeout"), int((timeout or 0) * 1000)
+    step = _build_fact_checking_step(block, duration_ms)
+    artifact = None
+    if output_dir:
+        _write_fact_check_artifact(output_dir, noticia_id, block, logger=logger)
+        artifact = _artifact_ref(output_dir)
+    logger(
+        "fact_checking in_process "
+        f"doc_id={noticia_id} status={block.get('status')} reason={block.get('reason')} duration_ms={duration_ms}"
+    )
+    return {
+        "fact_checking": block,
+        "pipeline_step": step,
+        "update_doc": _fact_checking_update_doc(block, step, artifact),
+    }
+
+
+def merge_fact_checking(update_fields: Dict[str, Any], outcome: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Vuelca el update_doc de finish_fact_checking en el $set del análisis, que lleva
+    evaluation_result y pipeline enteros (un $set no admite a la vez "a" y "a.b").
+    """
+    for key, value in outcome["update_doc"].items():
+        parent, _, child = key.rpartition(".")
+        if parent == "evaluation_result":
+            update_fields.setdefault("evaluation_result", {})[child] = value
+        elif parent == "pipeline.steps":
+            update_fields.setdefault("pipeline", {}).setdefault("steps", {})[child] = value
+        else:
+            update_fields[key] = value
+    return update_fields
 
 
 def run_fact_checking(payload: Dict[str, Any]) -> Dict[str, Any]:
@@ -298,7 +455,7 @@ def run_fact_checking(payload: Dict[str, Any]) -> Dict[str, Any]:
     elif not str(perplexity_api_key or "").strip():
         block = _build_fact_checking_block("unavailable", "missing_api_key")
     else:
-        command = [venv_python, "fact_check_perplexity.py", noticia_id]
+        command = [venv_python, "fact_check_perplexity.py", noticia_id, "--output-dir", os.path.abspath(output_dir)]
         artifact_path = os.path.join(output_dir, FACT_CHECK_ARTIFACT)
 
         try:
@@ -337,7 +494,7 @@ def run_fact_checking(payload: Dict[str, Any]) -> Dict[str, Any]:
     if write_artifact:
         _write_fact_check_artifact(output_dir, noticia_id, block, logger=logger)
     if persist_to_mongo:
-        _persist_fact_checking_mongo(noticia_id, block, step, logger=logger)
+        _persist_fact_checking_mongo(noticia_id, block, step, logger=logger, artifact=_artifact_ref(output_dir))
 
     logger(
         "fact_checking "
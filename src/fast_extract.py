@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Extracción rápida para el crawler.
+
+- Portadas: solo se recorren los <a href> con el parser HTML de lxml, sin construir
+  un árbol BeautifulSoup de toda la página.
+- Artículos: se usan los extractores de newspaper directamente para sacar título,
+  autores, fecha y cuerpo, sin tags, meta keywords, imágenes ni is_media_news()
+  (las imágenes se pueden pedir con con_imagenes=True).
+"""
+import io
+from urllib.parse import urljoin
+
+from lxml import etree
+from newspaper.cleaners import DocumentCleaner
+from newspaper.configuration import Configuration
+from newspaper.extractors import ContentExtractor
+from newspaper.outputformatters import OutputFormatter
+
+
+def extraer_enlaces(html, base_url, limite=None):
+    """
+    Enlaces absolutos (http/https) de los <a href> de una página.
+    :param html: HTML en bytes o str.
+    """
+    if isinstance(html, str):
+        html = html.encode("utf-8", errors="replace")
+    enlaces = set()
+    for _event, elem in etree.iterparse(io.BytesIO(html), events=("end",), tag="a", html=True, recover=True):
+        href = elem.get("href")
+        elem.clear()
+        if not href:
+            continue
+        enlace = urljoin(base_url, href.strip())
+        if enlace.startswith("http"):
+            enlaces.add(enlace)
+            if limite and len(enlaces) >= limite:
+                break
+    return enlaces
+
+
+def parsear_articulo(url, html, con_imagenes=False):
+    """
+    Parseo mínimo de un artículo. Devuelve las mismas claves que el parseo completo
+    (tags, keywords e imágenes vacías salvo con_imagenes=True) para que los
+    documentos guardados tengan siempre la misma forma.
+    """
+    config = Configuration()
+    config.fetch_images = con_imagenes
+    extractor = ContentExtractor(config)
+    output_formatter = OutputFormatter(config)
+    document_cleaner = DocumentCleaner(config)
+
+    doc = config.get_parser().fromstring(html)
+    if doc is None:
+        raise ValueError("HTML no parseable")
+
+    meta_lang = extractor.get_meta_lang(doc)
+    if meta_lang and config.use_meta_language:
+        # Como newspaper: las stopwords del idioma de la página guían la elección del nodo de texto
+        extractor.update_language(meta_lang[:2])
+        output_formatter.update_language(meta_lang[:2])
+
+    titulo = extractor.get_title(doc)
+    autores = extractor.get_authors(doc)
+    fecha = extractor.get_publishing_date(url, doc)
+    top_image = None
+    images = []
+    if con_imagenes:
+        top_image = extractor.get_meta_img_url(url, doc) or None
+        images = sorted(extractor.get_img_urls(url, doc))
+
+    doc = document_cleaner.clean(doc)
+    top_node = extractor.calculate_best_node(doc)
+    texto = ""
+    if top_node is not None:
+        top_node = extractor.post_cleanup(top_node)
+        texto, _article_html = output_formatter.get_formatted(top_node)
+
+    return {
+        "url": url,
+        "titulo": titulo.strip() if titulo else "Sin título",
+        "cuerpo": texto.strip() if texto else "Sin contenido",
+        "fecha_publicacion": fecha.isoformat() if fecha else None,
+        "autor": autores,
+        "tags": [],
+        "keywords": [],
+        "top_image": top_image,
+        "images": images,
+        # Sin is_media_news: no se calcula, y un False inventado pisaría el valor real al re-parsear
+    }
@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Descubrimiento de noticias por RSS/Atom y sitemaps (incluidos news-sitemaps).
+
+Los XML se recorren con iterparse liberando cada elemento al terminarlo, así que el coste
+por fuente es un parseo XML pequeño. Cada feed guarda en `fetch_metadata` una marca de agua
+(la fecha más reciente descargada: `pubDate`, `updated` o `lastmod`) y solo se emiten entradas
+posteriores a ella.
+"""
+import io
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from crawler_http import fetch
+from env_config import get_env_int
+
+
+CRAWL_SITEMAP_MAX_CHILDREN = get_env_int("CRAWL_SITEMAP_MAX_CHILDREN", 5)
+
+
+def _local(tag):
+    return tag.rsplit("}", 1)[-1] if isinstance(tag, str) else ""
+
+
+def parse_feed_date(value):
+    """Fecha de RSS (RFC 822) o de Atom/sitemap (ISO 8601) como datetime UTC, o None."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        try:
+            parsed = parsedate_to_datetime(value)
+        except (TypeError, ValueError, IndexError):
+            return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def _ns(tag):
+    return tag[1:].split("}", 1)[0] if isinstance(tag, str) and tag.startswith("{") else ""
+
+
+def _text(elem, *names):
+    # Primero los hijos directos del mismo espacio de nombres que el elemento (el <title> de un
+    # item antes que su <media:title>, aunque este vaya delante), luego el resto de hijos
+    # directos y por último cualquier descendiente (<news:title> de un news-sitemap)
+    hijos = list(elem)
+    propios = [child for child in hijos if _ns(child.tag) == _ns(elem.tag)]
+    for child in propios + hijos + list(elem.iter()):
+        if _local(child.tag) in names and child.text and child.text.strip():
+            return child.text.strip()
+    return None
+
+
+def _atom_link(entry):
+    fallback = None
+    for child in entry:
+        if _local(child.tag) != "link":
+            continue
+        href = child.get("href")
+        if not href:
+            continue
+        if child.get("rel", "alternate") == "alternate":
+            return href
+        fallback = fallback or href
+    return fallback
+
+
+def iter_feed_entries(source):
+    """
+    Recorre un RSS, Atom, urlset o sitemapindex y produce dicts
+    {"tipo": "entrada" | "sitemap", "url", "titulo", "fecha"}.
+    :param source: bytes o un objeto file-like con el XML.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+
+    for event, elem in ET.iterparse(source, events=("end",)):
+        tag = _local(elem.tag)
+        if tag == "item":
+            url = _text(elem, "link") or _text(elem, "guid")
+            fecha = _text(elem, "pubDate", "date", "updated")
+            yield {"tipo": "entrada", "url": url, "titulo": _text(elem, "title"), "fecha": parse_feed_date(fecha)}
+        elif tag == "entry":
+            fecha = _text(elem, "updated", "published")
+            yield {"tipo": "entrada", "url": _atom_link(elem), "titulo": _text(elem, "title"), "fecha": parse_feed_date(fecha)}
+        elif tag == "url":
+            # news-sitemap: <news:news><news:title/><news:publication_date/></news:news>
+            fecha = _text(elem, "publication_date") or _text(elem, "lastmod")
+            yield {"tipo": "entrada", "url": _text(elem, "loc"), "titulo": _text(elem, "title"), "fecha": parse_feed_date(fecha)}
+        elif tag == "sitemap":
+            yield {"tipo": "sitemap", "url": _text(elem, "loc"), "titulo": None, "fecha": parse_feed_date(_text(elem, "lastmod"))}
+        else:
+            continue
+        elem.clear()
+
+
+class FeedDiscovery:
+    """
+    Descarga feeds/sitemaps con GET condicional y devuelve solo las entradas nuevas
+    respecto a la marca de agua guardada en `fetch_metadata`.
+
+    La marca de agua no avanza en discover(): lo hace confirmar(), cuando el llamador ya ha
+    descargado (o encolado en la frontera) las entradas, y solo hasta antes de la primera que
+    falló, para que se vuelva a descubrir en la siguiente pasada.
+    """
+
+    def __init__(self, fetch_metadata, http, limiter=None):
+        self.fetch_metadata = fetch_metadata
+        self.http = http
+        self.limiter = limiter
+        # feed_url -> (marca de agua anterior, [(fecha, urls de la entrada)], response, hash del cuerpo)
+        self._pendientes = {}
+
+    def _watermark(self, url):
+        meta = self.fetch_metadata.get(url) or {}
+        watermark = meta.get("watermark")
+        if watermark is not None and watermark.tzinfo is None:
+            watermark = watermark.replace(tzinfo=timezone.utc)
+        return watermark
+
+    def discover(self, feed_url, _depth=0):
+        """
+        :return: dict url -> {"titulo", "fecha_publicacion"} con las entradas nuevas del feed
+                 (y, para un sitemapindex, de sus sitemaps hijos modificados).
+        """
+        watermark = self._watermark(feed_url)
+        estado, response, body_hash = self.fetch_metadata.fetch_conditional(
+            self.http, feed_url, "feed", limiter=self.limiter, fetcher=fetch
+        )
+        if estado != "changed":
+            return {}
+
+        nuevas = {}
+        hijos = []
+        grupos = []
+        for entrada in iter_feed_entries(response.content):
+            url, fecha = entrada["url"], entrada["fecha"]
+            if not url or not url.startswith("http"):
+                continue
+            if fecha is not None and watermark is not None and fecha <= watermark:
+                continue
+            if entrada["tipo"] == "sitemap":
+                hijos.append(entrada)
+                continue
+            grupos.append((fecha, {url}))
+            nuevas[url] = {
+                "titulo": entrada["titulo"],
+                "fecha_publicacion": fecha.isoformat() if fecha else None,
+            }
+
+        if _depth == 0 and hijos:
+            epoch = datetime.min.replace(tzinfo=timezone.utc)
+            hijos.sort(key=lambda h: h["fecha"] or epoch, reverse=True)
+            for hijo in hijos[:CRAWL_SITEMAP_MAX_CHILDREN]:
+                try:
+                    del_hijo = self.discover(hijo["url"], _depth=1)
+                except Exception as e:
+                    print(f"Error al leer el sitemap {hijo['url']}: {e}")
+                    # Sin marca nueva para el índice: el hijo se vuelve a leer la próxima vez
+                    del_hijo = None
+                nuevas.update(del_hijo or {})
+                grupos.append((hijo["fecha"], set(del_hijo) if del_hijo is not None else {None}))
+
+        self._pendientes[feed_url] = (watermark, grupos, response, body_hash)
+        return nuevas
+
+    def confirmar(self, fallidas=()):
+        """
+        Avanza la marca de agua de los feeds leídos desde el último confirmar() y guarda su
+        ETag y hash. `fallidas` son las URL que no se pudieron descargar: la marca se queda
+        antes de la más antigua de ellas y el feed se vuelve a parsear aunque no cambie (no se
+        guardan su ETag ni su hash).
+        """
+        fallidas = set(fallidas)
+        fallidas.add(None)
+        pendientes, self._pendientes = self._pendientes, {}
+        for feed_url, (watermark, grupos, response, body_hash) in pendientes.items():
+            fechas_fallidas = [fecha for fecha, urls in grupos if fecha is not None and urls & fallidas]
+            limite = min(fechas_fallidas) if fechas_fallidas else None
+            fechas_ok = [
+                fecha for fecha, urls in grupos
+                if fecha is not None and not urls & fallidas and (limite is None or fecha < limite)
+            ]
+            campos = {}
+            max_fecha = max(fechas_ok) if fechas_ok else None
+            if max_fecha is not None and (watermark is None or max_fecha > watermark):
+                campos["watermark"] = max_fecha
+            if any(urls & fallidas for _fecha, urls in grupos):
+                campos.update({"etag": None, "last_modified": None, "content_hash": None})
+                self.fetch_metadata.set_fields(feed_url, campos)
+            else:
+                self.fetch_metadata.record(feed_url, response, body_hash, "feed", extra=campos)
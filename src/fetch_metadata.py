@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import threading
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ASCENDING, DESCENDING
+
+
+COLLECTION_NAME = "fetch_metadata"
+REANALYSIS_COLLECTION_NAME = "reanalysis_queue"
+# Un re-análisis reservado que no se cierra en este tiempo (proceso caído) vuelve a estar disponible
+REANALYSIS_LEASE = timedelta(hours=6)
+_indexes_ensured = False
+_indexes_lock = threading.Lock()
+
+
+def content_hash(body):
+    if isinstance(body, str):
+        body = body.encode("utf-8", errors="replace")
+    return hashlib.sha256(body or b"").hexdigest()
+
+
+def ensure_indexes(db):
+    global _indexes_ensured
+    if _indexes_ensured:
+        return
+
+    with _indexes_lock:
+        if _indexes_ensured:
+            return
+        db[COLLECTION_NAME].create_index([("url", ASCENDING)], unique=True, name="ux_fetch_metadata_url")
+        db[REANALYSIS_COLLECTION_NAME].create_index(
+            [("noticia_id", ASCENDING)], unique=True, name="ux_reanalysis_queue_noticia_id"
+        )
+        db[REANALYSIS_COLLECTION_NAME].create_index(
+            [("status", ASCENDING), ("requested_at", DESCENDING)], name="ix_reanalysis_queue_status_requested"
+        )
+        _indexes_ensured = True
+
+
+class FetchMetadataStore:
+    """
+    Metadatos de descarga por URL (ETag, Last-Modified y hash del cuerpo) para
+    poder hacer GET condicionales y saltarse el parseo de contenido que no cambió.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.collection = db[COLLECTION_NAME]
+        ensure_indexes(db)
+
+    def get(self, url):
+        return self.collection.find_one({"url": url}, {"_id": 0})
+
+    @staticmethod
+    def conditional_headers(meta):
+        headers = {}
+        if not meta:
+            return headers
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def record(self, url, response, body_hash, tipo, extra=None):
+        now_utc = datetime.now(timezone.utc)
+        fields = {
+            "url": url,
+            "tipo": tipo,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "content_hash": body_hash,
+            "status_code": response.status_code,
+            "fetched_at": now_utc,
+        }
+        if extra:
+            fields.update(extra)
+        self.collection.update_one({"url": url}, {"$set": fields}, upsert=True)
+
+    def set_fields(self, url, fields):
+        self.collection.update_one({"url": url}, {"$set": fields}, upsert=True)
+
+    def mark_not_modified(self, url):
+        self.collection.update_one(
+            {"url": url},
+            {"$set": {"status_code": 304, "fetched_at": datetime.now(timezone.utc)}},
+        )
+
+    def fetch_conditional(self, http, url, tipo, limiter=None, fetcher=None):
+        """
+        GET condicional de una URL.
+        :param http: requests.Session (o el propio módulo requests).
+        :param fetcher: función (http, limiter, url, headers=...) -> Response; por defecto http.get.
+        :return: (estado, response, body_hash) con estado en {"not_modified", "unchanged", "changed"}.
+                 response y body_hash son None si el servidor devolvió 304. Con "changed" no se
+                 guarda nada: el llamador hace record(url, response, body_hash, tipo) cuando ha
+                 procesado el cuerpo, para que un fallo no lo deje como ya visto.
+        """
+        meta = self.get(url)
+        headers = self.conditional_headers(meta)
+        if fetcher is not None:
+            response = fetcher(http, limiter, url, headers=headers)
+        else:
+            response = http.get(url, timeout=10, headers=headers)
+
+        if response.status_code == 304:
+            self.mark_not_modified(url)
+            return "not_modified", None, None
+
+        response.raise_for_status()
+        body_hash = content_hash(response.content)
+        if not meta or meta.get("content_hash") != body_hash:
+            return "changed", response, body_hash
+        self.record(url, response, body_hash, tipo)
+        return "unchanged", response, body_hash
+
+    def enqueue_reanalysis(self, noticia_id, url, reason="content_changed"):
+        """
+        Encola una noticia ya analizada para que se vuelva a analizar
+        (`analiza_lote.py --from-reanalysis-queue` vacía la cola).
+        """
+        now_utc = datetime.now(timezone.utc)
+        self.db[REANALYSIS_COLLECTION_NAME].update_one(
+            {"noticia_id": noticia_id},
+            {
+                "$set": {"url": url, "reason": reason, "status": "pending", "requested_at": now_utc},
+                "$setOnInsert": {"noticia_id": noticia_id, "created_at": now_utc},
+            },
+            upsert=True,
+        )
+
+    def claim_reanalysis(self, limit=None):
+        """
+        Reserva los re-análisis pendientes, de más antiguo a más reciente.
+        :param limit: Número máximo de noticias a reservar (por defecto todas).
+        :return: Lista de noticia_id reservados (status=in_progress).
+        """
+        queue = self.db[REANALYSIS_COLLECTION_NAME]
+        ids = []
+        while limit is None or len(ids) < limit:
+            now_utc = datetime.now(timezone.utc)
+            doc = queue.find_one_and_update(
+                {"$or": [
+                    {"status": "pending"},
+                    {"status": "in_progress", "claimed_at": {"$lt": now_utc - REANALYSIS_LEASE}},
+                ]},
+                {"$set": {"status": "in_progress", "claimed_at": now_utc}},
+                sort=[("requested_at", ASCENDING)],
+            )
+            if doc is None:
+                break
+            ids.append(doc["noticia_id"])
+        return ids
+
+    def complete_reanalysis(self, noticia_id, error=None):
+        """
+        Cierra un re-análisis reservado como done (o failed con `error`). Si la noticia se
+        volvió a encolar mientras se analizaba sigue pending y se analizará otra vez.
+        """
+        self.db[REANALYSIS_COLLECTION_NAME].update_one(
+            {"noticia_id": noticia_id, "status": "in_progress"},
+            {"$set": {
+                "status": "failed" if error else "done",
+                "error": error,
+                "completed_at": datetime.now(timezone.utc),
+            }},
+        )
+
+    def release_reanalysis(self, noticia_id):
+        """Devuelve a pending un re-análisis reservado que no se llegó a hacer."""
+        self.db[REANALYSIS_COLLECTION_NAME].update_one(
+            {"noticia_id": noticia_id, "status": "in_progress"},
+            {"$set": {"status": "pending"}, "$unset": {"claimed_at": ""}},
+        )
@@ -1,21 +1,22 @@
 import os
 import subprocess
 import time
-from pymongo import MongoClient, errors as pymongo_errors
+from pymongo import errors as pymongo_errors
 from bson import ObjectId
 from dotenv import load_dotenv
 import json
 import random
 import sys
 import re
-from env_config import get_env_first, get_env_int
+import mongo_clients
+from env_config import get_env_first
+from projections import proyeccion
 
 load_dotenv()
 
 # Definir el directorio raíz del proyecto (un nivel arriba de 'src')
 ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 OUTPUT_FILENAME = os.path.join(ROOT_DIR, "output_temporal", "retrieved_news_item.txt")
-MONGO_SERVER_SELECTION_TIMEOUT_MS = get_env_int("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000)
 
 
 def _read_mongo_uri():
@@ -41,10 +42,11 @@ def fetch_news_item(noticia_id):
     if not mongodb_uri:
         print("Error: MONGO_WRITE_URI/NEW_MONGODB_URI not found in .env file.")
         return None
-    client = MongoClient(mongodb_uri, serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS)
-    db = client[os.getenv("MONGO_DB_NAME", "Base_de_datos_noticias")]
+    # Client compartido del proceso; primario para leer lo que el análisis acaba de escribir
+    db = mongo_clients.get_database(mongodb_uri, os.getenv("MONGO_DB_NAME", "Base_de_datos_noticias"), workload="pipeline")
     col = db[os.getenv("MONGO_COLLECTION_NAME", "Noticias")]
-    noticia = col.find_one({'_id': ObjectId(noticia_id)})
+    # Solo los campos que usa render_latex (sin embedding ni HTML de valoraciones)
+    noticia = col.find_one({'_id': ObjectId(noticia_id)}, proyeccion("pdf"))
     if noticia:
         noticia = convert_objectids_to_str(noticia)
         return noticia
@@ -68,24 +70,22 @@ def get_specific_news_item(article_id_str, collection_names_to_try=["noticias",
         print("Error: Mongo URI not found in .env file.")
         return None
     try:
-        client = MongoClient(mongodb_uri, serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS)
+        client = mongo_clients.get_client(mongodb_uri)
         client.admin.command('ping'); db = client.get_default_database()
         news_item = None; target_object_id = ObjectId(article_id_str)
         query = {"_id": target_object_id}; print(f"Attempting to fetch by ID: {article_id_str}")
         for name in collection_names_to_try:
             if name in db.list_collection_names():
                 collection_to_use = db[name]; print(f"Using collection: {name}")
-                news_item = collection_to_use.find_one(query)
+                news_item = collection_to_use.find_one(query, proyeccion("pdf"))
                 if news_item: print(f"Found: {news_item.get('_id')}"); break
-        if not news_item: print(f"ID {article_id_str} not found."); client.close(); return None
+        if not news_item: print(f"ID {article_id_str} not found."); return None
         if '_id' in news_item and isinstance(news_item['_id'], ObjectId): news_item['_id'] = str(news_item['_id'])
         
         with open(OUTPUT_FILENAME, "w", encoding="utf-8") as f:
             json.dump(news_item, f, ensure_ascii=False, indent=4)
         print(f"Saved to {OUTPUT_FILENAME}"); return news_item
     except Exception as e: print(f"Error in get_specific_news_item: {e}"); return None
-    finally:
-        if 'client' in locals() and client: client.close()
 
 def get_news_item_by_url(url_str, collection_names_to_try=["noticias", "Noticias"]):
     """
@@ -96,22 +96,20 @@ def get_news_item_by_url(url_str, collection_names_to_try=["noticias", "Noticias
     mongodb_uri = _read_mongo_uri()
     if not mongodb_uri: print("Error: Mongo URI not found."); return None
     try:
-        client = MongoClient(mongodb_uri, serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS)
+        client = mongo_clients.get_client(mongodb_uri)
         client.admin.command('ping'); db = client.get_default_database()
         news_item = None; query = {"url": url_str}
         print(f"Attempting to fetch article with URL: {url_str}")
         for name in collection_names_to_try:
             if name in db.list_collection_names():
                 collection_to_use = db[name]; print(f"Using collection: {name}")
-                news_item = collection_to_use.find_one(query)
+                news_item = collection_to_use.find_one(query, proyeccion("pdf"))
                 if news_item: print(f"Found: {news_item.get('_id')}"); break
-        if not news_item: print(f"URL {url_str} not found."); client.close(); return None
+        if not news_item: print(f"URL {url_str} not found."); return None
         if '_id' in news_item and isinstance(news_item['_id'], ObjectId): news_item['_id'] = str(news_item['_id'])
         with open(OUTPUT_FILENAME, "w", encoding="utf-8") as f: json.dump(news_item, f, ensure_ascii=False, indent=4)
         print(f"Saved to {OUTPUT_FILENAME}"); return news_item
     except Exception as e: print(f"Error in get_news_item_by_url: {e}"); return None
-    finally:
-        if 'client' in locals() and client: client.close()
 
 def get_news_item_with_score(exclude_ids_str_list=None, collection_names_to_try=["noticias", "Noticias"], require_fuente=False):
     """
@@ -122,7 +120,7 @@ def get_news_item_with_score(exclude_ids_str_list=None, collection_names_to_try=
     mongodb_uri = _read_mongo_uri()
     if not mongodb_uri: print("Error: Mongo URI not found."); return None
     try:
-        client = MongoClient(mongodb_uri, serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS)
+        client = mongo_clients.get_client(mongodb_uri)
         client.admin.command('ping'); db = client.get_default_database()
         news_item = None; collection_to_use = None
 
@@ -142,28 +140,37 @@ def get_news_item_with_score(exclude_ids_str_list=None, collection_names_to_try=
         for name in collection_names_to_try:
             collection_to_use = db.get_collection(name) # Simplified collection access
             if collection_to_use is not None : print(f"Using collection: {name}") # Check if collection exists
-            # Obtener todos los documentos que cumplen el criterio
-            docs = list(collection_to_use.find(query))
-            if docs:
-                news_item = random.choice(docs)
+            # Elegir al azar entre los IDs que cumplen el criterio y leer solo ese documento
+            ids = [doc["_id"] for doc in collection_to_use.find(query, {"_id": 1})]
+            if ids:
+                news_item = collection_to_use.find_one({"_id": random.choice(ids)}, proyeccion("pdf"))
                 print(f"Found news item with ID: {news_item.get('_id')}"); break
 
-        if collection_to_use is None: print(f"Error: None of the specified collections were found."); client.close(); return None # Should not happen if list_collection_names was checked before
+        if collection_to_use is None: print(f"Error: None of the specified collections were found."); return None # Should not happen if list_collection_names was checked before
 
         if news_item:
             if '_id' in news_item and isinstance(news_item['_id'], ObjectId): news_item['_id'] = str(news_item['_id'])
             with open(OUTPUT_FILENAME, "w", encoding="utf-8") as f: json.dump(news_item, f, ensure_ascii=False, indent=4)
             print(f"News item saved to {OUTPUT_FILENAME}"); return news_item
-        else: print(f"No news item found matching criteria (Query: {query})."); client.close(); return None
+        else: print(f"No news item found matching criteria (Query: {query})."); return None
     except Exception as e: print(f"Error in get_news_item_with_score: {e}"); return None
-    finally:
-        if 'client' in locals() and client: client.close()
 
 # Main execution block reverted to a generic example
 if __name__ == "__main__":
     print("Running fetch_news_item.py directly as a standalone script.")
-    if len(sys.argv) > 1:
-        article_id = sys.argv[1]
+    args = sys.argv[1:]
+    if "--output-dir" in args:
+        # Directorio de trabajo de la ejecución (analiza_y_guarda.py / workspace.py)
+        idx = args.index("--output-dir")
+        output_dir = args[idx + 1] if idx + 1 < len(args) else None
+        if not output_dir:
+            print("Uso: python fetch_news_item.py [ID] [--output-dir DIR]")
+            sys.exit(1)
+        os.makedirs(output_dir, exist_ok=True)
+        OUTPUT_FILENAME = os.path.join(output_dir, "retrieved_news_item.txt")
+        del args[idx:idx + 2]
+    if args:
+        article_id = args[0]
         print(f"Fetching by id: {article_id}")
         retrieved_item = fetch_news_item(article_id)
         if retrieved_item:
@@ -171,7 +178,7 @@ if __name__ == "__main__":
                 json.dump(retrieved_item, f, ensure_ascii=False, indent=4)
             print(f"Saved to {OUTPUT_FILENAME}")
     else:
-        print(f"This will attempt to fetch one news item with 'puntuacion' not null and save it to output_temporal.")
+        print(f"This will attempt to fetch one news item with 'puntuacion' not null and save it to {os.path.dirname(OUTPUT_FILENAME)}.")
         retrieved_item = get_news_item_with_score()
 
     if retrieved_item:
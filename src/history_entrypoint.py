@@ -11,6 +11,23 @@ def _print_json(payload):
     print(json.dumps(payload, ensure_ascii=False))
 
 
+def handle_request(data):
+    """Atiende una petición {action, userId, limit, item}; usado también por query_service."""
+    action = data.get("action")
+    user_id = data.get("userId")
+    limit = data.get("limit", 4)
+
+    if action == "get_history":
+        return get_user_history(user_id=user_id, limit=limit)
+    if action == "push_history":
+        return upsert_user_history_item(
+            user_id=user_id,
+            item=data.get("item") or {},
+            limit=limit,
+        )
+    return {"ok": False, "error": "Acción no soportada."}
+
+
 def main():
     try:
         raw = sys.stdin.read()
@@ -20,22 +37,7 @@ def main():
             _print_json({"ok": False, "error": "Se requiere JSON de entrada via stdin."})
             return 1
 
-        data = json.loads(raw)
-        action = data.get("action")
-        user_id = data.get("userId")
-        limit = data.get("limit", 4)
-
-        if action == "get_history":
-            result = get_user_history(user_id=user_id, limit=limit)
-        elif action == "push_history":
-            result = upsert_user_history_item(
-                user_id=user_id,
-                item=data.get("item") or {},
-                limit=limit,
-            )
-        else:
-            result = {"ok": False, "error": "Acción no soportada."}
-
+        result = handle_request(json.loads(raw))
         _print_json(result)
         return 0 if result.get("ok") else 1
     except json.JSONDecodeError:
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Caché local del HTML crudo de los artículos descargados.
+
+Cada entrada se guarda comprimida (zstd si `zstandard` está instalado, gzip si no) en
+`<dir>/<hash[:2]>/<hash>.html.zst|gz`, donde hash es el SHA-256 de la URL (el mismo
+`identificador` de la noticia). La primera línea del contenido es la URL, para poder
+re-parsear sin consultar Mongo. El tamaño total se acota expulsando las entradas
+menos usadas (por mtime; una lectura actualiza el mtime).
+"""
+import gzip
+import hashlib
+import os
+import threading
+
+from env_config import get_env, get_env_bool, get_env_int
+
+try:
+    import zstandard
+except ImportError:  # gzip como alternativa sin dependencias
+    zstandard = None
+
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SRC_DIR)
+HTML_CACHE_ENABLED = get_env_bool("CRAWL_HTML_CACHE", False)
+HTML_CACHE_DIR = os.path.join(ROOT_DIR, get_env("CRAWL_HTML_CACHE_DIR", os.path.join("cache", "html")))
+HTML_CACHE_MAX_MB = get_env_int("CRAWL_HTML_CACHE_MAX_MB", 2048)
+# Al superar el límite se expulsa hasta quedar en esta fracción, para no expulsar en cada put.
+EVICT_TARGET_RATIO = 0.9
+ZSTD_LEVEL = 6
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def url_hash(url):
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
+class HtmlCache:
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory or HTML_CACHE_DIR
+        self.max_bytes = int(max_bytes if max_bytes is not None else HTML_CACHE_MAX_MB * 1024 * 1024)
+        self.extension = ".html.zst" if zstandard is not None else ".html.gz"
+        self._lock = threading.Lock()
+        self._total_bytes = None
+
+    def _compress(self, data):
+        if zstandard is not None:
+            return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+        return gzip.compress(data, compresslevel=6)
+
+    @staticmethod
+    def _decompress(path, data):
+        if path.endswith(".zst"):
+            if zstandard is None:
+                raise RuntimeError("Entrada zstd en caché pero 'zstandard' no está instalado")
+            return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+        return gzip.decompress(data)
+
+    def _path(self, key, extension=None):
+        return os.path.join(self.directory, key[:2], key + (extension or self.extension))
+
+    def _existing_path(self, url):
+        key = url_hash(url)
+        for extension in (self.extension, ".html.zst", ".html.gz"):
+            path = self._path(key, extension)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _iter_paths(self):
+        if not os.path.isdir(self.directory):
+            return
+        for prefix in os.listdir(self.directory):
+            subdir = os.path.join(self.directory, prefix)
+            if not os.path.isdir(subdir):
+                continue
+            for name in os.listdir(subdir):
+                if name.endswith(".html.zst") or name.endswith(".html.gz"):
+                    yield os.path.join(subdir, name)
+
+    def put(self, url, html):
+        if not html:
+            return
+        if isinstance(html, bytes):
+            html = html.decode("utf-8", errors="replace")
+        payload = self._compress((url + "\n" + html).encode("utf-8"))
+        path = self._path(url_hash(url))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+        with self._lock:
+            try:
+                previous = os.path.getsize(path)
+            except OSError:
+                previous = 0
+            os.replace(tmp_path, path)
+            if self._total_bytes is not None:
+                self._total_bytes += len(payload) - previous
+        self._evict_if_needed()
+
+    @staticmethod
+    def _read(path):
+        with open(path, "rb") as f:
+            data = HtmlCache._decompress(path, f.read()).decode("utf-8", errors="replace")
+        url, _sep, html = data.partition("\n")
+        return url, html
+
+    def get(self, url):
+        """HTML cacheado de la URL, o None si no está."""
+        path = self._existing_path(url)
+        if path is None:
+            return None
+        try:
+            _url, html = self._read(path)
+            os.utime(path, None)
+            return html
+        except (OSError, RuntimeError, EOFError, ValueError) as e:
+            print(f"Entrada de caché HTML ilegible ({type(e).__name__}): {path}")
+            return None
+
+    def __contains__(self, url):
+        return self._existing_path(url) is not None
+
+    def iter_entries(self):
+        """Recorre la caché produciendo (url, html); no toca el mtime."""
+        for path in self._iter_paths():
+            try:
+                yield self._read(path)
+            except (OSError, RuntimeError, EOFError, ValueError) as e:
+                print(f"Entrada de caché HTML ilegible ({type(e).__name__}): {path}")
+
+    def size_bytes(self):
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(os.path.getsize(path) for path in self._iter_paths())
+            return self._total_bytes
+
+    def _evict_if_needed(self):
+        if self.max_bytes <= 0 or self.size_bytes() <= self.max_bytes:
+            return
+        with self._lock:
+            entries = []
+            for path in self._iter_paths():
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _mtime, size, _path in entries)
+            target = int(self.max_bytes * EVICT_TARGET_RATIO)
+            removed = 0
+            for _mtime, size, path in sorted(entries):
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+            self._total_bytes = total
+        if removed:
+            print(f"Caché HTML: {removed} entradas expulsadas ({total / (1024 * 1024):.0f} MB en uso)")
+
+    @classmethod
+    def shared(cls, directory=None):
+        """Una instancia por directorio y proceso."""
+        directory = directory or HTML_CACHE_DIR
+        with _shared_lock:
+            cache = _shared.get(directory)
+            if cache is None:
+                cache = cls(directory)
+                _shared[directory] = cache
+            return cache
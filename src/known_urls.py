@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+import threading
+import time
+from array import array
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+
+from env_config import get_env, get_env_int
+
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SRC_DIR)
+KNOWN_URLS_PATH = os.path.join(ROOT_DIR, get_env("CRAWL_KNOWN_URLS_PATH", os.path.join("cache", "known_urls.bin")))
+KNOWN_URLS_MAX_AGE_HOURS = get_env_int("CRAWL_KNOWN_URLS_MAX_AGE_HOURS", 24)
+# Margen al ponerse al día por _id: cubre relojes desfasados entre crawlers.
+CATCH_UP_MARGIN_SECONDS = 300
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def key_from_identificador(identificador):
+    """Los 64 primeros bits del SHA-256 de la URL (el `identificador` de la noticia)."""
+    return int(str(identificador)[:16], 16)
+
+
+def url_key(url):
+    return key_from_identificador(hashlib.sha256(url.encode("utf-8")).hexdigest())
+
+
+class KnownUrlIndex:
+    """
+    Conjunto ordenado de hashes de 64 bits de las URLs ya ingeridas.
+    Se persiste en disco como un array ordenado de uint64 y se reconstruye desde la
+    colección (`identificador` / `url`) cuando el fichero no existe o es demasiado antiguo.
+    Con 64 bits la probabilidad de falso positivo es despreciable para el volumen de noticias.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or KNOWN_URLS_PATH
+        self._keys = set()
+        self._lock = threading.Lock()
+        self._dirty = False
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, url):
+        return url_key(url) in self._keys
+
+    def add(self, url):
+        key = url_key(url)
+        with self._lock:
+            if key not in self._keys:
+                self._keys.add(key)
+                self._dirty = True
+
+    def _add_doc(self, doc):
+        if doc.get("identificador"):
+            try:
+                self._keys.add(key_from_identificador(doc["identificador"]))
+                return
+            except ValueError:
+                pass
+        if doc.get("url"):
+            self._keys.add(url_key(doc["url"]))
+
+    def build_from_collection(self, collection, query=None):
+        cursor = collection.find(query or {}, {"_id": 0, "identificador": 1, "url": 1}).batch_size(5000)
+        with self._lock:
+            for doc in cursor:
+                self._add_doc(doc)
+            self._dirty = True
+
+    def catch_up(self, collection, since):
+        """Añade las noticias insertadas (por cualquier crawler) desde `since`."""
+        since = since - timedelta(seconds=CATCH_UP_MARGIN_SECONDS)
+        self.build_from_collection(collection, {"_id": {"$gte": ObjectId.from_datetime(since)}})
+
+    def load(self):
+        keys = array("Q")
+        with open(self.path, "rb") as f:
+            keys.frombytes(f.read())
+        with self._lock:
+            self._keys = set(keys)
+            self._dirty = False
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            keys = array("Q", sorted(self._keys))
+            self._dirty = False
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            keys.tofile(f)
+        os.replace(tmp_path, self.path)
+
+    @classmethod
+    def load_or_build(cls, collection, path=None, max_age_hours=None):
+        index = cls(path)
+        max_age_hours = KNOWN_URLS_MAX_AGE_HOURS if max_age_hours is None else max_age_hours
+        try:
+            mtime = os.path.getmtime(index.path)
+        except OSError:
+            mtime = None
+
+        if mtime is not None and (time.time() - mtime) < max_age_hours * 3600:
+            try:
+                index.load()
+                index.catch_up(collection, datetime.fromtimestamp(mtime, tz=timezone.utc))
+                return index
+            except Exception as e:
+                print(f"Índice de URLs conocidas ilegible ({type(e).__name__}), se reconstruye.")
+
+        index.build_from_collection(collection)
+        index.save()
+        return index
+
+    @classmethod
+    def shared(cls, collection, path=None):
+        """Una instancia por fichero y proceso, compartida por todos los Periodico."""
+        path = path or KNOWN_URLS_PATH
+        with _shared_lock:
+            index = _shared.get(path)
+            if index is None:
+                index = cls.load_or_build(collection, path)
+                _shared[path] = index
+            return index
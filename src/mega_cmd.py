@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Invocación de mega-cmd (CLI de MEGA) y sesión reutilizable para subidas.
+
+- detect_mega_cmd/run_mega_cmd: cómo llamar a los comandos mega-* (PATH o snap).
+- MegaSession: detecta mega-cmd, hace login y crea las carpetas remotas una sola vez, y la
+  comparten los hilos de mega_uploader.py; cada subida es entonces mega-put + mega-export,
+  con un nombre remoto que incluye el hash del PDF.
+
+Para pruebas basta con poner en el PATH unos scripts mega-* de mentira (mega_uploader_selfcheck.py).
+"""
+import hashlib
+import os
+import re
+import subprocess
+import threading
+
+
+MEGA_PUT_TIMEOUT = 120
+_LINK_RE = re.compile(r"https://mega\.nz/[^\s\)\]]+")
+
+
+class MegaCmdError(RuntimeError):
+    pass
+
+
+def detect_mega_cmd():
+    """
+    Detecta cómo invocar mega-cmd: "direct" (mega-* en PATH) o "snap" (snap run mega-cmd.*).
+    Returns (mode: "direct"|"snap", error_message: str or None).
+    """
+    # 1) Ejecutable directo en PATH
+    try:
+        r = subprocess.run(
+            ["mega-version"],
+            capture_output=True,
+            text=True,
+            timeout=5,
+        )
+        if r.returncode == 0:
+            return "direct", None
+    except FileNotFoundError:
+        pass
+    except subprocess.TimeoutExpired:
+        pass
+
+    # 2) Snap
+    try:
+        r = subprocess.run(
+            ["snap", "run", "mega-cmd.mega-version"],
+            capture_output=True,
+            text=True,
+            timeout=10,
+        )
+        if r.returncode == 0:
+            return "snap", None
+        # snap existe pero mega-cmd falló (permisos, no instalado, etc.)
+        err = (r.stderr or r.stdout or "").strip() or "sin salida"
+        return None, "snap run mega-cmd falló: %s. Comprueba: snap list mega-cmd y permisos." % err[:200]
+    except FileNotFoundError:
+        return None, (
+            "mega-cmd no encontrado. Instala con: snap install mega-cmd "
+            "o añade mega-version al PATH."
+        )
+    except subprocess.TimeoutExpired:
+        return None, "snap run mega-cmd no respondió (timeout). Comprueba que mega-cmd esté instalado."
+    except Exception as e:
+        return None, "mega-cmd: %s" % e
+
+
+def run_mega_cmd(mode, command, args=None, timeout=15):
+    """
+    Ejecuta un comando mega-cmd. mode "direct" -> [command, ...args]; mode "snap" -> [snap, run, mega-cmd.<command>, ...args].
+    Returns (stdout, stderr, returncode).
+    """
+    if mode == "snap":
+        cmd = ["snap", "run", "mega-cmd.%s" % command]
+    else:
+        cmd = [command]
+    if args:
+        cmd.extend(args)
+    try:
+        result = subprocess.run(
+            cmd,
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+            encoding="utf-8",
+            errors="replace",
+        )
+        return (result.stdout or "", result.stderr or "", result.returncode)
+    except subprocess.TimeoutExpired:
+        return "", "Timeout después de %ds" % timeout, -1
+    except FileNotFoundError:
+        return "", "Comando no encontrado (revisa PATH o snap).", -1
+    except Exception as e:
+        return "", str(e), -1
+
+
+def extract_mega_link(output):
+    """Primer enlace https://mega.nz/... de la salida de mega-export, o None."""
+    match = _LINK_RE.search(output or "")
+    if not match:
+        return None
+    return match.group(0).rstrip(".,;")
+
+
+class MegaSession:
+    """Sesión de mega-cmd compartida por hilos: detección, login y carpetas se hacen una vez."""
+
+    def __init__(self, email, password):
+        self.email = email
+        self.password = password
+        self.mode = None
+        self._logged_in = False
+        self._folders = set()
+        self._lock = threading.Lock()
+
+    def _run(self, command, *args, timeout=15):
+        return run_mega_cmd(self.mode, command, args=list(args) if args else None, timeout=timeout)
+
+    def _ensure_login(self):
+        if self.mode is None:
+            mode, err = detect_mega_cmd()
+            if mode is None:
+                raise MegaCmdError(err)
+            self.mode = mode
+        if self._logged_in:
+            return
+        stdout, _stderr, rc = self._run("mega-whoami")
+        if not (rc == 0 and self.email in (stdout or "")):
+            self._run("mega-logout")
+            stdout, stderr, rc = self._run("mega-login", self.email, self.password, timeout=20)
+            if rc != 0:
+                raise MegaCmdError(f"login MEGA: {(stderr or stdout or 'sin salida').strip()[:200]}")
+            print("Login MEGA OK")
+        self._logged_in = True
+
+    def _ensure_folder(self, folder):
+        if folder in self._folders:
+            return
+        current = ""
+        for part in [p for p in folder.split("/") if p]:
+            current = (current + "/" + part) if current else part
+            _stdout, _stderr, rc = self._run("mega-ls", current)
+            if rc != 0:
+                stdout, stderr, rc = self._run("mega-mkdir", current)
+                if rc != 0:
+                    raise MegaCmdError(f"no se pudo crear {current}: {(stderr or stdout or '').strip()[:200]}")
+        self._folders.add(folder)
+
+    def prepare(self, folder):
+        with self._lock:
+            self._ensure_login()
+            self._ensure_folder(folder)
+
+    def invalidate(self):
+        """Fuerza a repetir login y comprobación de carpetas (tras un error de la sesión)."""
+        with self._lock:
+            self._logged_in = False
+            self._folders.clear()
+
+    def upload(self, pdf_path, folder, digest=None):
+        """
+        Sube pdf_path a folder y devuelve el enlace público. El nombre remoto lleva el hash del
+        contenido (remote_name), así que un PDF re-renderizado con el mismo título no se confunde
+        con el anterior. Si ese fichero ya está en MEGA (intento anterior que falló al exportar,
+        o el mismo PDF), no se vuelve a subir; si ya estaba exportado, se recupera el enlace.
+        `digest` es un hash del contenido ya calculado (el _id del trabajo de la cola).
+        """
+        if not os.path.isfile(pdf_path):
+            raise MegaCmdError(f"el archivo no existe: {pdf_path}")
+        self.prepare(folder)
+        remote_path = folder.rstrip("/") + "/" + remote_name(pdf_path, digest)
+        _stdout, _stderr, rc = self._run("mega-ls", remote_path)
+        if rc != 0:
+            stdout, stderr, rc = self._run("mega-put", pdf_path, remote_path, timeout=MEGA_PUT_TIMEOUT)
+            if rc != 0:
+                self.invalidate()
+                raise MegaCmdError(f"mega-put: {(stderr or stdout or 'sin salida').strip()[:200]}")
+        stdout, stderr, rc = self._run("mega-export", "-a", remote_path)
+        link = extract_mega_link(stdout) if rc == 0 else None
+        if link is None:
+            stdout, stderr, rc = self._run("mega-export", remote_path)
+            link = extract_mega_link(stdout) if rc == 0 else None
+        if link is None:
+            raise MegaCmdError(f"mega-export sin enlace: {(stderr or stdout or 'sin salida').strip()[:200]}")
+        return link
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def remote_name(pdf_path, digest=None):
+    """<nombre>_<sha256[:12]><ext>: único por contenido aunque el nombre (el título) se repita."""
+    stem, ext = os.path.splitext(os.path.basename(pdf_path))
+    return f"{stem}_{(digest or file_sha256(pdf_path))[:12]}{ext}"
@@ -0,0 +1,311 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+mega_uploader.py: cola persistente de subidas de PDF a MEGA y el proceso que la vacía.
+
+Con MEGA_UPLOAD_MODE=queue, render_latex.py no sube el PDF: lo copia a MEGA_UPLOAD_SPOOL_DIR
+(fuera de los directorios de trabajo, que se borran por antigüedad), lo encola en la colección
+`pdf_upload_queue` (BD nueva) y termina. Este proceso:
+
+- Mantiene una única sesión de mega-cmd (MegaSession): login y carpetas una sola vez.
+- Reclama trabajos con find_one_and_update (pendientes o con el lease vencido), así que
+  varios uploaders pueden compartir la cola, y sube MEGA_UPLOAD_WORKERS a la vez.
+- Reintenta con espera exponencial hasta MEGA_UPLOAD_MAX_ATTEMPTS; luego el trabajo queda
+  en `failed` y pipeline.steps.pdf.upload lo refleja.
+- Al terminar escribe el enlace en pipeline.steps.pdf de todas las noticias del trabajo y
+  en el almacén de artefactos (pdf_artifacts.py), y borra la copia del spool.
+
+El _id del trabajo es el hash del .tex: el mismo PDF no se encola ni se sube dos veces.
+
+Uso:
+  python mega_uploader.py             # proceso residente
+  python mega_uploader.py --once      # vacía lo que esté listo y termina
+  python mega_uploader.py --status    # recuento por estado
+"""
+import argparse
+import os
+import shutil
+import socket
+import sys
+import threading
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from dotenv import load_dotenv
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import PyMongoError
+
+# .env antes de los imports locales: las MEGA_UPLOAD_*, PDF_ARTIFACTS_* y el pool de Mongo se leen al importar
+load_dotenv(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".env"))
+
+import mongo_clients
+from env_config import get_env, get_env_first, get_env_int
+from mega_cmd import MegaCmdError, MegaSession, file_sha256
+from pdf_artifacts import PDF_ARTIFACTS_ENABLED, PdfArtifactStore
+
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SRC_DIR)
+MEGA_UPLOAD_MODE = (get_env("MEGA_UPLOAD_MODE", "inline") or "inline").lower()
+MEGA_UPLOAD_QUEUE_COLLECTION = get_env("MEGA_UPLOAD_QUEUE_COLLECTION", "pdf_upload_queue")
+MEGA_UPLOAD_SPOOL_DIR = os.path.join(ROOT_DIR, get_env("MEGA_UPLOAD_SPOOL_DIR", os.path.join("cache", "upload_spool")))
+MEGA_UPLOAD_WORKERS = get_env_int("MEGA_UPLOAD_WORKERS", 3)
+MEGA_UPLOAD_MAX_ATTEMPTS = get_env_int("MEGA_UPLOAD_MAX_ATTEMPTS", 5)
+MEGA_UPLOAD_LEASE_SECONDS = get_env_int("MEGA_UPLOAD_LEASE_SECONDS", 600)
+MEGA_UPLOAD_POLL_SECONDS = get_env_int("MEGA_UPLOAD_POLL_SECONDS", 2)
+MEGA_FOLDER_PATH = "HemingwAI/PDF hemingwAI"
+RETRY_MAX_SECONDS = 600
+
+
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+
+def _object_ids(noticia_ids):
+    oids = []
+    for noticia_id in noticia_ids or []:
+        try:
+            oids.append(ObjectId(noticia_id))
+        except (InvalidId, TypeError):
+            continue
+    return oids
+
+
+def _db():
+    uri = get_env_first(("MONGO_WRITE_URI", "NEW_MONGODB_URI", "MONGODB_URI"))
+    if not uri:
+        raise RuntimeError("Faltan MONGO_WRITE_URI/NEW_MONGODB_URI en el .env")
+    return mongo_clients.get_database(uri, os.getenv("MONGO_DB_NAME", "Base_de_datos_noticias"), workload="pipeline")
+
+
+def queue_collection():
+    return _db()[MEGA_UPLOAD_QUEUE_COLLECTION]
+
+
+def news_collection():
+    return _db()[os.getenv("MONGO_COLLECTION_NAME", "Noticias")]
+
+
+def ensure_indexes(queue):
+    queue.create_index([("status", ASCENDING), ("next_attempt_at", ASCENDING)], name="status_next_attempt")
+
+
+def enqueue_upload(queue, pdf_path, noticia_id, folder=MEGA_FOLDER_PATH, job_id=None, spool_dir=None):
+    """
+    Copia el PDF al spool y lo encola (o añade la noticia a un trabajo existente del mismo PDF).
+    Devuelve el documento del trabajo; si ya estaba subido trae `status: done` y `link`.
+    """
+    job_id = job_id or file_sha256(pdf_path)
+    job_dir = os.path.join(spool_dir or MEGA_UPLOAD_SPOOL_DIR, job_id)
+    os.makedirs(job_dir, exist_ok=True)
+    spool_path = os.path.join(job_dir, os.path.basename(pdf_path))
+    tmp_path = f"{spool_path}.{os.getpid()}.tmp"
+    shutil.copyfile(pdf_path, tmp_path)
+    os.replace(tmp_path, spool_path)
+
+    now = _utcnow()
+    job = queue.find_one_and_update(
+        {"_id": job_id},
+        {
+            "$setOnInsert": {
+                "status": "pending",
+                "attempts": 0,
+                "created_at": now,
+                "next_attempt_at": now,
+            },
+            "$set": {"spool_path": spool_path, "folder": folder, "updated_at": now},
+            "$addToSet": {"noticia_ids": str(noticia_id)},
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    if job.get("status") == "failed":
+        # Un PDF que agotó reintentos vuelve a la cola cuando se pide de nuevo
+        job = queue.find_one_and_update(
+            {"_id": job_id, "status": "failed"},
+            {"$set": {"status": "pending", "attempts": 0, "next_attempt_at": now, "updated_at": now}},
+            return_document=ReturnDocument.AFTER,
+        ) or job
+    return job
+
+
+class MegaUploader:
+    def __init__(self, queue, news, session, workers=None, max_attempts=None, lease_seconds=None,
+                 poll_seconds=None, stop_event=None, artifact_store=None):
+        self.queue = queue
+        self.news = news
+        self.session = session
+        self.workers = max(1, workers or MEGA_UPLOAD_WORKERS)
+        self.max_attempts = max(1, max_attempts or MEGA_UPLOAD_MAX_ATTEMPTS)
+        self.lease_seconds = lease_seconds or MEGA_UPLOAD_LEASE_SECONDS
+        self.poll_seconds = MEGA_UPLOAD_POLL_SECONDS if poll_seconds is None else poll_seconds
+        self.stop_event = stop_event or threading.Event()
+        if artifact_store is None and PDF_ARTIFACTS_ENABLED:
+            artifact_store = PdfArtifactStore.shared()
+        self.artifact_store = artifact_store
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.uploaded = 0
+        self.failed = 0
+        self._counters_lock = threading.Lock()
+
+    def claim(self):
+        """Reserva el siguiente trabajo listo (o con el lease vencido); None si no hay."""
+        now = _utcnow()
+        return self.queue.find_one_and_update(
+            {"$or": [
+                {"status": "pending", "next_attempt_at": {"$lte": now}},
+                {"status": "in_progress", "locked_until": {"$lt": now}},
+            ]},
+            {
+                "$set": {
+                    "status": "in_progress",
+                    "locked_by": self.worker_id,
+                    "locked_until": now + timedelta(seconds=self.lease_seconds),
+                    "updated_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("next_attempt_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def _set_pdf_step(self, noticia_ids, fields):
+        oids = _object_ids(noticia_ids)
+        if not oids:
+            return
+        self.news.update_many(
+            {"_id": {"$in": oids}},
+            {"$set": {f"pipeline.steps.pdf.{k}": v for k, v in fields.items()}},
+        )
+
+    def _complete(self, job, link):
+        now = _utcnow()
+        # noticia_ids se relee en la misma operación que marca el trabajo como hecho:
+        # una noticia encolada después ya ve status=done y toma el enlace al encolar
+        done = self.queue.find_one_and_update(
+            {"_id": job["_id"], "locked_by": self.worker_id},
+            {
+                "$set": {"status": "done", "link": link, "uploaded_at": now, "updated_at": now},
+                "$unset": {"locked_by": "", "locked_until": "", "last_error": ""},
+            },
+            return_document=ReturnDocument.AFTER,
+        ) or job
+        self._set_pdf_step(done.get("noticia_ids"), {
+            "ok": True,
+            "upload": "done",
+            "mega_link": link,
+            "uploaded_at": now.isoformat(),
+        })
+        if self.artifact_store is not None:
+            try:
+                self.artifact_store.record_link(job["_id"], link, job.get("folder"))
+            except OSError as e:
+                print(f"[mega_uploader] No se pudo anotar el enlace en el almacén de artefactos: {e}")
+        shutil.rmtree(os.path.dirname(job["spool_path"]), ignore_errors=True)
+        with self._counters_lock:
+            self.uploaded += 1
+        print(f"[mega_uploader] {job['_id'][:12]} subido: {link}")
+
+    def _fail(self, job, error):
+        now = _utcnow()
+        attempts = job.get("attempts", 1)
+        if attempts >= self.max_attempts:
+            update = {"status": "failed", "last_error": error, "updated_at": now}
+            self._set_pdf_step(job.get("noticia_ids"), {"upload": "failed", "upload_error": error})
+            with self._counters_lock:
+                self.failed += 1
+            print(f"[mega_uploader] {job['_id'][:12]} falló definitivamente tras {attempts} intentos: {error}")
+        else:
+            delay = min(2 ** attempts * 5, RETRY_MAX_SECONDS)
+            update = {
+                "status": "pending",
+                "last_error": error,
+                "next_attempt_at": now + timedelta(seconds=delay),
+                "updated_at": now,
+            }
+            print(f"[mega_uploader] {job['_id'][:12]} intento {attempts} fallido ({error}); reintento en {delay}s")
+        self.queue.update_one(
+            {"_id": job["_id"], "locked_by": self.worker_id},
+            {"$set": update, "$unset": {"locked_by": "", "locked_until": ""}},
+        )
+
+    def process(self, job):
+        try:
+            link = self.session.upload(job["spool_path"], job.get("folder") or MEGA_FOLDER_PATH, digest=job["_id"])
+        except MegaCmdError as e:
+            self._fail(job, str(e))
+            return
+        self._complete(job, link)
+
+    def _worker(self, drain):
+        while not self.stop_event.is_set():
+            try:
+                job = self.claim()
+            except PyMongoError as e:
+                print(f"[mega_uploader] Error al leer la cola ({type(e).__name__}: {e})")
+                self.stop_event.wait(max(1, self.poll_seconds))
+                continue
+            if job is None:
+                if drain:
+                    return
+                self.stop_event.wait(self.poll_seconds)
+                continue
+            try:
+                self.process(job)
+            except PyMongoError as e:
+                # El lease vence y otro worker (o este) lo retomará
+                print(f"[mega_uploader] Error de MongoDB con {job['_id'][:12]} ({type(e).__name__}: {e})")
+
+    def run(self, drain=False):
+        """Arranca los hilos de subida; con drain=True vuelve cuando no queda nada listo."""
+        hilos = [
+            threading.Thread(target=self._worker, args=(drain,), name=f"mega-upload-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for hilo in hilos:
+            hilo.start()
+        try:
+            for hilo in hilos:
+                while hilo.is_alive():
+                    hilo.join(timeout=1)
+        except KeyboardInterrupt:
+            self.stop_event.set()
+            for hilo in hilos:
+                hilo.join(timeout=10)
+        return {"uploaded": self.uploaded, "failed": self.failed}
+
+
+def queue_status(queue):
+    return {doc["_id"]: doc["count"] for doc in queue.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}])}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sube a MEGA los PDF encolados por render_latex.py.")
+    parser.add_argument("--once", action="store_true", help="Vacía los trabajos listos y termina.")
+    parser.add_argument("--workers", type=int, default=None, help="Subidas simultáneas (por defecto MEGA_UPLOAD_WORKERS).")
+    parser.add_argument("--status", action="store_true", help="Muestra el recuento de trabajos por estado.")
+    args = parser.parse_args()
+
+    try:
+        queue = queue_collection()
+    except RuntimeError as e:
+        print(e)
+        return 1
+    if args.status:
+        print(queue_status(queue))
+        return 0
+
+    email, password = os.getenv("MEGA_EMAIL"), os.getenv("MEGA_PASSWORD")
+    if not (email and password):
+        print("⚠️ Credenciales de Mega.nz no encontradas en el .env.")
+        return 1
+    ensure_indexes(queue)
+    uploader = MegaUploader(queue, news_collection(), MegaSession(email, password), workers=args.workers)
+    resumen = uploader.run(drain=args.once)
+    print(f"[mega_uploader] Detenido: {resumen}")
+    return 0 if resumen["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
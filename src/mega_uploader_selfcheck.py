@@ -0,0 +1,150 @@
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import uuid
+from datetime import datetime, timezone
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SRC = os.path.join(ROOT, "src")
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from pymongo import MongoClient  # noqa: E402
+
+from mega_cmd import MegaSession  # noqa: E402
+from mega_uploader import MegaUploader, enqueue_upload  # noqa: E402
+from pdf_artifacts import PdfArtifactStore  # noqa: E402
+
+SELFCHECK_URI = os.getenv("MEGA_UPLOADER_SELFCHECK_URI", "mongodb://localhost:27017/?directConnection=true")
+EMAIL = "selfcheck@example.com"
+
+# mega-cmd de mentira: un script que actúa según el nombre con el que se invoca.
+# "Remoto" = un directorio local; los PDF con "flaky" en el nombre fallan en el primer mega-put.
+STUB = r'''#!{python}
+import hashlib, os, shutil, sys
+state = os.environ["MEGA_STUB_STATE"]
+remote = os.path.join(state, "remote")
+cmd, args = os.path.basename(sys.argv[0]), sys.argv[1:]
+with open(os.path.join(state, "calls.log"), "a") as f:
+    f.write(cmd + "\n")
+logged = os.path.join(state, "logged_in")
+if cmd == "mega-version":
+    print("MEGAcmd version: stub")
+elif cmd == "mega-whoami":
+    if not os.path.exists(logged):
+        sys.exit(57)
+    print("Account e-mail: " + open(logged).read())
+elif cmd == "mega-login":
+    open(logged, "w").write(args[0])
+elif cmd == "mega-logout":
+    if os.path.exists(logged):
+        os.remove(logged)
+elif cmd == "mega-ls":
+    sys.exit(0 if os.path.exists(os.path.join(remote, args[0])) else 53)
+elif cmd == "mega-mkdir":
+    os.makedirs(os.path.join(remote, args[0]), exist_ok=True)
+elif cmd == "mega-put":
+    local, target = args
+    marker = os.path.join(state, "failed_" + os.path.basename(local))
+    if "flaky" in local and not os.path.exists(marker):
+        open(marker, "w").close()
+        print("Transfer failed", file=sys.stderr)
+        sys.exit(1)
+    dest = os.path.join(remote, target)
+    if os.path.isdir(dest):
+        dest = os.path.join(dest, os.path.basename(local))
+    shutil.copy(local, dest)
+elif cmd == "mega-export":
+    path = args[-1]
+    if not os.path.exists(os.path.join(remote, path)):
+        sys.exit(53)
+    print("Exported /" + path + ": https://mega.nz/file/" + hashlib.md5(path.encode()).hexdigest()[:8])
+else:
+    sys.exit(1)
+'''
+COMMANDS = ["mega-version", "mega-whoami", "mega-login", "mega-logout", "mega-ls", "mega-mkdir", "mega-put", "mega-export"]
+
+
+def _instalar_stub(tmp):
+    bin_dir = os.path.join(tmp, "bin")
+    state = os.path.join(tmp, "state")
+    os.makedirs(bin_dir)
+    os.makedirs(os.path.join(state, "remote"))
+    stub = os.path.join(bin_dir, "mega-stub")
+    with open(stub, "w") as f:
+        f.write(STUB.replace("{python}", sys.executable))
+    os.chmod(stub, os.stat(stub).st_mode | stat.S_IEXEC)
+    for name in COMMANDS:
+        os.symlink(stub, os.path.join(bin_dir, name))
+    os.environ["PATH"] = bin_dir + os.pathsep + os.environ.get("PATH", "")
+    os.environ["MEGA_STUB_STATE"] = state
+    return state
+
+
+def run_selfcheck() -> None:
+    tmp = tempfile.mkdtemp(prefix="mega_uploader_selfcheck_")
+    client = MongoClient(SELFCHECK_URI, serverSelectionTimeoutMS=5000)
+    db = client[f"mega_uploader_selfcheck_{uuid.uuid4().hex[:8]}"]
+    try:
+        state = _instalar_stub(tmp)
+        queue, news = db["pdf_upload_queue"], db["Noticias"]
+        ids = [str(i) for i in news.insert_many([{"titulo": f"T{i}"} for i in range(3)]).inserted_ids]
+        pdfs = []
+        for name in ("uno.pdf", "dos.pdf", "flaky.pdf"):
+            path = os.path.join(tmp, name)
+            with open(path, "wb") as f:
+                f.write(b"%PDF-1.4 " + name.encode())
+            pdfs.append(path)
+
+        spool = os.path.join(tmp, "spool")
+        jobs = [enqueue_upload(queue, pdf, noticia_id, "Carpeta/PDF", spool_dir=spool) for pdf, noticia_id in zip(pdfs, ids)]
+        # El mismo PDF para otra noticia se une al trabajo existente
+        repetido = enqueue_upload(queue, pdfs[0], ids[1], "Carpeta/PDF", spool_dir=spool)
+        assert repetido["_id"] == jobs[0]["_id"] and len(repetido["noticia_ids"]) == 2, "no se deduplicó el trabajo"
+        assert queue.count_documents({}) == 3
+
+        uploader = MegaUploader(queue, news, MegaSession(EMAIL, "secret"), workers=3, poll_seconds=0,
+                                artifact_store=PdfArtifactStore(os.path.join(tmp, "artifacts")))
+        uploader.run(drain=True)
+        assert queue.count_documents({"status": "done"}) == 2, list(queue.find({}, {"status": 1, "last_error": 1}))
+        flaky = queue.find_one({"_id": jobs[2]["_id"]})
+        assert flaky["status"] == "pending" and flaky["attempts"] == 1, f"el fallo no se reprogramó: {flaky}"
+
+        # Se adelanta el reintento en vez de esperar el backoff
+        queue.update_one({"_id": flaky["_id"]}, {"$set": {"next_attempt_at": datetime.now(timezone.utc)}})
+        uploader.run(drain=True)
+        assert queue.count_documents({"status": "done"}) == 3, "el reintento no completó la subida"
+
+        for noticia_id, doc in zip(ids, news.find({}, {"pipeline": 1}).sort("_id", 1)):
+            step = doc["pipeline"]["steps"]["pdf"]
+            assert step["upload"] == "done" and step["mega_link"].startswith("https://mega.nz/"), (noticia_id, step)
+
+        with open(os.path.join(state, "calls.log")) as f:
+            calls = f.read().split()
+        assert calls.count("mega-login") == 1, f"se esperaba un único login, hubo {calls.count('mega-login')}"
+        assert calls.count("mega-put") == 4, f"se esperaban 4 mega-put (3 + 1 reintento), hubo {calls.count('mega-put')}"
+        assert not os.listdir(spool), "el spool no se limpió"
+
+        # PDF re-renderizado con el mismo título (mismo nombre de fichero): enlace nuevo, no el del anterior
+        session = MegaSession(EMAIL, "secret")
+        enlaces = []
+        for version in (b"v1", b"v2"):
+            path = os.path.join(tmp, version.decode(), "mismo_titulo.pdf")
+            os.makedirs(os.path.dirname(path))
+            with open(path, "wb") as f:
+                f.write(b"%PDF-1.4 " + version)
+            enlaces.append(session.upload(path, "Carpeta/PDF"))
+        assert enlaces[0] != enlaces[1], "un PDF distinto con el mismo nombre recibió el enlace del anterior"
+        assert session.upload(path, "Carpeta/PDF") == enlaces[1], "el mismo PDF debe reutilizar su enlace"
+    finally:
+        client.drop_database(db.name)
+        client.close()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print("OK: mega_uploader self-check passed")
+
+
+if __name__ == "__main__":
+    run_selfcheck()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Registro de MongoClient compartidos por proceso.
+
+- Un MongoClient por URI, con el pool, los timeouts y la ServerApi ajustados por entorno
+  (MONGO_*), que se reutiliza en todo el proceso: cada llamada aprovecha conexiones ya
+  abiertas en vez de pagar DNS + TLS + handshake. Se cierran al salir del proceso (atexit).
+- Perfiles de carga (WORKLOADS) que fijan preferencia de lectura y write concern:
+    default      primario, write concern del servidor.
+    read         lecturas que toleran retraso (secundarios si los hay).
+    interactive  datos de usuario (historial, permisos): primario y w=majority.
+    pipeline     resultados del análisis: primario (se releen enseguida) y w=majority.
+    bulk         escrituras masivas idempotentes (crawler, replicación): w=1.
+- MONGO_SHARED_CLIENTS=false vuelve al comportamiento antiguo (un client por uso, propiedad
+  del llamador), salvo en procesos que llamen a enable_pooling() (query_service.py).
+"""
+import atexit
+import threading
+
+from pymongo import MongoClient, ReadPreference
+from pymongo.server_api import ServerApi
+from pymongo.write_concern import WriteConcern
+
+from env_config import get_env, get_env_bool, get_env_int
+
+
+MONGO_SHARED_CLIENTS = get_env_bool("MONGO_SHARED_CLIENTS", True)
+MONGO_MAX_POOL_SIZE = get_env_int("MONGO_MAX_POOL_SIZE", 50)
+MONGO_MIN_POOL_SIZE = get_env_int("MONGO_MIN_POOL_SIZE", 0)
+MONGO_MAX_IDLE_TIME_MS = get_env_int("MONGO_MAX_IDLE_TIME_MS", 300000)
+MONGO_CONNECT_TIMEOUT_MS = get_env_int("MONGO_CONNECT_TIMEOUT_MS", 5000)
+MONGO_SERVER_SELECTION_TIMEOUT_MS = get_env_int("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000)
+MONGO_SOCKET_TIMEOUT_MS = get_env_int("MONGO_SOCKET_TIMEOUT_MS", 60000)
+MONGO_WRITE_TIMEOUT_MS = get_env_int("MONGO_WRITE_TIMEOUT_MS", 10000)
+MONGO_SERVER_API_VERSION = get_env("MONGO_SERVER_API_VERSION", "1")
+
+WORKLOADS = {
+    "default": {},
+    "read": {"read_preference": ReadPreference.SECONDARY_PREFERRED},
+    "interactive": {
+        "read_preference": ReadPreference.PRIMARY,
+        "write_concern": WriteConcern(w="majority", wtimeout=MONGO_WRITE_TIMEOUT_MS),
+    },
+    "pipeline": {
+        "read_preference": ReadPreference.PRIMARY,
+        "write_concern": WriteConcern(w="majority", wtimeout=MONGO_WRITE_TIMEOUT_MS),
+    },
+    "bulk": {"write_concern": WriteConcern(w=1)},
+}
+
+_clients = {}
+_clients_lock = threading.Lock()
+_pooling_enabled = MONGO_SHARED_CLIENTS
+
+
+def enable_pooling():
+    global _pooling_enabled
+    _pooling_enabled = True
+
+
+def pooling_enabled():
+    return _pooling_enabled
+
+
+def client_options():
+    """Opciones de pool, timeouts y Stable API con las que se crean los clients."""
+    return {
+        "server_api": ServerApi(MONGO_SERVER_API_VERSION),
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": MONGO_MAX_IDLE_TIME_MS,
+        "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "socketTimeoutMS": MONGO_SOCKET_TIMEOUT_MS,
+    }
+
+
+def workload_options(workload):
+    """Opciones de get_database/get_collection para un perfil; ValueError si no existe."""
+    try:
+        return WORKLOADS[workload or "default"]
+    except KeyError:
+        raise ValueError(f"Perfil de carga desconocido: {workload} (válidos: {', '.join(WORKLOADS)})") from None
+
+
+def get_client(uri):
+    """MongoClient compartido para la URI (se crea en el primer uso)."""
+    with _clients_lock:
+        client = _clients.get(uri)
+        if client is None:
+            client = MongoClient(uri, **client_options())
+            _clients[uri] = client
+        return client
+
+
+def client_for(uri):
+    """Client compartido si el pooling está activo; si no, uno nuevo propiedad del llamador."""
+    return get_client(uri) if _pooling_enabled else MongoClient(uri, **client_options())
+
+
+def get_database(uri, db_name, workload="default"):
+    """Base de datos sobre el client compartido con la lectura/escritura del perfil de carga."""
+    return get_client(uri).get_database(db_name, **workload_options(workload))
+
+
+def get_collection(uri, db_name, collection_name, workload="default"):
+    return get_database(uri, db_name, workload).get_collection(collection_name)
+
+
+def open_service(uri, db_name, workload="default"):
+    """MongoDBService sobre el client compartido (close() no lo cierra) o sobre uno propio."""
+    from MongoDB import MongoDBService
+
+    return MongoDBService(uri=uri, db_name=db_name, workload=workload)
+
+
+def close_all():
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.close()
+
+
+atexit.register(close_all)
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Caché en memoria (LRU + TTL) para las búsquedas de noticias del servicio residente.
+
+- Claves por ID, por URL exacta (buscar_noticia) y por URL normalizada (buscar_noticias_batch).
+- Guarda también los resultados negativos ("no encontrada"), con un TTL más corto, asociados
+  al _id o a la URL buscada (url_ref) para que la inserción de ese documento los invalide.
+- Cada entrada positiva lleva una versión (hash del contenido) utilizable como ETag.
+- Se invalida por documento: explícitamente (invalidate_doc) o desde un change stream de
+  `Noticias` (watch_collection), de modo que lo que escribe el pipeline no se sirve viejo.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from env_config import get_env_bool, get_env_int
+
+
+NEWS_CACHE_MAX_ENTRIES = get_env_int("NEWS_CACHE_MAX_ENTRIES", 5000)
+NEWS_CACHE_TTL_SECONDS = get_env_int("NEWS_CACHE_TTL_SECONDS", 300)
+NEWS_CACHE_NEGATIVE_TTL_SECONDS = get_env_int("NEWS_CACHE_NEGATIVE_TTL_SECONDS", 60)
+NEWS_CACHE_WATCH = get_env_bool("NEWS_CACHE_WATCH", True)
+WATCH_RETRY_MAX_SECONDS = 60
+
+MISSING = object()
+
+
+def url_ref(url):
+    """Referencia con la que se guarda un negativo buscado por URL (en lugar del _id que no tiene)."""
+    return f"url:{url}"
+
+
+def content_version(value):
+    """Hash estable del contenido, usable como ETag."""
+    payload = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class NewsCache:
+    def __init__(self, max_entries=None, ttl_seconds=None, negative_ttl_seconds=None):
+        self.max_entries = max(1, int(max_entries or NEWS_CACHE_MAX_ENTRIES))
+        self.ttl_seconds = NEWS_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.negative_ttl_seconds = NEWS_CACHE_NEGATIVE_TTL_SECONDS if negative_ttl_seconds is None else negative_ttl_seconds
+        self._entries = OrderedDict()  # key -> (expires_at, value, version, doc_id)
+        self._keys_by_doc = {}  # doc_id -> set(keys)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """(value, version) o MISSING si no está o caducó. value None = negativo cacheado."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def set(self, key, value, doc_id=None, negative=False):
+        """Guarda un resultado; devuelve su versión (None para negativos)."""
+        ttl = self.negative_ttl_seconds if negative else self.ttl_seconds
+        if ttl <= 0:
+            return None if negative else content_version(value)
+        version = None if negative else content_version(value)
+        doc_id = str(doc_id) if doc_id is not None else None
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + ttl, value, version, doc_id)
+            if doc_id is not None:
+                self._keys_by_doc.setdefault(doc_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+        return version
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None and entry[3] is not None:
+            keys = self._keys_by_doc.get(entry[3])
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_doc[entry[3]]
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._drop(key)
+
+    def invalidate_doc(self, doc_id=None, url=None, normalized_url=None):
+        """Invalida todo lo cacheado de un documento (por _id) y las claves de su URL (negativos incluidos)."""
+        refs = [str(doc_id)] if doc_id is not None else []
+        refs += [url_ref(u) for u in dict.fromkeys((url, normalized_url)) if u]
+        with self._lock:
+            for ref in refs:
+                for key in list(self._keys_by_doc.get(ref, ())):
+                    self._drop(key)
+            if url:
+                for key in [k for k in self._entries if k[1] in (url, normalized_url)]:
+                    self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_doc.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+def watch_collection(collection, cache, stop_event, normalize=None, label="Noticias"):
+    """
+    Sigue el change stream de la colección e invalida la caché con cada escritura.
+    Se reintenta con backoff si el servidor no admite change streams o se corta la conexión;
+    mientras tanto, la caché sigue acotada por su TTL.
+    """
+    resume_token = None
+    delay = 1
+    pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}}]
+    while not stop_event.is_set():
+        try:
+            with collection.watch(pipeline, resume_after=resume_token, max_await_time_ms=1000) as stream:
+                delay = 1
+                while not stop_event.is_set() and stream.alive:
+                    change = stream.try_next()
+                    if change is None:
+                        continue
+                    resume_token = stream.resume_token
+                    doc_id = (change.get("documentKey") or {}).get("_id")
+                    url = (change.get("fullDocument") or {}).get("url")
+                    cache.invalidate_doc(doc_id, url, normalize(url) if (url and normalize) else None)
+        except Exception as e:
+            if stop_event.is_set():
+                break
+            print(f"[news_cache] Change stream de {label} no disponible ({type(e).__name__}: {e}); reintento en {delay}s")
+            stop_event.wait(delay)
+            delay = min(delay * 2, WATCH_RETRY_MAX_SECONDS)
+            resume_token = None if "resume" in str(e).lower() else resume_token
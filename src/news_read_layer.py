@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Capa de lectura unificada sobre las dos BD de noticias (nueva y antigua).
+
+- Un MongoClient de larga vida por URI (mongo_clients.get_client), con su pool ya caliente.
+- Las consultas a la BD nueva y a la antigua se lanzan a la vez; un fallo en la nueva ya
+  no cuesta un segundo viaje secuencial a la antigua.
+- Precedencia: si el documento está en ambas, gana la BD nueva (la que escribe el pipeline).
+- Preferencias de lectura por BD: la nueva lee del primario por defecto (ve enseguida lo que
+  acaba de escribir el análisis); la antigua, solo lectura, admite secundarios.
+- Con la BD nueva al día gracias a replicacion_noticias.py, NEWS_READ_SINGLE_DB=true lee
+  solo de la nueva (la antigua queda para las búsquedas con solo_antigua).
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+from pymongo import ReadPreference
+
+import mongo_clients
+from env_config import get_env, get_env_bool, get_env_int
+
+
+DB_NAME = "Base_de_datos_noticias"
+COLLECTION_NAME = "Noticias"
+NEWS_READ_CONCURRENT = get_env_bool("NEWS_READ_CONCURRENT", True)
+NEWS_READ_SINGLE_DB = get_env_bool("NEWS_READ_SINGLE_DB", False)
+NEWS_READ_WORKERS = get_env_int("NEWS_READ_WORKERS", 8)
+NEWS_READ_NEW_PREFERENCE = get_env("NEWS_READ_NEW_PREFERENCE", "primaryPreferred")
+NEWS_READ_OLD_PREFERENCE = get_env("NEWS_READ_OLD_PREFERENCE", "secondaryPreferred")
+
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def _read_preference(nombre):
+    try:
+        return READ_PREFERENCES[nombre]
+    except KeyError:
+        raise RuntimeError(f"Preferencia de lectura no válida: {nombre} (válidas: {', '.join(READ_PREFERENCES)})") from None
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(2, NEWS_READ_WORKERS), thread_name_prefix="news-read")
+        return _executor
+
+
+class NewsReadLayer:
+    def __init__(self, new_uri, old_uri, concurrent=None, single_db=None):
+        """
+        Lanza RuntimeError si faltan las URIs, la preferencia de lectura no es válida
+        o falla la conexión.
+        """
+        if not all([old_uri, new_uri]):
+            raise RuntimeError("Las variables de entorno OLD_MONGODB_URI y NEW_MONGODB_URI son necesarias.")
+        self.concurrent = NEWS_READ_CONCURRENT if concurrent is None else concurrent
+        self.single_db = NEWS_READ_SINGLE_DB if single_db is None else single_db
+        new_preference = _read_preference(NEWS_READ_NEW_PREFERENCE)
+        old_preference = _read_preference(NEWS_READ_OLD_PREFERENCE)
+        try:
+            self.new_collection = (
+                mongo_clients.get_client(new_uri)
+                .get_database(DB_NAME)
+                .get_collection(COLLECTION_NAME, read_preference=new_preference)
+            )
+            # Misma URI para las dos: una sola BD, no hay que consultar dos veces.
+            self.old_collection = None if old_uri == new_uri else (
+                mongo_clients.get_client(old_uri)
+                .get_database(DB_NAME)
+                .get_collection(COLLECTION_NAME, read_preference=old_preference)
+            )
+        except Exception as e:
+            raise RuntimeError(f"Error al conectar a MongoDB: {e}") from e
+
+    @classmethod
+    def shared(cls):
+        """Instancia del proceso configurada con OLD_MONGODB_URI/NEW_MONGODB_URI."""
+        global _shared
+        if _shared is None:
+            with _shared_lock:
+                if _shared is None:
+                    load_dotenv()
+                    _shared = cls(os.getenv("NEW_MONGODB_URI"), os.getenv("OLD_MONGODB_URI"))
+        return _shared
+
+    def _solo_nueva(self):
+        return self.single_db or self.old_collection is None
+
+    def _run_both(self, new_call, old_call):
+        """(resultado_nueva, futuro_antigua): la antigua se lanza a la vez si concurrent."""
+        if old_call is None or not self.concurrent:
+            return new_call(), None
+        old_future = _pool().submit(old_call)
+        try:
+            return new_call(), old_future
+        except Exception:
+            old_future.cancel()
+            raise
+
+    def find_one(self, query, projection=None, solo_antigua=False):
+        """
+        Documento de la BD nueva si existe; si no, el de la antigua. Con solo_antigua,
+        solo se consulta la antigua (o la única BD si comparten URI).
+        """
+        old_collection = self.old_collection if self.old_collection is not None else self.new_collection
+        if solo_antigua:
+            return old_collection.find_one(query, projection)
+
+        old_call = None if self._solo_nueva() else (lambda: self.old_collection.find_one(query, projection))
+        doc, old_future = self._run_both(lambda: self.new_collection.find_one(query, projection), old_call)
+        if doc is not None:
+            if old_future is not None:
+                old_future.cancel()
+            return doc
+        if old_future is not None:
+            return old_future.result()
+        return old_call() if old_call is not None else None
+
+    def find_by_urls(self, urls, projection=None):
+        """
+        {url: documento} para las URLs dadas, consultando ambas BD a la vez.
+        La BD nueva tiene precedencia sobre la antigua.
+        """
+        urls = list(urls)
+        if not urls:
+            return {}
+
+        def _por_url(collection, lista):
+            return {doc["url"]: doc for doc in collection.find({"url": {"$in": lista}}, projection) if doc.get("url")}
+
+        old_call = None if self._solo_nueva() else (lambda: _por_url(self.old_collection, urls))
+        nuevos, old_future = self._run_both(lambda: _por_url(self.new_collection, urls), old_call)
+        if old_future is not None:
+            antiguos = old_future.result()
+        else:
+            faltantes = [url for url in urls if url not in nuevos]
+            antiguos = _por_url(self.old_collection, faltantes) if (old_call is not None and faltantes) else {}
+        return {**antiguos, **nuevos}
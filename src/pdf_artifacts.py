@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Almacén local de PDF direccionado por contenido.
+
+La clave es el SHA-256 del .tex renderizado: si la noticia, el análisis, el fact-check y la
+plantilla no cambian, el .tex es idéntico y el PDF también. Cada entrada son dos ficheros en
+`<dir>/<hash[:2]>/`: `<hash>.pdf` y `<hash>.json` con los metadatos (noticia, tamaño, fecha
+y, una vez subido, el enlace de MEGA y la carpeta remota). Así una noticia sin cambios reutiliza
+el PDF y el enlace ya publicado, sin pdflatex ni subida.
+
+Vive fuera de output_temporal (los directorios de trabajo se borran por antigüedad). El tamaño se
+acota expulsando las entradas menos usadas (por mtime del PDF; una lectura lo refresca).
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+from datetime import datetime, timezone
+
+from env_config import get_env, get_env_bool, get_env_int
+
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SRC_DIR)
+PDF_ARTIFACTS_ENABLED = get_env_bool("PDF_ARTIFACTS_ENABLED", True)
+PDF_ARTIFACTS_DIR = os.path.join(ROOT_DIR, get_env("PDF_ARTIFACTS_DIR", os.path.join("cache", "pdf_artifacts")))
+PDF_ARTIFACTS_MAX_MB = get_env_int("PDF_ARTIFACTS_MAX_MB", 1024)
+# Al superar el límite se expulsa hasta quedar en esta fracción, para no expulsar en cada put.
+EVICT_TARGET_RATIO = 0.9
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def tex_hash(tex_source):
+    return hashlib.sha256(tex_source.encode("utf-8")).hexdigest()
+
+
+def _utcnow_iso():
+    return datetime.now(timezone.utc).isoformat()
+
+
+class PdfArtifactStore:
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory or PDF_ARTIFACTS_DIR
+        self.max_bytes = int(max_bytes if max_bytes is not None else PDF_ARTIFACTS_MAX_MB * 1024 * 1024)
+        self._lock = threading.Lock()
+
+    def _path(self, key, extension):
+        return os.path.join(self.directory, key[:2], key + extension)
+
+    def _write_atomic(self, path, write):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        write(tmp_path)
+        os.replace(tmp_path, path)
+
+    def _write_meta(self, key, meta):
+        def write(tmp_path):
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False, indent=2)
+        self._write_atomic(self._path(key, ".json"), write)
+
+    def get(self, key):
+        """Metadatos de la entrada (con `pdf`, la ruta del PDF en el almacén) o None si no está."""
+        pdf_path = self._path(key, ".pdf")
+        try:
+            with open(self._path(key, ".json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            os.utime(pdf_path, None)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"Artefacto PDF ilegible ({type(e).__name__}): {key}")
+            return None
+        meta["pdf"] = pdf_path
+        return meta
+
+    def put(self, key, pdf_path, **meta):
+        """Copia el PDF al almacén y guarda sus metadatos; devuelve los metadatos como get()."""
+        self._write_atomic(self._path(key, ".pdf"), lambda tmp_path: shutil.copyfile(pdf_path, tmp_path))
+        meta = {
+            "tex_sha256": key,
+            "size": os.path.getsize(pdf_path),
+            "created_at": _utcnow_iso(),
+            **meta,
+        }
+        self._write_meta(key, meta)
+        self._evict_if_needed()
+        return {**meta, "pdf": self._path(key, ".pdf")}
+
+    def record_link(self, key, link, remote_folder=None):
+        """Anota el enlace público del PDF ya subido."""
+        meta = self.get(key)
+        if meta is None:
+            return None
+        meta.pop("pdf", None)
+        meta.update({"mega_link": link, "mega_folder": remote_folder, "mega_uploaded_at": _utcnow_iso()})
+        self._write_meta(key, meta)
+        return meta
+
+    def link_for(self, meta, remote_folder=None):
+        """Enlace ya publicado de la entrada, si se subió a la misma carpeta."""
+        if not meta or not meta.get("mega_link"):
+            return None
+        if remote_folder and meta.get("mega_folder") not in (None, remote_folder):
+            return None
+        return meta["mega_link"]
+
+    def _iter_pdfs(self):
+        if not os.path.isdir(self.directory):
+            return
+        for prefix in os.listdir(self.directory):
+            subdir = os.path.join(self.directory, prefix)
+            if not os.path.isdir(subdir):
+                continue
+            for name in os.listdir(subdir):
+                if name.endswith(".pdf"):
+                    yield os.path.join(subdir, name)
+
+    def _evict_if_needed(self):
+        if self.max_bytes <= 0:
+            return
+        with self._lock:
+            entries = []
+            for path in self._iter_pdfs():
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _mtime, size, _path in entries)
+            if total <= self.max_bytes:
+                return
+            target = int(self.max_bytes * EVICT_TARGET_RATIO)
+            removed = 0
+            for _mtime, size, path in sorted(entries):
+                if total <= target:
+                    break
+                try:
+                    os.remove(os.path.splitext(path)[0] + ".json")
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+        if removed:
+            print(f"Artefactos PDF: {removed} entradas expulsadas ({total / (1024 * 1024):.0f} MB en uso)")
+
+    @classmethod
+    def shared(cls, directory=None):
+        """Una instancia por directorio y proceso."""
+        directory = directory or PDF_ARTIFACTS_DIR
+        with _shared_lock:
+            store = _shared.get(directory)
+            if store is None:
+                store = cls(directory)
+                _shared[directory] = store
+            return store
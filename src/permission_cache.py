@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Caché en memoria (TTL) de los permisos de chatbot por userId.
+
+- Los permisos concedidos se guardan PERMISSION_CACHE_TTL_SECONDS; los denegados (o usuario
+  sin registro) un TTL más corto, PERMISSION_CACHE_NEGATIVE_TTL_SECONDS, para que una
+  concesión hecha desde otro proceso se note pronto aunque no haya change streams.
+- set_chatbot_permission actualiza la entrada en el acto; en un proceso residente
+  (query_service.py) watch_permissions invalida también lo que cambie user_permissions_admin
+  u otro proceso, siguiendo el change stream de `user_permissions`.
+"""
+import threading
+import time
+
+from env_config import get_env_bool, get_env_int
+
+
+PERMISSION_CACHE_ENABLED = get_env_bool("PERMISSION_CACHE_ENABLED", True)
+PERMISSION_CACHE_TTL_SECONDS = get_env_int("PERMISSION_CACHE_TTL_SECONDS", 60)
+PERMISSION_CACHE_NEGATIVE_TTL_SECONDS = get_env_int("PERMISSION_CACHE_NEGATIVE_TTL_SECONDS", 10)
+PERMISSION_CACHE_MAX_ENTRIES = get_env_int("PERMISSION_CACHE_MAX_ENTRIES", 10000)
+PERMISSION_CACHE_WATCH = get_env_bool("PERMISSION_CACHE_WATCH", True)
+WATCH_RETRY_MAX_SECONDS = 60
+
+
+class PermissionCache:
+    def __init__(self, ttl_seconds=None, negative_ttl_seconds=None, max_entries=None, enabled=None):
+        self.enabled = PERMISSION_CACHE_ENABLED if enabled is None else enabled
+        self.ttl_seconds = PERMISSION_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.negative_ttl_seconds = (
+            PERMISSION_CACHE_NEGATIVE_TTL_SECONDS if negative_ttl_seconds is None else negative_ttl_seconds
+        )
+        self.max_entries = max(1, int(max_entries or PERMISSION_CACHE_MAX_ENTRIES))
+        self._entries = {}  # userId -> (expires_at, payload)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        """Copia del payload cacheado o None si no está o caducó."""
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] <= now:
+                self._entries.pop(user_id, None)
+                self.misses += 1
+                return None
+            self.hits += 1
+            return dict(entry[1])
+
+    def set(self, user_id, payload):
+        if not self.enabled or not payload.get("ok"):
+            return
+        ttl = self.ttl_seconds if payload.get("canUseChatbot") is True else self.negative_ttl_seconds
+        if ttl <= 0:
+            return
+        with self._lock:
+            if user_id not in self._entries and len(self._entries) >= self.max_entries:
+                self._purge_expired()
+                if len(self._entries) >= self.max_entries:
+                    self._entries.pop(next(iter(self._entries)))
+            self._entries[user_id] = (time.monotonic() + ttl, dict(payload))
+
+    def _purge_expired(self):
+        now = time.monotonic()
+        for user_id in [k for k, (expires_at, _payload) in self._entries.items() if expires_at <= now]:
+            del self._entries[user_id]
+
+    def invalidate(self, user_id=None):
+        """Invalida un usuario, o toda la caché si user_id es None."""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+permission_cache = PermissionCache()
+
+
+def watch_permissions(collection, cache, stop_event):
+    """
+    Sigue el change stream de `user_permissions` e invalida la caché con cada escritura.
+    Un borrado no trae el userId, así que vacía la caché entera.
+    """
+    resume_token = None
+    delay = 1
+    pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}}]
+    while not stop_event.is_set():
+        try:
+            with collection.watch(
+                pipeline, full_document="updateLookup", resume_after=resume_token, max_await_time_ms=1000
+            ) as stream:
+                delay = 1
+                while not stop_event.is_set() and stream.alive:
+                    change = stream.try_next()
+                    if change is None:
+                        continue
+                    resume_token = stream.resume_token
+                    user_id = (change.get("fullDocument") or {}).get("userId")
+                    cache.invalidate(user_id)
+        except Exception as e:
+            if stop_event.is_set():
+                break
+            print(f"[permission_cache] Change stream de user_permissions no disponible ({type(e).__name__}: {e}); reintento en {delay}s")
+            stop_event.wait(delay)
+            delay = min(delay * 2, WATCH_RETRY_MAX_SECONDS)
+            resume_token = None if "resume" in str(e).lower() else resume_token
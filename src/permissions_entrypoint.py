@@ -27,6 +27,25 @@ def _coerce_bool(value, default=True):
     return default
 
 
+def handle_request(data):
+    """Atiende una petición {action, userId, email, ...}; usado también por query_service."""
+    action = data.get("action")
+
+    if action == "check_chatbot_access":
+        return get_chatbot_permission(
+            user_id=data.get("userId"),
+            email=data.get("email"),
+            bootstrap_if_missing=_coerce_bool(data.get("bootstrapIfMissing"), default=True),
+        )
+    if action == "set_chatbot_access":
+        return set_chatbot_permission(
+            user_id=data.get("userId"),
+            can_use_chatbot=data.get("canUseChatbot"),
+            email=data.get("email"),
+        )
+    return {"ok": False, "error": "Acción no soportada."}
+
+
 def main():
     try:
         raw = sys.stdin.read()
@@ -36,24 +55,7 @@ def main():
             _print_json({"ok": False, "error": "Se requiere JSON de entrada via stdin."})
             return 1
 
-        data = json.loads(raw)
-        action = data.get("action")
-
-        if action == "check_chatbot_access":
-            result = get_chatbot_permission(
-                user_id=data.get("userId"),
-                email=data.get("email"),
-                bootstrap_if_missing=_coerce_bool(data.get("bootstrapIfMissing"), default=True),
-            )
-        elif action == "set_chatbot_access":
-            result = set_chatbot_permission(
-                user_id=data.get("userId"),
-                can_use_chatbot=data.get("canUseChatbot"),
-                email=data.get("email"),
-            )
-        else:
-            result = {"ok": False, "error": "Acción no soportada."}
-
+        result = handle_request(json.loads(raw))
         _print_json(result)
         return 0 if result.get("ok") else 1
     except json.JSONDecodeError:
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Registro de proyecciones con nombre para las lecturas de `Noticias`.
+
+Cada punto de entrada pide el perfil que necesita, de modo que Mongo solo lee,
+decodifica y serializa esos campos:
+
+- badge: insignia de la extensión (/api/check-url): puntuación y resúmenes.
+- check_urls: como badge, pero por lotes (buscar_noticias_batch).
+- alerts: alertas V2, su resumen y la auditoría (/api/news/:id/alerts).
+- chat_context: lo que usa el chatbot; sin HTML, sin `texto_referencia` ni historiales de consenso.
+- pdf: lo que pinta news_template.tex.j2 (render_latex) más el run_id del pipeline.
+- full: el documento completo sin `embedding` (comportamiento histórico de buscar_noticia).
+"""
+
+# Campos de los que enrich_global_scores deriva las notas globales.
+_CAMPOS_SCORE = {
+    "puntuacion": 1,
+    "global_score_raw": 1,
+    "global_score_2dp": 1,
+    "global_score_1dp": 1,
+    "evaluation_result.extras": 1,
+    "evaluation_result.derived": 1,
+}
+
+# Historiales de las iteraciones de consenso GPT/Claude (solo se guardan sin consenso).
+_HISTORIALES = {
+    "valoracion_titular.historial": 0,
+    "valoracion_titular.raw": 0,
+    **{f"valoraciones.{i}.historial": 0 for i in range(1, 6)},
+}
+
+PROYECCIONES = {
+    "badge": {
+        **_CAMPOS_SCORE,
+        "titulo": 1,
+        "url": 1,
+        "puntuacion_global": 1,
+        "puntuacionTotal": 1,
+        "resumen_valoracion": 1,
+        "resumen_global": 1,
+        "resumen_valoracion_titular": 1,
+        "valoracion_titular.resumen": 1,
+    },
+    "check_urls": {
+        "url": 1,
+        "puntuacion": 1,
+        "puntuacion_global": 1,
+        "puntuacionTotal": 1,
+        "resumen_valoracion": 1,
+        "resumen_global": 1,
+        "resumen_valoracion_titular": 1,
+        "valoracion_titular.resumen": 1,
+    },
+    "alerts": {
+        "evaluation_result.alerts": 1,
+        "evaluation_result.alerts_summary": 1,
+        "evaluation_result.audit": 1,
+    },
+    "chat_context": {
+        "embedding": 0,
+        "valoraciones_html": 0,
+        "texto_referencia": 0,
+        "pipeline": 0,
+        "evaluation_meta": 0,
+        "evaluation_result.alerts": 0,
+        "evaluation_result.audit": 0,
+        "images": 0,
+        "top_image": 0,
+        **_HISTORIALES,
+    },
+    "pdf": {
+        **_CAMPOS_SCORE,
+        "titulo": 1,
+        "cuerpo": 1,
+        "autor": 1,
+        "fecha_publicacion": 1,
+        "fuente": 1,
+        "url": 1,
+        "valoraciones": 1,
+        "valoracion_general": 1,
+        "valoracion_titular": 1,
+        "resumen_valoracion": 1,
+        "resumen_valoracion_titular": 1,
+        "texto_referencia": 1,
+        "texto_referencia_diccionario": 1,
+        "pipeline.run_id": 1,
+    },
+    "full": {"embedding": 0},
+}
+
+PERFIL_POR_DEFECTO = "full"
+
+
+def proyeccion(perfil=None):
+    """
+    Proyección de Mongo para un perfil. Devuelve una copia (el llamador puede ampliarla).
+    Lanza ValueError si el perfil no existe.
+    """
+    perfil = perfil or PERFIL_POR_DEFECTO
+    try:
+        return dict(PROYECCIONES[perfil])
+    except KeyError:
+        raise ValueError(f"Perfil de proyección desconocido: {perfil} (válidos: {', '.join(sorted(PROYECCIONES))})") from None
@@ -0,0 +1,291 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+query_service.py: servicio Python residente para la API Node.
+
+Sustituye el exec/spawn por petición de buscar_noticia.py, buscar_noticias_batch.py,
+history_entrypoint.py y permissions_entrypoint.py: un solo proceso con el .env cargado y
+los MongoClient ya conectados (mongo_clients), hablando JSON-RPC por líneas.
+
+Protocolo (una línea JSON por mensaje):
+  petición:  {"id": 1, "method": "buscar_noticia", "params": {"identificador": "...", "soloAntigua": false, "perfil": "badge"}}
+  respuesta: {"id": 1, "result": <mismo JSON que imprime el script>}
+             {"id": 1, "error": {"message": "...", "details": null}}
+Al arrancar se emite {"id": null, "event": "ready"}.
+
+Métodos: ping, buscar_noticia, buscar_noticias_batch, history, permissions, invalidate, cache_stats.
+Las búsquedas de noticias pasan por una caché LRU+TTL (news_cache) y los permisos de chatbot
+por otra con TTL (permission_cache), ambas invalidadas por change stream; las respuestas de
+buscar_noticia llevan además "version" (hash del contenido) para ETag.
+`perfil` elige la proyección (projections.PROYECCIONES; por defecto "full") y forma parte de la clave de caché.
+
+Uso:
+  python query_service.py                      # stdio (lo lanza servidor_api/server.js)
+  python query_service.py --socket /tmp/hq.sock
+"""
+import argparse
+import json
+import os
+import socketserver
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from bson import ObjectId
+from dotenv import load_dotenv
+
+# .env antes de los imports locales: NEWS_CACHE_*, PERMISSION_CACHE_*, QUERY_SERVICE_* y el pool
+# de Mongo se leen al importar
+load_dotenv(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".env"))
+
+import history_entrypoint
+import mongo_clients
+import permissions_entrypoint
+import user_permissions
+from buscar_noticia import consultar_noticia
+from buscar_noticias_batch import buscar_noticias_batch, normalize_url
+from env_config import get_env_first, get_env_int
+from news_cache import NEWS_CACHE_WATCH, NewsCache, MISSING, url_ref, watch_collection
+from permission_cache import PERMISSION_CACHE_WATCH, permission_cache, watch_permissions
+from projections import PERFIL_POR_DEFECTO, PROYECCIONES
+
+
+QUERY_SERVICE_WORKERS = get_env_int("QUERY_SERVICE_WORKERS", 8)
+NOT_FOUND = {"mensaje": "Noticia no encontrada."}
+news_cache = NewsCache()
+
+
+class RpcError(Exception):
+    def __init__(self, message, details=None):
+        super().__init__(message)
+        self.details = details
+
+
+class Versioned:
+    """Resultado acompañado de su versión de contenido (va en la respuesta como "version")."""
+
+    def __init__(self, result, version):
+        self.result = result
+        self.version = version
+
+
+def _buscar_noticia(params):
+    identificador = params.get("identificador")
+    if not identificador:
+        raise RpcError("El campo 'identificador' es requerido.")
+    identificador = str(identificador)
+    solo_antigua = bool(params.get("soloAntigua"))
+    perfil = params.get("perfil") or PERFIL_POR_DEFECTO
+    if perfil not in PROYECCIONES:
+        raise RpcError(f"Perfil de proyección desconocido: {perfil}")
+    key = ("id" if ObjectId.is_valid(identificador) else "url", identificador, solo_antigua, perfil)
+
+    cached = news_cache.get(key)
+    if cached is not MISSING:
+        noticia, version = cached
+        return Versioned(noticia if noticia else dict(NOT_FOUND), version)
+
+    try:
+        noticia = consultar_noticia(identificador, solo_antigua=solo_antigua, perfil=perfil)
+    except RuntimeError as e:
+        raise RpcError(str(e))
+    if not noticia:
+        # Asociado al _id o a la URL buscados: si el documento se inserta después, el change stream lo invalida
+        ref = str(ObjectId(identificador)) if key[0] == "id" else url_ref(normalize_url(identificador))
+        news_cache.set(key, None, doc_id=ref, negative=True)
+        return Versioned(dict(NOT_FOUND), None)
+    version = news_cache.set(key, noticia, doc_id=noticia.get("_id"))
+    return Versioned(noticia, version)
+
+
+def _buscar_noticias_batch(params):
+    urls = params.get("urls", [])
+    if not isinstance(urls, list):
+        return {"ok": False, "error": "El campo 'urls' debe ser una lista."}
+
+    normalizadas = list(dict.fromkeys(normalize_url(url) for url in urls))
+    resultados = {}
+    for url in normalizadas:
+        cached = news_cache.get(("batch", url))
+        if cached is not MISSING:
+            resultados[url] = cached[0]
+
+    faltantes = [url for url in normalizadas if url not in resultados]
+    if faltantes:
+        respuesta = buscar_noticias_batch(faltantes)
+        if not respuesta.get("ok"):
+            return respuesta
+        for item in respuesta.get("resultados", []):
+            resultados[item["url"]] = item
+            negative = item.get("id") is None
+            news_cache.set(
+                ("batch", item["url"]), item, doc_id=url_ref(item["url"]) if negative else item.get("id"), negative=negative
+            )
+
+    return {"ok": True, "resultados": [resultados[url] for url in normalizadas if url in resultados]}
+
+
+def _invalidate(params):
+    url = params.get("url")
+    news_cache.invalidate_doc(params.get("id"), url, normalize_url(url) if url else None)
+    return {"ok": True}
+
+
+METHODS = {
+    "ping": lambda params: {"ok": True, "pid": os.getpid()},
+    "buscar_noticia": _buscar_noticia,
+    "buscar_noticias_batch": _buscar_noticias_batch,
+    "history": history_entrypoint.handle_request,
+    "permissions": permissions_entrypoint.handle_request,
+    "invalidate": _invalidate,
+    "cache_stats": lambda params: {"ok": True, **news_cache.stats(), "permissions": permission_cache.stats()},
+}
+
+
+def handle_line(line):
+    """Procesa una línea de petición y devuelve la línea de respuesta (sin salto final)."""
+    request_id = None
+    try:
+        request = json.loads(line)
+        if not isinstance(request, dict):
+            raise RpcError("La petición debe ser un objeto JSON.")
+        request_id = request.get("id")
+        method = METHODS.get(request.get("method"))
+        if method is None:
+            raise RpcError(f"Método no soportado: {request.get('method')}")
+        params = request.get("params") or {}
+        if not isinstance(params, dict):
+            raise RpcError("'params' debe ser un objeto.")
+        result = method(params)
+        if isinstance(result, Versioned):
+            response = {"id": request_id, "result": result.result, "version": result.version}
+        else:
+            response = {"id": request_id, "result": result}
+    except json.JSONDecodeError:
+        response = {"id": request_id, "error": {"message": "Entrada inválida. Se espera JSON.", "details": None}}
+    except RpcError as e:
+        response = {"id": request_id, "error": {"message": str(e), "details": e.details}}
+    except Exception as e:
+        response = {"id": request_id, "error": {"message": "Error inesperado", "details": str(e)}}
+    return json.dumps(response, ensure_ascii=False, default=str)
+
+
+def warm_up():
+    """Abre los clients de las BD de noticias antes de la primera petición."""
+    load_dotenv()
+    uris = {
+        os.getenv("NEW_MONGODB_URI"),
+        os.getenv("OLD_MONGODB_URI"),
+        get_env_first(("MONGO_WRITE_URI", "NEW_MONGODB_URI", "MONGO_READ_URI", "OLD_MONGODB_URI", "MONGODB_URI")),
+    }
+    for uri in filter(None, uris):
+        try:
+            mongo_clients.get_client(uri).admin.command("ping")
+        except Exception as e:
+            print(f"[query_service] No se pudo precalentar MongoDB: {e}", file=sys.stderr)
+
+
+def start_cache_watchers(stop_event):
+    """Un change stream por BD de noticias para invalidar la caché cuando el pipeline escribe."""
+    load_dotenv()
+    for uri in dict.fromkeys(filter(None, (os.getenv("NEW_MONGODB_URI"), os.getenv("OLD_MONGODB_URI")))):
+        collection = mongo_clients.get_client(uri).get_database("Base_de_datos_noticias").get_collection("Noticias")
+        threading.Thread(
+            target=watch_collection,
+            args=(collection, news_cache, stop_event),
+            kwargs={"normalize": normalize_url},
+            name="news-cache-watch",
+            daemon=True,
+        ).start()
+
+
+def start_permission_watcher(stop_event):
+    """Change stream de user_permissions: lo que cambie otro proceso (p. ej. user_permissions_admin) invalida la caché."""
+    uri = user_permissions._resolve_mongo_uri()
+    if not uri:
+        return
+    collection = mongo_clients.get_collection(
+        uri, user_permissions.DB_NAME, user_permissions.COLLECTION_NAME
+    )
+    threading.Thread(
+        target=watch_permissions,
+        args=(collection, permission_cache, stop_event),
+        name="permission-cache-watch",
+        daemon=True,
+    ).start()
+
+
+def serve_stdio(out, workers):
+    write_lock = threading.Lock()
+
+    def reply(line):
+        response = handle_line(line)
+        with write_lock:
+            out.write(response + "\n")
+            out.flush()
+
+    with write_lock:
+        out.write(json.dumps({"id": None, "event": "ready"}) + "\n")
+        out.flush()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for line in sys.stdin:
+            line = line.strip()
+            if line:
+                pool.submit(reply, line)
+
+
+class _SocketHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for raw in self.rfile:
+            line = raw.decode("utf-8", errors="replace").strip()
+            if line:
+                self.wfile.write((handle_line(line) + "\n").encode("utf-8"))
+                self.wfile.flush()
+
+
+class _ThreadingUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve_socket(path):
+    if os.path.exists(path):
+        os.remove(path)
+    with _ThreadingUnixServer(path, _SocketHandler) as server:
+        print(f"[query_service] Escuchando en {path}", file=sys.stderr)
+        server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servicio residente de consultas (JSON-RPC por líneas).")
+    parser.add_argument("--socket", default=None, help="Ruta de socket Unix; por defecto stdio.")
+    parser.add_argument("--workers", type=int, default=QUERY_SERVICE_WORKERS, help="Peticiones atendidas en paralelo (stdio).")
+    args = parser.parse_args()
+
+    protocol_out = sys.stdout
+    if not args.socket:
+        # Todo lo que los módulos impriman va a stderr; stdout queda reservado al protocolo.
+        sys.stdout = sys.stderr
+
+    mongo_clients.enable_pooling()
+    warm_up()
+    stop_event = threading.Event()
+    if NEWS_CACHE_WATCH:
+        start_cache_watchers(stop_event)
+    if PERMISSION_CACHE_WATCH:
+        start_permission_watcher(stop_event)
+    try:
+        if args.socket:
+            serve_socket(args.socket)
+        else:
+            serve_stdio(protocol_out, max(1, args.workers))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_event.set()
+        mongo_clients.close_all()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+render_batch.py: genera en lote los PDF de noticias ya analizadas.
+
+- Lee las noticias de la BD nueva por lotes ($in) con la proyección `pdf` más el fact-check
+  que fact_checking_wrapper guarda en el documento (fact_check_analisis/fact_check_fuentes).
+- Renderiza los .tex en este proceso con el entorno Jinja de render_latex: la plantilla se
+  compila una vez (y su bytecode queda en LATEX_JINJA_CACHE_DIR para el siguiente arranque).
+- Compila los .tex en un pool de procesos del tamaño de los cores (RENDER_BATCH_WORKERS),
+  mientras se siguen leyendo y renderizando los siguientes, con el formato precompilado del
+  preámbulo (LATEX_PRECOMPILED_PREAMBLE), que se prepara una vez antes del primer envío.
+  Cada noticia va a su propio directorio (<output-dir>/<id>/), así que los .aux/.log no
+  chocan entre sí.
+- Un .tex que ya está en el almacén de artefactos (pdf_artifacts.py) no se compila: se copia
+  su PDF (resultado con "cached": true y el enlace de MEGA, si se llegó a subir).
+- No sube a MEGA: el PDF queda en disco y el resultado de cada noticia sale en NDJSON.
+
+Uso:
+  python render_batch.py ID [ID ...]
+  python render_batch.py --ids-file ids.txt        # un ID por línea; '-' lee de stdin
+  python render_batch.py --ids-file - --output-dir output_temporal/lote --workers 4
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from dotenv import load_dotenv
+
+import mongo_clients
+from env_config import get_env_first, get_env_int
+from fetch_news_item import convert_objectids_to_str
+from pdf_artifacts import PDF_ARTIFACTS_ENABLED, PdfArtifactStore, tex_hash
+from projections import proyeccion
+from render_latex import (
+    LATEX_TEMPLATE_FILE,
+    ROOT_DIR,
+    build_render_context,
+    compile_latex_to_pdf,
+    prepare_preamble_format,
+    render_to_string,
+    safe_filename,
+)
+
+
+RENDER_BATCH_WORKERS = get_env_int("RENDER_BATCH_WORKERS", os.cpu_count() or 2)
+RENDER_BATCH_FETCH_SIZE = get_env_int("RENDER_BATCH_FETCH_SIZE", 100)
+DEFAULT_OUTPUT_DIR = os.path.join(ROOT_DIR, "output_temporal", "batch")
+
+
+def read_ids(values, ids_file=None):
+    """IDs de la línea de comandos y/o de un fichero (uno por línea), sin repetidos y en orden."""
+    ids = list(values or [])
+    if ids_file:
+        handle = sys.stdin if ids_file == "-" else open(ids_file, "r", encoding="utf-8")
+        try:
+            ids.extend(line.strip() for line in handle)
+        finally:
+            if handle is not sys.stdin:
+                handle.close()
+    return list(dict.fromkeys(i for i in ids if i and not i.startswith("#")))
+
+
+def _noticias_collection():
+    uri = get_env_first(("MONGO_WRITE_URI", "NEW_MONGODB_URI", "MONGO_READ_URI", "OLD_MONGODB_URI", "MONGODB_URI"))
+    if not uri:
+        raise RuntimeError("Faltan MONGO_WRITE_URI/NEW_MONGODB_URI en el .env")
+    return mongo_clients.get_collection(
+        uri,
+        os.getenv("MONGO_DB_NAME", "Base_de_datos_noticias"),
+        os.getenv("MONGO_COLLECTION_NAME", "Noticias"),
+        workload="pipeline",
+    )
+
+
+def fetch_news_items(collection, ids, batch_size=None):
+    """Genera (id, noticia o None, error o None) en el orden de `ids`, leyendo por lotes."""
+    batch_size = max(1, batch_size or RENDER_BATCH_FETCH_SIZE)
+    projection = proyeccion("pdf")
+    projection.update({"fact_check_analisis": 1, "fact_check_fuentes": 1})
+    for start in range(0, len(ids), batch_size):
+        lote = ids[start:start + batch_size]
+        oids = {}
+        for noticia_id in lote:
+            try:
+                oids[noticia_id] = ObjectId(noticia_id)
+            except (InvalidId, TypeError):
+                pass
+        docs = {
+            str(doc["_id"]): doc
+            for doc in collection.find({"_id": {"$in": list(oids.values())}}, projection)
+        } if oids else {}
+        for noticia_id in lote:
+            if noticia_id not in oids:
+                yield noticia_id, None, "id_invalido"
+            elif noticia_id not in docs:
+                yield noticia_id, None, "no_encontrada"
+            else:
+                yield noticia_id, convert_objectids_to_str(docs[noticia_id]), None
+
+
+def render_item(news_item, item_dir):
+    """Renderiza el .tex de una noticia en item_dir; devuelve (ruta, hash del .tex)."""
+    fact_check_analisis = news_item.pop("fact_check_analisis", "") or ""
+    fact_check_fuentes = news_item.pop("fact_check_fuentes", None) or []
+    context = build_render_context(news_item, fact_check_analisis, fact_check_fuentes)
+    os.makedirs(item_dir, exist_ok=True)
+    tex_path = os.path.join(item_dir, safe_filename(context["news_item"].get("titulo") or "noticia") + ".tex")
+    tex_source = render_to_string(LATEX_TEMPLATE_FILE, context)
+    with open(tex_path, "w", encoding="utf-8") as f:
+        f.write(tex_source)
+    return tex_path, tex_hash(tex_source)
+
+
+def compile_item(noticia_id, tex_path, tex_sha256, timeout_sec):
+    """Trabajo del pool: compila un .tex, lo guarda en el almacén y devuelve el resultado serializable."""
+    item_dir = os.path.dirname(tex_path)
+    started = time.monotonic()
+    ok, err = compile_latex_to_pdf(tex_path, item_dir, os.path.join(item_dir, "latex_build.log"), timeout_sec=timeout_sec)
+    result = {"id": noticia_id, "ok": ok, "compile_ms": int((time.monotonic() - started) * 1000)}
+    if ok:
+        result["pdf"] = os.path.splitext(tex_path)[0] + ".pdf"
+        if PDF_ARTIFACTS_ENABLED:
+            try:
+                PdfArtifactStore.shared().put(tex_sha256, result["pdf"], noticia_id=noticia_id,
+                                              filename=os.path.basename(result["pdf"]))
+            except OSError as e:
+                print(f"Advertencia: no se pudo guardar el PDF en el almacén de artefactos: {e}")
+    else:
+        result["error"] = err
+    return result
+
+
+def reuse_artifact(noticia_id, tex_path, tex_sha256):
+    """Resultado con el PDF del almacén copiado junto al .tex, o None si no está."""
+    artifact = PdfArtifactStore.shared().get(tex_sha256) if PDF_ARTIFACTS_ENABLED else None
+    if artifact is None:
+        return None
+    pdf_path = os.path.splitext(tex_path)[0] + ".pdf"
+    shutil.copyfile(artifact["pdf"], pdf_path)
+    return {"id": noticia_id, "ok": True, "pdf": pdf_path, "cached": True, "mega_link": artifact.get("mega_link")}
+
+
+def render_batch(ids, output_dir=DEFAULT_OUTPUT_DIR, workers=None, timeout_sec=None, collection=None):
+    """
+    Genera los PDF de `ids` y va devolviendo un resultado por noticia (según terminan).
+    Los fallos de lectura o de render no se envían al pool; si un proceso del pool muere
+    (BrokenProcessPool) o compile_item lanza, esa noticia sale con "ok": False y el lote sigue.
+    """
+    timeout_sec = timeout_sec or int(os.getenv("LATEX_BUILD_TIMEOUT", "60"))
+    collection = collection if collection is not None else _noticias_collection()
+    os.makedirs(output_dir, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=max(1, workers or RENDER_BATCH_WORKERS)) as pool:
+        futures = {}
+        for noticia_id, news_item, error in fetch_news_items(collection, ids):
+            if error:
+                yield {"id": noticia_id, "ok": False, "error": error}
+                continue
+            try:
+                tex_path, tex_sha256 = render_item(news_item, os.path.join(output_dir, noticia_id))
+                reused = reuse_artifact(noticia_id, tex_path, tex_sha256)
+            except Exception as e:
+                yield {"id": noticia_id, "ok": False, "error": f"render: {type(e).__name__}: {e}"}
+                continue
+            if reused is not None:
+                yield reused
+                continue
+            if not futures:
+                # El formato del preámbulo se construye una vez antes de repartir las compilaciones
+                prepare_preamble_format(tex_path, timeout_sec)
+            try:
+                futures[pool.submit(compile_item, noticia_id, tex_path, tex_sha256, timeout_sec)] = noticia_id
+            except BrokenProcessPool as e:
+                yield {"id": noticia_id, "ok": False, "error": f"compile: {type(e).__name__}: {e}"}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"id": futures[future], "ok": False, "error": f"compile: {type(e).__name__}: {e}"}
+            yield result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera en lote los PDF de noticias analizadas.")
+    parser.add_argument("ids", nargs="*", help="IDs de noticia (ObjectId).")
+    parser.add_argument("--ids-file", metavar="FICHERO", help="Fichero con un ID por línea ('-' para stdin).")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR, help="Directorio de salida (un subdirectorio por noticia).")
+    parser.add_argument("--workers", type=int, default=None, help="Compilaciones simultáneas (por defecto RENDER_BATCH_WORKERS).")
+    args = parser.parse_args()
+
+    load_dotenv(os.path.join(ROOT_DIR, ".env"))
+    ids = read_ids(args.ids, args.ids_file)
+    if not ids:
+        parser.error("Indica al menos un ID (argumentos o --ids-file)")
+
+    started = time.monotonic()
+    counters = {"ok": 0, "errors": 0}
+    try:
+        for result in render_batch(ids, output_dir=args.output_dir, workers=args.workers):
+            print(json.dumps(result, ensure_ascii=False), flush=True)
+            counters["ok" if result["ok"] else "errors"] += 1
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+    counters["seconds"] = round(time.monotonic() - started, 2)
+    print(json.dumps({"summary": counters}, ensure_ascii=False), file=sys.stderr)
+    return 0 if counters["errors"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,17 +9,28 @@ Dependencias:
 Variables de entorno:
   - MEGA_EMAIL, MEGA_PASSWORD: credenciales MEGA.
   - LATEX_BUILD_TIMEOUT: segundos máximos para pdflatex (default 60).
+  - LATEX_JINJA_CACHE_DIR: caché de bytecode de Jinja (default cache/jinja; vacío la desactiva).
+  - LATEX_FORCE_SECOND_PASS: true para ejecutar siempre la segunda pasada de pdflatex.
+  - LATEX_PRECOMPILED_PREAMBLE: usa un formato precompilado del preámbulo (default true).
+  - LATEX_FORMAT_CACHE_DIR: dónde se guardan los formatos (default cache/latex_fmt).
   - NEW_MONGODB_URI: opcional, para actualizar pipeline.steps.pdf.
+  - PDF_ARTIFACTS_ENABLED / PDF_ARTIFACTS_DIR: almacén de PDF por hash del .tex (pdf_artifacts.py);
+    un .tex ya compilado reutiliza el PDF y, si se subió, el enlace de MEGA.
+  - MEGA_UPLOAD_MODE: inline (sube aquí, por defecto) o queue (encola para mega_uploader.py).
 
 Prueba local:
   1. Poner un JSON de noticia válido en output_temporal/retrieved_news_item.txt
   2. Opcional: output_temporal/fact_check_analisis.json con analisis/fuentes
   3. Desde repo root: .venv/bin/python src/render_latex.py
   4. PDF en output_temporal/<titulo_safe>.pdf; log en output_temporal/latex_build.log
+  Con --output-dir DIR se lee y escribe en DIR (analiza_y_guarda.py pasa el directorio de
+  trabajo de la ejecución, ver workspace.py).
 """
+import hashlib
 import json
 import os
 import re
+import shutil
 import subprocess
 import sys
 import time
@@ -27,7 +38,27 @@ import unicodedata
 from decimal import Decimal, ROUND_HALF_UP
 from datetime import datetime
 from dotenv import load_dotenv
-from jinja2 import Environment, FileSystemLoader, select_autoescape
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, select_autoescape
+
+# .env antes de los imports locales: pdf_artifacts y las constantes LATEX_* se leen al importar
+load_dotenv(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".env"))
+
+from env_config import get_env, get_env_bool
+from mega_cmd import detect_mega_cmd, extract_mega_link, run_mega_cmd
+from pdf_artifacts import PDF_ARTIFACTS_ENABLED, PdfArtifactStore, tex_hash
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+LATEX_TEMPLATE_FILE = "news_template.tex.j2"
+LATEX_JINJA_CACHE_DIR = get_env("LATEX_JINJA_CACHE_DIR", os.path.join("cache", "jinja"))
+if LATEX_JINJA_CACHE_DIR and not os.path.isabs(LATEX_JINJA_CACHE_DIR):
+    LATEX_JINJA_CACHE_DIR = os.path.join(ROOT_DIR, LATEX_JINJA_CACHE_DIR)
+LATEX_FORCE_SECOND_PASS = get_env_bool("LATEX_FORCE_SECOND_PASS", False)
+LATEX_PRECOMPILED_PREAMBLE = get_env_bool("LATEX_PRECOMPILED_PREAMBLE", True)
+LATEX_FORMAT_CACHE_DIR = get_env("LATEX_FORMAT_CACHE_DIR", os.path.join("cache", "latex_fmt"))
+if LATEX_FORMAT_CACHE_DIR and not os.path.isabs(LATEX_FORMAT_CACHE_DIR):
+    LATEX_FORMAT_CACHE_DIR = os.path.join(ROOT_DIR, LATEX_FORMAT_CACHE_DIR)
+# Un formato marcado como fallido (<nombre>.failed) se vuelve a intentar pasado este tiempo
+LATEX_FORMAT_FAILED_TTL_SECONDS = 24 * 3600
 
 # --- Unicode Character Handling ---
 # Emojis/símbolos: reemplazo por texto o eliminación. Comillas tipográficas -> ASCII.
@@ -370,22 +401,40 @@ def format_date_for_latex(date_str):
     except ValueError: return date_str
 
 # --- Jinja Environment Setup ---
-env = Environment(
-    loader=FileSystemLoader(os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))),
-    autoescape=select_autoescape(['html', 'xml']),
-    trim_blocks=True, lstrip_blocks=True
-)
-env.filters['escape_tex_special_chars'] = escape_tex_special_chars
-env.filters['escape_tex_inline'] = escape_tex_inline
-env.filters['replace_tex_special_chars'] = replace_tex_special_chars_for_url
-env.filters['format_date'] = format_date_for_latex
-env.filters['sanitize_fact_check'] = sanitize_and_format_fact_check
-env.filters['format_analysis'] = format_analysis_text
+def build_environment(bytecode_cache_dir=None):
+    """
+    Entorno Jinja con los filtros LaTeX. Con bytecode_cache_dir la plantilla compilada se
+    guarda en disco y los siguientes procesos no vuelven a parsearla.
+    """
+    bytecode_cache = None
+    if bytecode_cache_dir:
+        try:
+            os.makedirs(bytecode_cache_dir, exist_ok=True)
+            bytecode_cache = FileSystemBytecodeCache(bytecode_cache_dir)
+        except OSError as e:
+            print(f"Advertencia: caché de Jinja no disponible en {bytecode_cache_dir}: {e}")
+    environment = Environment(
+        loader=FileSystemLoader(ROOT_DIR),
+        autoescape=select_autoescape(['html', 'xml']),
+        trim_blocks=True, lstrip_blocks=True,
+        bytecode_cache=bytecode_cache,
+    )
+    environment.filters['escape_tex_special_chars'] = escape_tex_special_chars
+    environment.filters['escape_tex_inline'] = escape_tex_inline
+    environment.filters['replace_tex_special_chars'] = replace_tex_special_chars_for_url
+    environment.filters['format_date'] = format_date_for_latex
+    environment.filters['sanitize_fact_check'] = sanitize_and_format_fact_check
+    environment.filters['format_analysis'] = format_analysis_text
+    return environment
+
+env = build_environment(LATEX_JINJA_CACHE_DIR)
+
+def render_to_string(template_name, context):
+    return env.get_template(template_name).render(context)
 
 def render_template(template_name, output_filename, context):
     try:
-        template = env.get_template(template_name)
-        rendered_content = template.render(context)
+        rendered_content = render_to_string(template_name, context)
         with open(output_filename, "w", encoding="utf-8") as f:
             f.write(rendered_content)
         print(f"Successfully rendered '{template_name}' to '{output_filename}'")
@@ -393,6 +442,11 @@ def render_template(template_name, output_filename, context):
         print(f"Error rendering template {template_name}: {e}")
         raise
 
+def safe_filename(s, maxlen=60):
+    s = re.sub(r'[^\w\- ]', '', s)
+    s = s.replace(' ', '_')
+    return s[:maxlen]
+
 def clean_dict_recursive(obj):
     if isinstance(obj, dict):
         return {k: clean_dict_recursive(v) for k, v in obj.items()}
@@ -457,143 +511,297 @@ def normalize_global_scores_for_pdf(news_item_data):
     return news_item_data
 
 
-def compile_latex_to_pdf(tex_path, output_dir, log_path, timeout_sec=60):
-    """
-    Compila .tex a PDF con pdflatex. No bloquea: timeout y flags -interaction=nonstopmode -halt-on-error.
-    Escribe stdout/stderr en log_path. Opcionalmente ejecuta dos pasadas para referencias.
-    Returns (success: bool, error_message: str or None).
-    """
-    if not os.path.isfile(tex_path):
-        return False, f"Archivo no encontrado: {tex_path}"
-    pdflatex_cmd = [
-        "pdflatex",
-        "-interaction=nonstopmode",
-        "-halt-on-error",
-        "-file-line-error",
-        "-output-directory", output_dir,
-        os.path.abspath(tex_path),
-    ]
-    log_lines = []
-    try:
-        with open(log_path, "w", encoding="utf-8") as logf:
-            for run in (1, 2):
-                logf.write(f"\n--- pdflatex pass {run} ---\n")
-                try:
-                    result = subprocess.run(
-                        pdflatex_cmd,
-                        capture_output=True,
-                        text=True,
-                        timeout=timeout_sec,
-                        encoding="utf-8",
-                        errors="replace",
-                    )
-                except subprocess.TimeoutExpired:
-                    logf.write(f"TIMEOUT after {timeout_sec}s\n")
-                    log_lines.append(f"TIMEOUT after {timeout_sec}s")
-                    return False, f"pdflatex se colgó (timeout {timeout_sec}s). Ver {log_path}"
-                except FileNotFoundError:
-                    return False, "pdflatex no encontrado. Instala TeX Live (o equivalente)."
-                out, err = result.stdout or "", result.stderr or ""
-                logf.write(out)
-                logf.write(err)
-                log_lines.extend((out + err).splitlines())
-                if result.returncode != 0:
-                    # Intento de extraer el error específico de LaTeX
-                    print("--- Análisis de error LaTeX ---")
-                    for idx, line in enumerate(log_lines):
-                        if "! LaTeX Error:" in line:
-                            print(line)
-                            # Buscar contexto de línea (l. <num>) en las siguientes líneas
-                            for offset in range(1, 10):
-                                if idx + offset < len(log_lines):
-                                    next_l = log_lines[idx + offset]
-                                    if next_l.strip().startswith("l."):
-                                        print(next_l)
-                                        break
-                            break
-                    print("-----------------------------")
-
-                    tail = "\n".join(log_lines[-80:]) if len(log_lines) > 80 else "\n".join(log_lines)
-                    print("--- Error pdflatex (últimas líneas del log) ---")
-                    print(tail)
-                    print("---")
-                    return False, f"pdflatex falló (código {result.returncode}). Ver {log_path}"
-        return True, None
-    except OSError as e:
-        return False, f"No se pudo escribir log o ejecutar pdflatex: {e}"
+def build_render_context(news_item_data, fact_check_analisis="", fact_check_fuentes=None):
+    """Contexto de news_template.tex.j2 a partir de la noticia (limpia y con notas normalizadas)."""
+    news_item_data = clean_dict_recursive(news_item_data)
+    news_item_data = normalize_global_scores_for_pdf(news_item_data)
+    # Mapear campos para la plantilla LaTeX
+    if "texto_referencia_diccionario" in news_item_data:
+        news_item_data["texto_referencia_direct_dict_data"] = news_item_data["texto_referencia_diccionario"]
+    if "texto_referencia" in news_item_data:
+        news_item_data["texto_referencia_parsed_content"] = news_item_data["texto_referencia"]
+    return {
+        "news_item": news_item_data,
+        "fact_check_analisis": fact_check_analisis or "",
+        "fact_check_fuentes": fact_check_fuentes or [],
+    }
+
 
+# Avisos de pdflatex/hyperref que piden otra pasada
+_RERUN_RE = re.compile(r"Rerun to get|Label\(s\) may have changed|There were undefined (references|citations)|Rerun LaTeX")
+# Listas que solo se componen en la pasada siguiente a la que escribe su fichero auxiliar
+_LISTAS_RE = re.compile(r"\\(tableofcontents|listoffigures|listoftables)\b")
+_BEGIN_DOCUMENT_RE = re.compile(r"^[ \t]*\\begin\{document\}", re.M)
 
-def detect_mega_cmd():
+
+def needs_second_pass(tex_path, aux_path, pass_output):
     """
-    Detecta cómo invocar mega-cmd: "direct" (mega-* en PATH) o "snap" (snap run mega-cmd.*).
-    Returns (mode: "direct"|"snap", error_message: str or None).
+    True si la primera pasada dejó referencias sin resolver: avisos de "Rerun"/referencias
+    indefinidas en la salida, o un índice/lista en el .tex con entradas nuevas en el .aux.
+    Sin etiquetas, citas ni índices en el .aux, la segunda pasada produciría el mismo PDF.
     """
-    # 1) Ejecutable directo en PATH
+    if _RERUN_RE.search(pass_output or ""):
+        return True
     try:
-        r = subprocess.run(
-            ["mega-version"],
-            capture_output=True,
-            text=True,
-            timeout=5,
-        )
-        if r.returncode == 0:
-            return "direct", None
-    except FileNotFoundError:
-        pass
-    except subprocess.TimeoutExpired:
-        pass
+        with open(aux_path, "r", encoding="utf-8", errors="replace") as f:
+            aux = f.read()
+    except OSError:
+        return False
+    if "\\@writefile{" not in aux:
+        return False
+    try:
+        with open(tex_path, "r", encoding="utf-8", errors="replace") as f:
+            return bool(_LISTAS_RE.search(f.read()))
+    except OSError:
+        return True
+
 
-    # 2) Snap
+def split_preamble(tex_source):
+    """(preámbulo, cuerpo desde \\begin{document}); preámbulo None si no hay \\begin{document}."""
+    match = _BEGIN_DOCUMENT_RE.search(tex_source)
+    if not match:
+        return None, tex_source
+    return tex_source[:match.start()], tex_source[match.start():]
+
+
+def preamble_format_name(preamble):
+    return "preamble_" + hashlib.sha256(preamble.encode("utf-8")).hexdigest()[:16]
+
+
+def _formats_env():
+    # kpathsea busca -fmt=<nombre> también en la caché; el separador final añade la ruta por defecto
+    return dict(os.environ, TEXFORMATS=LATEX_FORMAT_CACHE_DIR + os.pathsep)
+
+
+def _failed_marker_active(path):
+    """True si hay un marcador .failed vigente; uno caducado se borra para reintentar el formato."""
     try:
-        r = subprocess.run(
-            ["snap", "run", "mega-cmd.mega-version"],
-            capture_output=True,
-            text=True,
-            timeout=10,
-        )
-        if r.returncode == 0:
-            return "snap", None
-        # snap existe pero mega-cmd falló (permisos, no instalado, etc.)
-        err = (r.stderr or r.stdout or "").strip() or "sin salida"
-        return None, "snap run mega-cmd falló: %s. Comprueba: snap list mega-cmd y permisos." % err[:200]
-    except FileNotFoundError:
-        return None, (
-            "mega-cmd no encontrado. Instala con: snap install mega-cmd "
-            "o añade mega-version al PATH."
-        )
-    except subprocess.TimeoutExpired:
-        return None, "snap run mega-cmd no respondió (timeout). Comprueba que mega-cmd esté instalado."
-    except Exception as e:
-        return None, "mega-cmd: %s" % e
+        age = time.time() - os.path.getmtime(path)
+    except OSError:
+        return False
+    if age < LATEX_FORMAT_FAILED_TTL_SECONDS:
+        return True
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+    return False
 
 
-def run_mega_cmd(mode, command, args=None, timeout=15):
+def ensure_preamble_format(preamble, timeout_sec=60):
     """
-    Ejecuta un comando mega-cmd. mode "direct" -> [command, ...args]; mode "snap" -> [snap, run, mega-cmd.<command>, ...args].
-    Returns (stdout, stderr, returncode).
+    Nombre del formato precompilado (pdflatex -ini + \\dump) para este preámbulo, construyéndolo
+    en LATEX_FORMAT_CACHE_DIR si falta. El nombre lleva el hash del preámbulo, así que un cambio
+    en la plantilla genera un formato nuevo. None si no se puede construir (se compila sin él).
     """
-    if mode == "snap":
-        cmd = ["snap", "run", "mega-cmd.%s" % command]
-    else:
-        cmd = [command]
-    if args:
-        cmd.extend(args)
+    if not LATEX_FORMAT_CACHE_DIR:
+        return None
+    name = preamble_format_name(preamble)
+    fmt_path = os.path.join(LATEX_FORMAT_CACHE_DIR, name + ".fmt")
+    failed_marker = os.path.join(LATEX_FORMAT_CACHE_DIR, name + ".failed")
+    if os.path.isfile(fmt_path):
+        return name
+    if _failed_marker_active(failed_marker):
+        return None
+    # jobname propio por proceso: compilaciones en paralelo no pisan el formato a medio escribir
+    jobname = f"{name}_{os.getpid()}"
+    source = os.path.join(LATEX_FORMAT_CACHE_DIR, jobname + ".tex")
     try:
+        os.makedirs(LATEX_FORMAT_CACHE_DIR, exist_ok=True)
+        with open(source, "w", encoding="utf-8") as f:
+            f.write(preamble)
+            f.write("\n\\dump\n")
         result = subprocess.run(
-            cmd,
+            [
+                "pdflatex", "-ini", "-interaction=nonstopmode", "-halt-on-error",
+                f"-jobname={jobname}", "-output-directory", LATEX_FORMAT_CACHE_DIR,
+                "&pdflatex", source,
+            ],
             capture_output=True,
             text=True,
-            timeout=timeout,
+            timeout=timeout_sec,
             encoding="utf-8",
             errors="replace",
+            env=_formats_env(),
         )
-        return (result.stdout or "", result.stderr or "", result.returncode)
-    except subprocess.TimeoutExpired:
-        return "", "Timeout después de %ds" % timeout, -1
-    except FileNotFoundError:
-        return "", "Comando no encontrado (revisa PATH o snap).", -1
-    except Exception as e:
-        return "", str(e), -1
+        built = os.path.join(LATEX_FORMAT_CACHE_DIR, jobname + ".fmt")
+        if result.returncode != 0 or not os.path.isfile(built):
+            with open(failed_marker, "w", encoding="utf-8") as f:
+                f.write((result.stdout or "") + (result.stderr or ""))
+            print(f"Advertencia: no se pudo precompilar el preámbulo LaTeX; ver {failed_marker}")
+            return None
+        os.replace(built, fmt_path)
+        print(f"Formato LaTeX precompilado: {fmt_path}")
+        return name
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f"Advertencia: no se pudo precompilar el preámbulo LaTeX: {e}")
+        return None
+    finally:
+        for ext in (".tex", ".log"):
+            try:
+                os.remove(os.path.join(LATEX_FORMAT_CACHE_DIR, jobname + ext))
+            except OSError:
+                pass
+
+
+def prepare_preamble_format(tex_path, timeout_sec=60):
+    """Construye (si hace falta) el formato del preámbulo de tex_path; útil antes de compilar en paralelo."""
+    if not LATEX_PRECOMPILED_PREAMBLE:
+        return None
+    with open(tex_path, "r", encoding="utf-8") as f:
+        preamble, _body = split_preamble(f.read())
+    return ensure_preamble_format(preamble, timeout_sec) if preamble else None
+
+
+def _format_body_target(tex_path, timeout_sec):
+    """
+    (nombre del formato, <nombre>.body.tex) para compilar solo el cuerpo con el formato
+    precompilado del preámbulo, o (None, None) si no hay formato utilizable.
+    """
+    with open(tex_path, "r", encoding="utf-8") as f:
+        preamble, body = split_preamble(f.read())
+    fmt_name = ensure_preamble_format(preamble, timeout_sec) if preamble else None
+    if not fmt_name:
+        return None, None
+    body_path = os.path.splitext(tex_path)[0] + ".body.tex"
+    with open(body_path, "w", encoding="utf-8") as f:
+        f.write(body)
+    return fmt_name, body_path
+
+
+def discard_preamble_format(fmt_name, reason):
+    """
+    Retira un formato que no compila (p. ej. tras actualizar TeX Live) y evita reconstruirlo
+    durante LATEX_FORMAT_FAILED_TTL_SECONDS. Solo se llama cuando el mismo documento compila
+    sin formato, es decir, cuando el fallo es del formato y no del documento. El marcador va
+    por hash del preámbulo: un cambio de plantilla no lo hereda.
+    """
+    for path, content in ((os.path.join(LATEX_FORMAT_CACHE_DIR, fmt_name + ".fmt"), None),
+                          (os.path.join(LATEX_FORMAT_CACHE_DIR, fmt_name + ".failed"), reason)):
+        try:
+            if content is None:
+                os.remove(path)
+            else:
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(content)
+        except OSError:
+            pass
+
+
+def _print_latex_error(log_lines):
+    # Intento de extraer el error específico de LaTeX
+    print("--- Análisis de error LaTeX ---")
+    for idx, line in enumerate(log_lines):
+        if "! LaTeX Error:" in line:
+            print(line)
+            # Buscar contexto de línea (l. <num>) en las siguientes líneas
+            for offset in range(1, 10):
+                if idx + offset < len(log_lines):
+                    next_l = log_lines[idx + offset]
+                    if next_l.strip().startswith("l."):
+                        print(next_l)
+                        break
+            break
+    print("-----------------------------")
+
+    tail = "\n".join(log_lines[-80:]) if len(log_lines) > 80 else "\n".join(log_lines)
+    print("--- Error pdflatex (últimas líneas del log) ---")
+    print(tail)
+    print("---")
+
+
+def compile_latex_to_pdf(tex_path, output_dir, log_path, timeout_sec=60, use_format=None):
+    """
+    Compila .tex a PDF con pdflatex. No bloquea: timeout y flags -interaction=nonstopmode -halt-on-error.
+    Escribe stdout/stderr en log_path. La segunda pasada solo se ejecuta si la primera dejó
+    referencias sin resolver (needs_second_pass) o con LATEX_FORCE_SECOND_PASS.
+    Con use_format (por defecto LATEX_PRECOMPILED_PREAMBLE) usa el formato precompilado del
+    preámbulo; si la compilación con formato falla, se repite una vez con el .tex completo.
+    Returns (success: bool, error_message: str or None).
+    """
+    if not os.path.isfile(tex_path):
+        return False, f"Archivo no encontrado: {tex_path}"
+    if use_format is None:
+        use_format = LATEX_PRECOMPILED_PREAMBLE
+    tex_abs = os.path.abspath(tex_path)
+    aux_path = os.path.join(output_dir, os.path.splitext(os.path.basename(tex_path))[0] + ".aux")
+    base_cmd = ["pdflatex", "-interaction=nonstopmode", "-halt-on-error", "-file-line-error"]
+    fmt_name, body_path = None, None
+    if use_format:
+        try:
+            fmt_name, body_path = _format_body_target(tex_abs, timeout_sec)
+        except OSError as e:
+            print(f"Advertencia: se compila sin formato precompilado: {e}")
+    try:
+        with open(log_path, "w", encoding="utf-8") as logf:
+            plain_cmd = base_cmd + ["-output-directory", output_dir, tex_abs]
+            if fmt_name:
+                # -jobname conserva los nombres .aux/.log/.pdf del .tex original
+                jobname = os.path.splitext(os.path.basename(tex_abs))[0]
+                logf.write(f"--- formato precompilado {fmt_name} ---\n")
+                ok, err, log_lines, latex_failed = _run_pdflatex_passes(
+                    base_cmd + [f"-fmt={fmt_name}", f"-jobname={jobname}", "-output-directory", output_dir, body_path],
+                    tex_abs, aux_path, log_path, logf, timeout_sec, _formats_env(),
+                )
+                if not ok and latex_failed:
+                    logf.write("\n--- reintento sin formato precompilado ---\n")
+                    ok, err, log_lines, latex_failed = _run_pdflatex_passes(
+                        plain_cmd, tex_abs, aux_path, log_path, logf, timeout_sec, None
+                    )
+                    if ok:
+                        # Sin formato compila: el formato es el problema, no el documento
+                        discard_preamble_format(fmt_name, f"falló al compilar {tex_abs}")
+            else:
+                ok, err, log_lines, latex_failed = _run_pdflatex_passes(
+                    plain_cmd, tex_abs, aux_path, log_path, logf, timeout_sec, None
+                )
+        if body_path is not None:
+            try:
+                os.remove(body_path)
+            except OSError:
+                pass
+        if latex_failed:
+            _print_latex_error(log_lines)
+        return ok, err
+    except OSError as e:
+        return False, f"No se pudo escribir log o ejecutar pdflatex: {e}"
+
+
+def _run_pdflatex_passes(pdflatex_cmd, tex_path, aux_path, log_path, logf, timeout_sec, run_env):
+    """
+    Una o dos pasadas de pdflatex. Returns (ok, error_message, log_lines, latex_failed), con
+    latex_failed=True si pdflatex llegó a ejecutarse y terminó con error.
+    """
+    log_lines = []
+    pass_output = ""
+    for run in (1, 2):
+        if run == 2 and not LATEX_FORCE_SECOND_PASS and not needs_second_pass(tex_path, aux_path, pass_output):
+            logf.write("\n--- pdflatex pass 2 omitida: sin referencias pendientes ---\n")
+            break
+        logf.write(f"\n--- pdflatex pass {run} ---\n")
+        try:
+            result = subprocess.run(
+                pdflatex_cmd,
+                capture_output=True,
+                text=True,
+                timeout=timeout_sec,
+                encoding="utf-8",
+                errors="replace",
+                env=run_env,
+            )
+        except subprocess.TimeoutExpired:
+            logf.write(f"TIMEOUT after {timeout_sec}s\n")
+            return False, f"pdflatex se colgó (timeout {timeout_sec}s). Ver {log_path}", log_lines, False
+        except FileNotFoundError:
+            return False, "pdflatex no encontrado. Instala TeX Live (o equivalente).", log_lines, False
+        out, err = result.stdout or "", result.stderr or ""
+        pass_output = out
+        logf.write(out)
+        logf.write(err)
+        log_lines.extend((out + err).splitlines())
+        if result.returncode != 0:
+            return False, f"pdflatex falló (código {result.returncode}). Ver {log_path}", log_lines, True
+    return True, None, log_lines, False
 
 
 def subir_a_mega_mejorado(pdf_path, email, password, carpeta_destino="HemingwAI/PDF hemingwAI"):
@@ -671,15 +879,11 @@ def subir_a_mega_mejorado(pdf_path, email, password, carpeta_destino="HemingwAI/
                 print("ERROR al generar enlace:", stderr or stdout)
                 return None
 
-            link_match = re.search(r"https://mega\.nz/[^\s\)\]]+", stdout or "")
-            if not link_match:
+            link = extract_mega_link(stdout)
+            if not link:
                 print("ERROR: no se encontró URL en la salida de mega-export:")
                 print(stdout or "(vacío)")
                 return None
-            link = link_match.group(0).rstrip(".,;")
-            if not link.startswith("https://mega.nz/"):
-                print("ERROR: enlace inválido:", link)
-                return None
 
             # Verificación
             stdout, stderr, rc = run("mega-ls", remote_path)
@@ -711,18 +915,19 @@ if __name__ == "__main__":
         _run_format_tests()
         sys.exit(0)
 
-    ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
-    load_dotenv(os.path.join(ROOT_DIR, ".env"))
-    
-    # Construir rutas basadas en ROOT_DIR
+    # Construir rutas basadas en ROOT_DIR (o en el directorio de trabajo de la ejecución)
     output_dir = os.path.join(ROOT_DIR, "output_temporal")
+    if len(sys.argv) == 3 and sys.argv[1] == "--output-dir":
+        output_dir = os.path.abspath(sys.argv[2])
+    elif len(sys.argv) > 1:
+        print("Uso: python render_latex.py [--output-dir DIR]")
+        sys.exit(1)
     news_data_file = os.path.join(output_dir, "retrieved_news_item.txt")
-    latex_template_file = "news_template.tex.j2"
     
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
     
-    # Cargar y limpiar news_item_data
+    # Cargar news_item_data
     try:
         with open(news_data_file, "r", encoding="utf-8") as f:
             news_item_data = json.load(f)
@@ -732,9 +937,6 @@ if __name__ == "__main__":
     except json.JSONDecodeError:
         print(f"Error: Could not decode JSON from '{news_data_file}'.")
         sys.exit(1)
-    
-    news_item_data = clean_dict_recursive(news_item_data)
-    news_item_data = normalize_global_scores_for_pdf(news_item_data)
 
     noticia_id = news_item_data.get("_id", "")
     run_id = (news_item_data.get("pipeline") or {}).get("run_id", "")
@@ -754,87 +956,138 @@ if __name__ == "__main__":
     except (json.JSONDecodeError, IOError) as e:
         print(f"Error al leer o decodificar el archivo de análisis de fact-checking: {e}")
 
-    # Mapear campos para la plantilla LaTeX
-    if "texto_referencia_diccionario" in news_item_data:
-        news_item_data["texto_referencia_direct_dict_data"] = news_item_data["texto_referencia_diccionario"]
-    if "texto_referencia" in news_item_data:
-        news_item_data["texto_referencia_parsed_content"] = news_item_data["texto_referencia"]
+    context = build_render_context(news_item_data, fact_check_analisis, fact_check_fuentes)
 
     # Obtener el titular y generar un nombre de archivo seguro
-    def safe_filename(s, maxlen=60):
-        s = re.sub(r'[^\w\- ]', '', s)
-        s = s.replace(' ', '_')
-        return s[:maxlen]
-    
-    titulo = news_item_data.get('titulo', 'noticia')
+    titulo = context["news_item"].get('titulo', 'noticia')
     filename_base = safe_filename(titulo)
     output_tex_file = os.path.join(output_dir, f"{filename_base}.tex")
     output_pdf_file = os.path.join(output_dir, f"{filename_base}.pdf")
-
-    context = {
-        "news_item": news_item_data,
-        "fact_check_analisis": fact_check_analisis,
-        "fact_check_fuentes": fact_check_fuentes
-    }
     
     try:
-        render_template(latex_template_file, output_tex_file, context)
-    except Exception:
-        sys.exit(1)
-
-    # Compilar el PDF con timeout y log (no bloquea)
-    latex_log = os.path.join(output_dir, "latex_build.log")
-    timeout_sec = int(os.getenv("LATEX_BUILD_TIMEOUT", "60"))
-    ok, err = compile_latex_to_pdf(output_tex_file, output_dir, latex_log, timeout_sec=timeout_sec)
-    if not ok:
-        print(f"Error al compilar el PDF: {err}")
+        tex_source = render_to_string(LATEX_TEMPLATE_FILE, context)
+        with open(output_tex_file, "w", encoding="utf-8") as f:
+            f.write(tex_source)
+        print(f"Successfully rendered '{LATEX_TEMPLATE_FILE}' to '{output_tex_file}'")
+    except Exception as e:
+        print(f"Error rendering template {LATEX_TEMPLATE_FILE}: {e}")
         sys.exit(1)
-    print(f"PDF generado: {output_pdf_file}")
 
-    # Subir el PDF a Mega.nz automáticamente
+    # Mismo .tex => mismo PDF: se reutiliza el del almacén de artefactos (y su enlace, si lo hay)
+    MEGA_FOLDER_PATH = "HemingwAI/PDF hemingwAI"
+    tex_sha256 = tex_hash(tex_source)
+    artifact_store = PdfArtifactStore.shared() if PDF_ARTIFACTS_ENABLED else None
+    artifact = artifact_store.get(tex_sha256) if artifact_store else None
+    if artifact:
+        shutil.copyfile(artifact["pdf"], output_pdf_file)
+        print(f"PDF reutilizado del almacén de artefactos ({tex_sha256[:12]}): {output_pdf_file}")
+    else:
+        # Compilar el PDF con timeout y log (no bloquea)
+        latex_log = os.path.join(output_dir, "latex_build.log")
+        timeout_sec = int(os.getenv("LATEX_BUILD_TIMEOUT", "60"))
+        ok, err = compile_latex_to_pdf(output_tex_file, output_dir, latex_log, timeout_sec=timeout_sec)
+        if not ok:
+            print(f"Error al compilar el PDF: {err}")
+            sys.exit(1)
+        print(f"PDF generado: {output_pdf_file}")
+        if artifact_store:
+            try:
+                artifact = artifact_store.put(tex_sha256, output_pdf_file, noticia_id=noticia_id, filename=os.path.basename(output_pdf_file))
+            except OSError as e:
+                print(f"Advertencia: no se pudo guardar el PDF en el almacén de artefactos: {e}")
+
+    # Subir el PDF a Mega.nz automáticamente (salvo que este mismo PDF ya esté publicado)
     MEGA_EMAIL = os.getenv("MEGA_EMAIL")
     MEGA_PASSWORD = os.getenv("MEGA_PASSWORD")
-    MEGA_FOLDER_PATH = "HemingwAI/PDF hemingwAI"
-    
-    if MEGA_EMAIL and MEGA_PASSWORD:
+    link = artifact_store.link_for(artifact, MEGA_FOLDER_PATH) if artifact_store else None
+    link_reused = link is not None
+    upload_job = None
+    if not link_reused and os.getenv("MEGA_UPLOAD_MODE", "inline").strip().lower() == "queue":
+        # La subida la hace mega_uploader.py en segundo plano; aquí solo se encola
+        try:
+            import mega_uploader
+            upload_job = mega_uploader.enqueue_upload(
+                mega_uploader.queue_collection(), output_pdf_file, noticia_id, MEGA_FOLDER_PATH, job_id=tex_sha256
+            )
+            link = upload_job.get("link") if upload_job.get("status") == "done" else None
+            link_reused = link is not None
+        except Exception as e:
+            print(f"Advertencia: no se pudo encolar la subida ({type(e).__name__}: {e}); se sube ahora")
+            upload_job = None
+    if link_reused:
+        print("PDF sin cambios: se reutiliza el enlace ya publicado")
+    elif upload_job is None:
+        if not (MEGA_EMAIL and MEGA_PASSWORD):
+            print("⚠️ Credenciales de Mega.nz no encontradas en el .env. No se subió el PDF.")
+            sys.exit(1)
         link = subir_a_mega_mejorado(output_pdf_file, MEGA_EMAIL, MEGA_PASSWORD, MEGA_FOLDER_PATH)
+        if link and artifact:
+            try:
+                artifact_store.record_link(tex_sha256, link, MEGA_FOLDER_PATH)
+            except OSError as e:
+                print(f"Advertencia: no se pudo anotar el enlace en el almacén de artefactos: {e}")
+
+    if upload_job is not None and not link:
+        mongo_uri = os.getenv("NEW_MONGODB_URI")
+        if mongo_uri and noticia_id:
+            try:
+                from datetime import timezone
+                from bson import ObjectId
+                import mongo_clients
+                _col = mongo_clients.get_collection(mongo_uri, "Base_de_datos_noticias", "Noticias", workload="pipeline")
+                _col.update_one(
+                    {"_id": ObjectId(noticia_id)},
+                    {"$set": {
+                        "pipeline.status": "pdf_generated",
+                        "pipeline.steps.pdf": {
+                            "ok": True,
+                            "at": datetime.now(timezone.utc).isoformat(),
+                            "artifact": output_pdf_file,
+                            "tex_sha256": tex_sha256,
+                            "upload": "queued",
+                            "upload_job": upload_job["_id"],
+                        }
+                    }}
+                )
+            except Exception as _e:
+                print(f"Advertencia: no se pudo actualizar pipeline en MongoDB: {_e}")
+        # Marcador para analiza_y_guarda.py: el enlace llegará a pipeline.steps.pdf al subirse
+        print(f"Upload queued: {upload_job['_id']}")
+        sys.exit(0)
 
-        if link:
-            # Optional: update MongoDB pipeline step for traceability
-            import os as _os
-            from pymongo import MongoClient
-            from bson import ObjectId
-            mongo_uri = _os.getenv("NEW_MONGODB_URI")
-            if mongo_uri and noticia_id:
-                try:
-                    _client = MongoClient(mongo_uri)
-                    _col = _client["Base_de_datos_noticias"]["Noticias"]
-                    _oid = ObjectId(noticia_id) if isinstance(noticia_id, str) and len(noticia_id) == 24 else noticia_id
-                    from datetime import datetime, timezone
-                    _col.update_one(
-                        {"_id": _oid},
-                        {"$set": {
-                            "pipeline.status": "pdf_generated",
-                            "pipeline.steps.pdf": {
-                                "ok": True,
-                                "at": datetime.now(timezone.utc).isoformat(),
-                                "artifact": output_pdf_file,
-                                "mega_link": link
-                            }
-                        }}
-                    )
-                    _client.close()
-                except Exception as _e:
-                    print(f"Advertencia: no se pudo actualizar pipeline en MongoDB: {_e}")
-
-            # IMPORTANTE: Formato específico para que analiza_y_guarda.py pueda capturarlo
-            print(f"\n✅ PDF subido exitosamente a Mega.nz")
-            print(f"Link: {link}")
-            # Salir con código 0 (éxito)
-            sys.exit(0)
-        else:
-            print(f"\n❌ No se pudo subir el PDF a Mega.nz")
-            sys.exit(1)
+    if link:
+        # Optional: update MongoDB pipeline step for traceability
+        import os as _os
+        from bson import ObjectId
+        import mongo_clients
+        mongo_uri = _os.getenv("NEW_MONGODB_URI")
+        if mongo_uri and noticia_id:
+            try:
+                _col = mongo_clients.get_collection(mongo_uri, "Base_de_datos_noticias", "Noticias", workload="pipeline")
+                _oid = ObjectId(noticia_id) if isinstance(noticia_id, str) and len(noticia_id) == 24 else noticia_id
+                from datetime import datetime, timezone
+                _col.update_one(
+                    {"_id": _oid},
+                    {"$set": {
+                        "pipeline.status": "pdf_generated",
+                        "pipeline.steps.pdf": {
+                            "ok": True,
+                            "at": datetime.now(timezone.utc).isoformat(),
+                            "artifact": output_pdf_file,
+                            "tex_sha256": tex_sha256,
+                            "reused": link_reused,
+                            "mega_link": link
+                        }
+                    }}
+                )
+            except Exception as _e:
+                print(f"Advertencia: no se pudo actualizar pipeline en MongoDB: {_e}")
+
+        # IMPORTANTE: Formato específico para que analiza_y_guarda.py pueda capturarlo
+        print(f"\n✅ PDF subido exitosamente a Mega.nz")
+        print(f"Link: {link}")
+        # Salir con código 0 (éxito)
+        sys.exit(0)
     else:
-        print("⚠️ Credenciales de Mega.nz no encontradas en el .env. No se subió el PDF.")
+        print(f"\n❌ No se pudo subir el PDF a Mega.nz")
         sys.exit(1)
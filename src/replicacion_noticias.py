@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+replicacion_noticias.py: replica la colección `Noticias` antigua (lectura) en la nueva (escritura).
+
+- Sigue el change stream de la colección antigua (requiere replica set) y aplica en la nueva
+  los campos básicos de cada inserción/actualización (los que escribe el crawler), en lotes
+  con bulk_write. Solo se rellenan los campos que en la nueva faltan o están vacíos: los del
+  análisis y el titulo/cuerpo de noticias ya analizadas no se tocan.
+- Si el crawler ya guardó la misma url en la nueva con otro _id, se rellena ese documento
+  (índice único ux_noticias_url); los errores de escritura por documento no frenan el stream.
+- El resume token del último lote aplicado se guarda en `replication_state` (BD nueva),
+  así que al reiniciar se sigue donde se quedó. Las escrituras son idempotentes ($set por _id),
+  por lo que reaplicar un lote tras una caída no cambia el resultado.
+- Sin token (primer arranque) o si el oplog ya no contiene el token, se hace una copia
+  completa y después se sigue el stream desde el punto en que se abrió.
+- Los borrados en la antigua no se replican: la nueva conserva los análisis.
+
+Con la nueva al día, las lecturas pueden ir solo a ella (NEWS_READ_SINGLE_DB=true).
+
+Uso:
+  python replicacion_noticias.py               # copia inicial si hace falta y seguimiento continuo
+  python replicacion_noticias.py --full-sync   # fuerza la copia completa antes de seguir
+  python replicacion_noticias.py --once        # solo la copia completa (sin stream)
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure, PyMongoError
+
+# .env antes de los imports locales: las REPLICATION_* y el pool de Mongo se leen al importar
+load_dotenv(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".env"))
+
+import mongo_clients
+from env_config import get_env, get_env_first, get_env_int
+
+
+REPLICATION_BATCH_SIZE = get_env_int("REPLICATION_BATCH_SIZE", 500)
+REPLICATION_BATCH_MAX_WAIT_MS = get_env_int("REPLICATION_BATCH_MAX_WAIT_MS", 1000)
+REPLICATION_STATE_COLLECTION = get_env("REPLICATION_STATE_COLLECTION", "replication_state")
+REPLICATION_STREAM_ID = "noticias_old_to_new"
+RETRY_MAX_SECONDS = 60
+# Códigos de servidor cuando el resume token ya no está en el oplog
+HISTORY_LOST_CODES = {260, 280, 286}
+
+# Campos que crea el crawler; el resto los añade el pipeline de análisis en la BD nueva.
+CAMPOS_BASICOS = [
+    'titulo', 'cuerpo', 'url', 'autor', 'fecha_publicacion', 'fuente',
+    'fecha_extraccion', 'tags', 'keywords', 'top_image', 'images', 'is_media_news'
+]
+
+
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+
+def _campos_replica(doc):
+    return {
+        campo: doc[campo]
+        for campo in CAMPOS_BASICOS
+        if doc.get(campo) is not None and doc.get(campo) != ''
+    }
+
+
+def operacion_replica(doc, por_url=False):
+    """
+    UpdateOne que lleva a la BD nueva los campos básicos no vacíos de un documento antiguo.
+    Como Utils.copy_basic_fields_to_new_db, solo rellena los campos que en la nueva faltan o
+    están vacíos: no pisa el titulo/cuerpo de una noticia ya analizada. Con `por_url` se busca
+    por url (sin upsert), para la copia que el crawler ya insertó con otro _id.
+    """
+    campos = _campos_replica(doc)
+    if not campos:
+        return None
+    # Update con pipeline: cada campo se conserva salvo que falte o esté vacío
+    relleno = {
+        campo: {
+            "$cond": [
+                {"$in": [{"$ifNull": [f"${campo}", None]}, [None, "", []]]},
+                {"$literal": valor},
+                f"${campo}",
+            ]
+        }
+        for campo, valor in campos.items()
+    }
+    if por_url:
+        return UpdateOne({"url": doc["url"]}, [{"$set": relleno}])
+    return UpdateOne({"_id": doc["_id"]}, [{"$set": relleno}], upsert=True)
+
+
+class NewsReplicator:
+    def __init__(self, old_collection, new_collection, state_collection, stream_id=REPLICATION_STREAM_ID,
+                 batch_size=None, max_wait_ms=None, stop_event=None):
+        self.old_collection = old_collection
+        self.new_collection = new_collection
+        self.state = state_collection
+        self.stream_id = stream_id
+        self.batch_size = max(1, batch_size or REPLICATION_BATCH_SIZE)
+        self.max_wait_seconds = (REPLICATION_BATCH_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000
+        self.stop_event = stop_event or threading.Event()
+        self.applied = 0
+
+    # --- Estado ---
+
+    def load_token(self):
+        doc = self.state.find_one({"_id": self.stream_id}, {"resume_token": 1})
+        return (doc or {}).get("resume_token")
+
+    def save_token(self, token, **extra):
+        self.state.update_one(
+            {"_id": self.stream_id},
+            {"$set": {"resume_token": token, "updated_at": _utcnow(), **extra}},
+            upsert=True,
+        )
+
+    # --- Aplicación por lotes ---
+
+    def _apply(self, docs):
+        """
+        Aplica un lote de documentos antiguos. Los errores de escritura por documento no
+        detienen la replicación (si no, el mismo lote se reintentaría para siempre): una url
+        que el crawler ya insertó en la nueva con otro _id (11000 en ux_noticias_url) se
+        rellena por url, y el resto de errores se registran y se saltan.
+        """
+        pares = [(doc, operacion_replica(doc)) for doc in docs]
+        pares = [(doc, op) for doc, op in pares if op is not None]
+        if not pares:
+            return 0
+        try:
+            self.new_collection.bulk_write([op for _, op in pares], ordered=False)
+        except BulkWriteError as e:
+            errores = e.details.get("writeErrors") or []
+            duplicados = [pares[err["index"]][0] for err in errores if err.get("code") == 11000 and pares[err["index"]][0].get("url")]
+            otros = [err for err in errores if err.get("code") != 11000 or not pares[err["index"]][0].get("url")]
+            for err in otros:
+                print(f"[replicacion] Documento {pares[err['index']][0].get('_id')} no replicado (código {err.get('code')}): {err.get('errmsg')}")
+            if duplicados:
+                self._apply_por_url(duplicados)
+        self.applied += len(pares)
+        return len(pares)
+
+    def _apply_por_url(self, docs):
+        try:
+            self.new_collection.bulk_write([operacion_replica(doc, por_url=True) for doc in docs], ordered=False)
+        except BulkWriteError as e:
+            for err in e.details.get("writeErrors") or []:
+                print(f"[replicacion] Documento {docs[err['index']].get('_id')} no replicado por url (código {err.get('code')})")
+        print(f"[replicacion] {len(docs)} documentos con url ya presente en la nueva (otro _id): rellenados por url")
+
+    def full_sync(self):
+        """Copia todos los documentos de la antigua a la nueva (solo campos básicos)."""
+        projection = {campo: 1 for campo in CAMPOS_BASICOS}
+        total = 0
+        lote = []
+        for doc in self.old_collection.find({}, projection).batch_size(self.batch_size):
+            if self.stop_event.is_set():
+                break
+            lote.append(doc)
+            if len(lote) >= self.batch_size:
+                total += self._apply(lote)
+                lote = []
+        total += self._apply(lote)
+        print(f"[replicacion] Copia completa: {total} documentos aplicados")
+        return total
+
+    def follow(self, resume_token=None):
+        """
+        Aplica el change stream en lotes (por tamaño o por tiempo) y persiste el token
+        tras cada lote. Vuelve cuando se pide parar o si el stream se cierra.
+        """
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace"]}}}]
+        with self.old_collection.watch(
+            pipeline,
+            full_document="updateLookup",
+            resume_after=resume_token,
+            max_await_time_ms=min(1000, max(1, int(self.max_wait_seconds * 1000))),
+        ) as stream:
+            if resume_token is None and stream.resume_token is not None:
+                self.save_token(stream.resume_token)
+            lote = []
+            token = None
+            primera = None
+            while not self.stop_event.is_set() and stream.alive:
+                change = stream.try_next()
+                if change is not None:
+                    doc = change.get("fullDocument")
+                    if doc is not None:
+                        lote.append(doc)
+                    token = stream.resume_token
+                    primera = primera or time.monotonic()
+                vencido = primera is not None and time.monotonic() - primera >= self.max_wait_seconds
+                if token is not None and (len(lote) >= self.batch_size or vencido or change is None):
+                    self._apply(lote)
+                    self.save_token(token)
+                    lote, token, primera = [], None, None
+
+    def run(self, force_full_sync=False):
+        """Bucle principal con reintentos; hace copia completa si no hay token utilizable."""
+        delay = 1
+        resume_token = None if force_full_sync else self.load_token()
+        pending_sync = resume_token is None
+        while not self.stop_event.is_set():
+            try:
+                if pending_sync:
+                    # El stream se abre antes de copiar para no perder cambios concurrentes
+                    with self.old_collection.watch(max_await_time_ms=1) as stream:
+                        stream.try_next()
+                        resume_token = stream.resume_token
+                    self.full_sync()
+                    if resume_token is not None:
+                        self.save_token(resume_token, last_full_sync_at=_utcnow())
+                    pending_sync = False
+                self.follow(resume_token)
+                resume_token = self.load_token()
+                delay = 1
+            except OperationFailure as e:
+                if e.code in HISTORY_LOST_CODES:
+                    print(f"[replicacion] Resume token fuera del oplog ({e.code}); se rehace la copia completa")
+                    pending_sync = True
+                    resume_token = None
+                    continue
+                print(f"[replicacion] Error de MongoDB ({e}); reintento en {delay}s")
+                self.stop_event.wait(delay)
+                delay = min(delay * 2, RETRY_MAX_SECONDS)
+                resume_token = self.load_token()
+            except PyMongoError as e:
+                print(f"[replicacion] Conexión interrumpida ({type(e).__name__}: {e}); reintento en {delay}s")
+                self.stop_event.wait(delay)
+                delay = min(delay * 2, RETRY_MAX_SECONDS)
+                resume_token = self.load_token()
+
+
+def build_replicator(stop_event=None):
+    read_uri = get_env_first(("MONGO_READ_URI", "OLD_MONGODB_URI", "MONGODB_URI"))
+    write_uri = get_env_first(("MONGO_WRITE_URI", "NEW_MONGODB_URI", "MONGODB_URI"))
+    if not read_uri or not write_uri:
+        raise RuntimeError("Faltan MONGO_READ_URI/MONGO_WRITE_URI (o OLD_MONGODB_URI/NEW_MONGODB_URI) en el .env")
+    if read_uri == write_uri:
+        raise RuntimeError("La BD de lectura y la de escritura son la misma: no hay nada que replicar.")
+    db_name = os.getenv("MONGO_DB_NAME", "Base_de_datos_noticias")
+    collection_name = os.getenv("MONGO_COLLECTION_NAME", "Noticias")
+    new_db = mongo_clients.get_database(write_uri, db_name, workload="bulk")
+    return NewsReplicator(
+        mongo_clients.get_collection(read_uri, db_name, collection_name, workload="read"),
+        new_db[collection_name],
+        new_db[REPLICATION_STATE_COLLECTION],
+        stop_event=stop_event,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replica Noticias (BD antigua) en la BD nueva con un change stream.")
+    parser.add_argument("--full-sync", action="store_true", help="Fuerza la copia completa antes de seguir el stream.")
+    parser.add_argument("--once", action="store_true", help="Solo la copia completa, sin seguir el stream.")
+    args = parser.parse_args()
+
+    try:
+        replicator = build_replicator()
+    except RuntimeError as e:
+        print(e)
+        return 1
+
+    if args.once:
+        replicator.full_sync()
+        return 0
+    try:
+        replicator.run(force_full_sync=args.full_sync)
+    except KeyboardInterrupt:
+        replicator.stop_event.set()
+    print(f"[replicacion] Detenido; {replicator.applied} operaciones aplicadas")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+import os
+import sys
+import threading
+import time
+import uuid
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SRC = os.path.join(ROOT, "src")
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from pymongo import MongoClient  # noqa: E402
+
+from replicacion_noticias import NewsReplicator  # noqa: E402
+
+# Replica set local de un nodo, p. ej.:
+#   mongod --replSet rs0 --dbpath /tmp/rs0 && mongosh --eval "rs.initiate()"
+SELFCHECK_URI = os.getenv("REPLICATION_SELFCHECK_URI", "mongodb://localhost:27017/?replicaSet=rs0&directConnection=true")
+
+
+def _esperar(condicion, timeout=15):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        if condicion():
+            return True
+        time.sleep(0.2)
+    return False
+
+
+def _arrancar(old, new, state):
+    stop_event = threading.Event()
+    replicator = NewsReplicator(old, new, state, batch_size=2, max_wait_ms=200, stop_event=stop_event)
+    hilo = threading.Thread(target=replicator.run, daemon=True)
+    hilo.start()
+    return replicator, hilo
+
+
+def run_selfcheck() -> None:
+    client = MongoClient(SELFCHECK_URI, serverSelectionTimeoutMS=5000)
+    sufijo = uuid.uuid4().hex[:8]
+    old_db = client[f"replicacion_selfcheck_old_{sufijo}"]
+    new_db = client[f"replicacion_selfcheck_new_{sufijo}"]
+    old, new, state = old_db["Noticias"], new_db["Noticias"], new_db["replication_state"]
+    try:
+        old.insert_many([{"url": f"https://example.com/{i}", "titulo": f"T{i}", "cuerpo": "c"} for i in range(3)])
+        new.insert_one({"_id": old.find_one({"url": "https://example.com/0"})["_id"], "puntuacion": 7.5})
+
+        replicator, hilo = _arrancar(old, new, state)
+        assert _esperar(lambda: new.count_documents({"titulo": {"$exists": True}}) == 3), "copia inicial incompleta"
+        assert new.find_one({"url": "https://example.com/0"})["puntuacion"] == 7.5, "se pisó un campo del análisis"
+
+        old.insert_one({"url": "https://example.com/3", "titulo": "T3"})
+        old.update_one({"url": "https://example.com/1"}, {"$set": {"titulo": "T1 editado", "autor": "A1"}})
+        assert _esperar(lambda: new.count_documents({"url": "https://example.com/3"}) == 1), "no se replicó la inserción"
+        assert _esperar(lambda: (new.find_one({"url": "https://example.com/1"}) or {}).get("autor") == "A1"), \
+            "no se replicó la actualización"
+        assert new.find_one({"url": "https://example.com/1"})["titulo"] == "T1", "se pisó un campo ya relleno"
+
+        # url que el crawler ya guardó en la nueva con otro _id: se rellena por url y el stream sigue
+        new.create_index("url", unique=True, name="ux_noticias_url",
+                         partialFilterExpression={"url": {"$exists": True, "$type": "string"}})
+        new.insert_one({"url": "https://example.com/dup", "cuerpo": "del crawler"})
+        old.insert_one({"url": "https://example.com/dup", "titulo": "TD", "cuerpo": "antiguo"})
+        old.insert_one({"url": "https://example.com/tras-dup", "titulo": "TT"})
+        assert _esperar(lambda: new.count_documents({"url": "https://example.com/tras-dup"}) == 1), \
+            "el duplicado de url bloqueó el stream"
+        dup = new.find_one({"url": "https://example.com/dup"})
+        assert dup["titulo"] == "TD" and dup["cuerpo"] == "del crawler", f"duplicado mal rellenado: {dup}"
+
+        replicator.stop_event.set()
+        hilo.join(timeout=10)
+        assert state.find_one({"_id": replicator.stream_id})["resume_token"], "no se guardó el resume token"
+
+        # Cambio con el worker parado: al reanudar desde el token debe aplicarse sin copia completa
+        old.insert_one({"url": "https://example.com/4", "titulo": "T4"})
+        replicator, hilo = _arrancar(old, new, state)
+        assert _esperar(lambda: new.count_documents({"url": "https://example.com/4"}) == 1), "no se reanudó desde el token"
+        replicator.stop_event.set()
+        hilo.join(timeout=10)
+        assert replicator.applied == 1, f"se esperaba 1 operación tras reanudar, hubo {replicator.applied}"
+    finally:
+        client.drop_database(old_db.name)
+        client.drop_database(new_db.name)
+        client.close()
+
+    print("OK: replicacion_noticias self-check passed")
+
+
+if __name__ == "__main__":
+    run_selfcheck()
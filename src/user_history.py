@@ -6,10 +6,11 @@ import threading
 from datetime import datetime, timezone
 
 from dotenv import load_dotenv
-from pymongo import ASCENDING, DESCENDING
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
-from MongoDB import MongoDBService
 from env_config import get_env_first
+from mongo_clients import open_service
 
 
 DEFAULT_LIMIT = 4
@@ -102,13 +103,60 @@ def _sanitize_items(items, limit=None):
     return cleaned[:limit]
 
 
+def _push_item_pipeline(new_item, limit):
+    """
+    Update pipeline que, en una sola operación atómica, pone new_item al principio,
+    quita las entradas previas que no son objetos, cuya query recortada está vacía o
+    repite una anterior (como _sanitize_items) y recorta a limit.
+    Los valores del item van en $literal para que un título que empiece por "$" no se
+    interprete como ruta de campo.
+    """
+    existing = {"$cond": [{"$isArray": "$items"}, "$items", []]}
+    query = {
+        "$cond": [
+            {"$and": [{"$eq": [{"$type": "$$this"}, "object"]}, {"$eq": [{"$type": "$$this.query"}, "string"]}]},
+            {"$trim": {"input": "$$this.query"}},
+            "",
+        ]
+    }
+    kept = {
+        "$reduce": {
+            "input": existing,
+            "initialValue": {"items": [{"$literal": new_item}], "seen": [{"$literal": new_item["query"]}]},
+            "in": {
+                "$let": {
+                    "vars": {"query": query},
+                    "in": {
+                        "$cond": [
+                            {"$or": [{"$eq": ["$$query", ""]}, {"$in": ["$$query", "$$value.seen"]}]},
+                            "$$value",
+                            {
+                                "items": {"$concatArrays": ["$$value.items", ["$$this"]]},
+                                "seen": {"$concatArrays": ["$$value.seen", ["$$query"]]},
+                            },
+                        ]
+                    },
+                }
+            },
+        }
+    }
+    return [
+        {
+            "$set": {
+                "items": {"$let": {"vars": {"kept": kept}, "in": {"$slice": ["$$kept.items", limit]}}},
+                "updatedAt": datetime.now(timezone.utc),
+            }
+        }
+    ]
+
+
 def _open_collection():
     uri = _resolve_mongo_uri()
     if not uri:
         raise RuntimeError(
             "No se encontró URI de MongoDB. Configura MONGO_WRITE_URI/NEW_MONGODB_URI/MONGO_READ_URI/OLD_MONGODB_URI/MONGODB_URI."
         )
-    service = MongoDBService(uri=uri, db_name=DB_NAME)
+    service = open_service(uri, DB_NAME, workload="interactive")
     return service, service.get_collection(COLLECTION_NAME)
 
 
@@ -162,18 +210,18 @@ def upsert_user_history_item(user_id, item, limit=DEFAULT_LIMIT):
         mongo_service, collection = _open_collection()
         ensure_indexes(collection)
 
-        doc = collection.find_one({"userId": str(user_id)}, {"_id": 0, "items": 1}) or {}
-        items = _sanitize_items(doc.get("items", []), limit=None)
-        items = [new_item] + [existing for existing in items if existing.get("query") != new_item["query"]]
-        items = items[:effective_limit]
-
-        collection.update_one(
-            {"userId": str(user_id)},
-            {"$set": {"items": items, "updatedAt": datetime.now(timezone.utc)}},
-            upsert=True,
-        )
-
-        stored_doc = collection.find_one({"userId": str(user_id)}, {"_id": 0, "items": 1}) or {}
+        update = {
+            "filter": {"userId": str(user_id)},
+            "update": _push_item_pipeline(new_item, effective_limit),
+            "projection": {"_id": 0, "items": 1},
+            "upsert": True,
+            "return_document": ReturnDocument.AFTER,
+        }
+        try:
+            stored_doc = collection.find_one_and_update(**update) or {}
+        except DuplicateKeyError:
+            # Dos upserts simultáneos del primer item del usuario: el perdedor reintenta como update.
+            stored_doc = collection.find_one_and_update(**update) or {}
         stored_items = _sanitize_items(stored_doc.get("items", []), effective_limit)
 
         return {"ok": True, "items": stored_items}
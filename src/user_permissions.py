@@ -5,14 +5,18 @@ import threading
 from datetime import datetime, timezone
 
 from dotenv import load_dotenv
-from pymongo import ASCENDING, DESCENDING
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
 
-from MongoDB import MongoDBService
-from env_config import get_env_first
+from env_config import get_env_first, get_env_int
+from mongo_clients import open_service
+from permission_cache import permission_cache
 
 
 DB_NAME = "Base_de_datos_noticias"
 COLLECTION_NAME = "user_permissions"
+PERMISSIONS_BULK_BATCH_SIZE = get_env_int("PERMISSIONS_BULK_BATCH_SIZE", 1000)
+PERMISSION_FIELDS = {"_id": 0, "userId": 1, "canUseChatbot": 1, "email": 1, "createdAt": 1, "updatedAt": 1}
 _indexes_ensured = False
 _indexes_lock = threading.Lock()
 
@@ -60,7 +64,7 @@ def _open_collection():
         raise RuntimeError(
             "No se encontró URI de MongoDB. Configura MONGO_WRITE_URI/NEW_MONGODB_URI/MONGO_READ_URI/OLD_MONGODB_URI/MONGODB_URI."
         )
-    service = MongoDBService(uri=uri, db_name=DB_NAME)
+    service = open_service(uri, DB_NAME, workload="interactive")
     return service, service.get_collection(COLLECTION_NAME)
 
 
@@ -93,6 +97,12 @@ def get_chatbot_permission(user_id, email=None, bootstrap_if_missing=True):
         return {"ok": False, "error": str(exc)}
 
     normalized_email = _normalize_email(email)
+
+    # Camino rápido: entrada cacheada con el mismo email (si cambia, hay que persistirlo)
+    cached = permission_cache.get(normalized_user_id)
+    if cached is not None and (not normalized_email or cached.get("email") == normalized_email):
+        return cached
+
     mongo_service = None
 
     try:
@@ -127,7 +137,9 @@ def get_chatbot_permission(user_id, email=None, bootstrap_if_missing=True):
             )
             doc = collection.find_one({"userId": normalized_user_id}, projection)
 
-        return _safe_permission_payload(normalized_user_id, doc)
+        payload = _safe_permission_payload(normalized_user_id, doc)
+        permission_cache.set(normalized_user_id, payload)
+        return payload
     except Exception as exc:
         return {"ok": False, "error": str(exc)}
     finally:
@@ -145,6 +157,8 @@ def set_chatbot_permission(user_id, can_use_chatbot, email=None):
     normalized_email = _normalize_email(email)
     mongo_service = None
 
+    # Aunque la escritura falle, la próxima lectura debe ir a la BD
+    permission_cache.invalidate(normalized_user_id)
     try:
         mongo_service, collection = _open_collection()
         ensure_indexes(collection)
@@ -171,9 +185,107 @@ def set_chatbot_permission(user_id, can_use_chatbot, email=None):
 
         projection = {"_id": 0, "userId": 1, "canUseChatbot": 1, "email": 1}
         doc = collection.find_one({"userId": normalized_user_id}, projection)
-        return _safe_permission_payload(normalized_user_id, doc)
+        payload = _safe_permission_payload(normalized_user_id, doc)
+        permission_cache.set(normalized_user_id, payload)
+        return payload
     except Exception as exc:
         return {"ok": False, "error": str(exc)}
     finally:
         if mongo_service:
             mongo_service.close()
+
+
+def _normalize_bulk_row(row):
+    """(userId, canUseChatbot, email) de una fila de importación; acepta camelCase o snake_case."""
+    if not isinstance(row, dict):
+        raise ValueError("Cada fila debe ser un objeto JSON válido.")
+    user_id = _normalize_user_id(row.get("userId", row.get("user_id")))
+    flag = row.get("canUseChatbot", row.get("can_use_chatbot"))
+    if flag is None or flag == "":
+        raise ValueError("El campo 'canUseChatbot' es requerido.")
+    return user_id, _normalize_bool(flag), _normalize_email(row.get("email"))
+
+
+def _apply_bulk_batch(collection, batch):
+    """Un bulk_write de upserts para el lote [(numero_fila, userId, canUse, email)]; resultados por fila."""
+    now_utc = datetime.now(timezone.utc)
+    operations = []
+    for _line, user_id, can_use, email in batch:
+        update_fields = {"canUseChatbot": can_use, "updatedAt": now_utc}
+        if email is not None:
+            update_fields["email"] = email
+        operations.append(
+            UpdateOne(
+                {"userId": user_id},
+                {"$set": update_fields, "$setOnInsert": {"userId": user_id, "createdAt": now_utc}},
+                upsert=True,
+            )
+        )
+
+    errors = {}
+    upserted = set()
+    try:
+        result = collection.bulk_write(operations, ordered=False)
+        upserted = set(result.upserted_ids or {})
+    except BulkWriteError as exc:
+        details = exc.details or {}
+        errors = {item["index"]: item.get("errmsg", "write_error") for item in details.get("writeErrors", [])}
+        upserted = {item["index"] for item in details.get("upserted", [])}
+
+    results = []
+    for index, (line, user_id, can_use, _email) in enumerate(batch):
+        permission_cache.invalidate(user_id)
+        if index in errors:
+            results.append({"line": line, "userId": user_id, "ok": False, "error": errors[index]})
+        else:
+            results.append({
+                "line": line,
+                "userId": user_id,
+                "ok": True,
+                "canUseChatbot": can_use,
+                "created": index in upserted,
+            })
+    return results
+
+
+def bulk_set_chatbot_permissions(rows, batch_size=None):
+    """
+    Aplica permisos en bloque con upserts en bulk_write (lotes de PERMISSIONS_BULK_BATCH_SIZE).
+    rows: iterable de dicts {userId, canUseChatbot, email?}; se consume en streaming.
+    Genera un resultado por fila {"line", "userId", "ok", "created"|"error"}; las filas
+    inválidas salen en cuanto se leen y las válidas al aplicar su lote.
+    """
+    batch_size = max(1, batch_size or PERMISSIONS_BULK_BATCH_SIZE)
+    mongo_service, collection = _open_collection()
+    try:
+        ensure_indexes(collection)
+        batch = []
+        for line, row in enumerate(rows, start=1):
+            try:
+                user_id, can_use, email = _normalize_bulk_row(row)
+            except Exception as exc:
+                # Las filas inválidas se informan al momento (con su número de línea) sin cortar el lote
+                yield {"line": line, "userId": row.get("userId") if isinstance(row, dict) else None,
+                       "ok": False, "error": str(exc)}
+                continue
+            batch.append((line, user_id, can_use, email))
+            if len(batch) >= batch_size:
+                yield from _apply_bulk_batch(collection, batch)
+                batch = []
+        if batch:
+            yield from _apply_bulk_batch(collection, batch)
+    finally:
+        mongo_service.close()
+
+
+def iter_chatbot_permissions(only_enabled=None, batch_size=None):
+    """Recorre user_permissions con un cursor (sin cargarlo entero); only_enabled filtra por canUseChatbot."""
+    query = {}
+    if only_enabled is not None:
+        query["canUseChatbot"] = True if only_enabled else {"$ne": True}
+    mongo_service, collection = _open_collection()
+    try:
+        cursor = collection.find(query, PERMISSION_FIELDS).sort("userId", ASCENDING)
+        yield from cursor.batch_size(max(1, batch_size or PERMISSIONS_BULK_BATCH_SIZE))
+    finally:
+        mongo_service.close()
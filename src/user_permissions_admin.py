@@ -2,30 +2,142 @@
 # -*- coding: utf-8 -*-
 
 import argparse
+import csv
 import json
+import os
 import sys
 
-from user_permissions import get_chatbot_permission, set_chatbot_permission
+from user_permissions import (
+    bulk_set_chatbot_permissions,
+    get_chatbot_permission,
+    iter_chatbot_permissions,
+    set_chatbot_permission,
+)
+
+
+EXPORT_COLUMNS = ["userId", "email", "canUseChatbot", "createdAt", "updatedAt"]
 
 
 def build_parser():
     parser = argparse.ArgumentParser(
-        description="Administra permisos de chatbot en Base_de_datos_noticias.user_permissions."
+        description="Administra permisos de chatbot en Base_de_datos_noticias.user_permissions.",
+        epilog=(
+            "Importación en bloque: --import permisos.csv (columnas userId,email,canUseChatbot) o "
+            "--import permisos.ndjson (un objeto JSON por línea); '-' lee de stdin. "
+            "Exportación: --export [fichero] (stdout por defecto)."
+        ),
     )
-    parser.add_argument("--user-id", required=True, help="Clerk userId (ej. user_3A5Yak5hMjC03bDnQCUpI8bSWCG).")
+    parser.add_argument("--user-id", default=None, help="Clerk userId (ej. user_3A5Yak5hMjC03bDnQCUpI8bSWCG).")
     parser.add_argument("--email", default=None, help="Email opcional para asociar al registro.")
+    parser.add_argument(
+        "--format",
+        choices=["csv", "ndjson"],
+        default=None,
+        help="Formato de --import/--export (por defecto, según la extensión; ndjson si no se deduce).",
+    )
+    parser.add_argument(
+        "--only",
+        choices=["enabled", "disabled"],
+        default=None,
+        help="Con --export, solo los usuarios con acceso (enabled) o sin él (disabled).",
+    )
 
     group = parser.add_mutually_exclusive_group(required=True)
     group.add_argument("--status", action="store_true", help="Consultar permiso actual del usuario.")
     group.add_argument("--grant", action="store_true", help="Conceder acceso al chatbot (canUseChatbot=true).")
     group.add_argument("--revoke", action="store_true", help="Revocar acceso al chatbot (canUseChatbot=false).")
+    group.add_argument("--import", dest="import_path", metavar="FICHERO", help="Aplicar permisos en bloque desde CSV/NDJSON.")
+    group.add_argument("--export", dest="export_path", metavar="FICHERO", nargs="?", const="-",
+                       help="Volcar la colección de permisos en CSV/NDJSON.")
     return parser
 
 
+def _resolve_format(path, explicit):
+    if explicit:
+        return explicit
+    return "csv" if path and path.lower().endswith(".csv") else "ndjson"
+
+
+def _open_input(path):
+    if path == "-":
+        return sys.stdin
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def iter_rows(handle, fmt):
+    """Filas de un CSV con cabecera o de un NDJSON, leídas en streaming."""
+    if fmt == "csv":
+        yield from csv.DictReader(handle)
+        return
+    for raw in handle:
+        raw = raw.strip()
+        if not raw:
+            continue
+        try:
+            yield json.loads(raw)
+        except json.JSONDecodeError:
+            # bulk_set_chatbot_permissions la informa como fila inválida, con su número de línea
+            yield None
+
+
+def run_import(path, fmt):
+    handle = _open_input(path)
+    counters = {"ok": 0, "created": 0, "errors": 0}
+    try:
+        for result in bulk_set_chatbot_permissions(iter_rows(handle, fmt)):
+            print(json.dumps(result, ensure_ascii=False))
+            if result.get("ok"):
+                counters["ok"] += 1
+                counters["created"] += int(bool(result.get("created")))
+            else:
+                counters["errors"] += 1
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+    print(json.dumps({"summary": counters}, ensure_ascii=False), file=sys.stderr)
+    return 0 if counters["errors"] == 0 else 1
+
+
+def run_export(path, fmt, only):
+    only_enabled = None if only is None else only == "enabled"
+    out = sys.stdout if path == "-" else open(path, "w", encoding="utf-8", newline="")
+    total = 0
+    try:
+        writer = None
+        if fmt == "csv":
+            writer = csv.DictWriter(out, fieldnames=EXPORT_COLUMNS, extrasaction="ignore")
+            writer.writeheader()
+        for doc in iter_chatbot_permissions(only_enabled=only_enabled):
+            doc["canUseChatbot"] = doc.get("canUseChatbot") is True
+            for field in ("createdAt", "updatedAt"):
+                if doc.get(field) is not None:
+                    doc[field] = doc[field].isoformat()
+            if writer is not None:
+                writer.writerow(doc)
+            else:
+                out.write(json.dumps(doc, ensure_ascii=False) + "\n")
+            total += 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(json.dumps({"exported": total}, ensure_ascii=False), file=sys.stderr)
+    return 0
+
+
 def main():
     parser = build_parser()
     args = parser.parse_args()
 
+    if args.import_path:
+        if args.import_path != "-" and not os.path.exists(args.import_path):
+            parser.error(f"No existe el fichero {args.import_path}")
+        return run_import(args.import_path, _resolve_format(args.import_path, args.format))
+    if args.export_path:
+        return run_export(args.export_path, _resolve_format(args.export_path, args.format), args.only)
+
+    if not args.user_id:
+        parser.error("--user-id es obligatorio con --status, --grant y --revoke")
+
     if args.status:
         result = get_chatbot_permission(args.user_id, email=args.email, bootstrap_if_missing=True)
     elif args.grant:
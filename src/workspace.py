@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Directorios de trabajo por ejecución del pipeline.
+
+Cada ejecución de analiza_y_guarda.py escribe sus artefactos (retrieved_news_item.txt,
+fact_check_analisis.json, el .tex/.pdf y latex_build.log) en `<PATH_OUTPUT_DIR>/runs/<run_id>/`
+en vez de en output_temporal directamente, así que varias noticias se pueden analizar y
+renderizar a la vez en la misma máquina. El run_id es el que Hemingwai.py guarda en
+pipeline.run_id (lo recibe en PIPELINE_RUN_ID), de modo que el directorio se localiza desde
+el documento de la noticia.
+
+Los directorios no se borran al terminar, para poder revisar una ejecución; cleanup_old_workspaces()
+elimina los que llevan más de PIPELINE_WORKSPACE_MAX_AGE_HOURS sin modificarse.
+"""
+import os
+import re
+import shutil
+import time
+import uuid
+
+from env_config import get_env, get_env_int
+
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SRC_DIR)
+PIPELINE_WORKSPACE_MAX_AGE_HOURS = get_env_int("PIPELINE_WORKSPACE_MAX_AGE_HOURS", 24)
+RUN_ID_ENV = "PIPELINE_RUN_ID"
+
+_RUN_ID_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
+
+
+def _resolve(path_value):
+    return path_value if os.path.isabs(path_value) else os.path.join(ROOT_DIR, path_value)
+
+
+def output_root():
+    return _resolve(get_env("PATH_OUTPUT_DIR", "output_temporal"))
+
+
+def workspaces_root():
+    return os.path.join(output_root(), "runs")
+
+
+def new_run_id():
+    return str(uuid.uuid4())
+
+
+def workspace_dir(run_id, root=None):
+    """Ruta del directorio de trabajo de `run_id` (no lo crea)."""
+    if not _RUN_ID_RE.match(str(run_id or "")):
+        raise ValueError(f"run_id no válido para un directorio de trabajo: {run_id!r}")
+    return os.path.join(root or workspaces_root(), run_id)
+
+
+def create_workspace(run_id=None, root=None):
+    """Crea el directorio de trabajo de la ejecución; devuelve (run_id, ruta)."""
+    run_id = run_id or new_run_id()
+    path = workspace_dir(run_id, root)
+    os.makedirs(path, exist_ok=True)
+    return run_id, path
+
+
+def cleanup_old_workspaces(max_age_hours=None, root=None, keep=()):
+    """
+    Borra los directorios de trabajo sin modificar en más de `max_age_hours` horas
+    (0 o negativo desactiva la limpieza). `keep` son run_id que no se tocan aunque sean viejos.
+    Devuelve cuántos se borraron.
+    """
+    max_age_hours = PIPELINE_WORKSPACE_MAX_AGE_HOURS if max_age_hours is None else max_age_hours
+    root = root or workspaces_root()
+    if max_age_hours <= 0 or not os.path.isdir(root):
+        return 0
+    limit = time.time() - max_age_hours * 3600
+    removed = 0
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if name in keep or not os.path.isdir(path) or not _RUN_ID_RE.match(name):
+            continue
+        try:
+            # La antigüedad es la del fichero más reciente: un directorio viejo con escrituras recientes sigue vivo
+            newest = max([os.path.getmtime(path)] + [os.path.getmtime(os.path.join(path, f)) for f in os.listdir(path)])
+        except OSError:
+            continue
+        if newest < limit:
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+    return removed
@@ -0,0 +1,64 @@
+import os
+import tempfile
+import time
+
+from workspace import cleanup_old_workspaces, create_workspace, workspace_dir
+
+
+def _assert(cond, msg):
+    if not cond:
+        raise AssertionError(msg)
+
+
+def _envejecer(path, horas):
+    antes = time.time() - horas * 3600
+    for nombre in os.listdir(path):
+        os.utime(os.path.join(path, nombre), (antes, antes))
+    os.utime(path, (antes, antes))
+
+
+def run_selfcheck():
+    with tempfile.TemporaryDirectory() as root:
+        _run_id, viejo = create_workspace("viejo", root=root)
+        _run_id, reciente = create_workspace("reciente", root=root)
+        _run_id, conservado = create_workspace("conservado", root=root)
+        _run_id, con_escritura = create_workspace("con-escritura", root=root)
+        with open(os.path.join(viejo, "latex_build.log"), "w", encoding="utf-8") as f:
+            f.write("log")
+        with open(os.path.join(con_escritura, "fact_check_analisis.json"), "w", encoding="utf-8") as f:
+            f.write("{}")
+        # Nombres que no son run_id: no los creó el pipeline y no se tocan
+        invalidos = [os.path.join(root, nombre) for nombre in (".oculto", "con espacio", "_empieza_raro")]
+        for path in invalidos:
+            os.makedirs(path)
+        suelto = os.path.join(root, "suelto.txt")
+        with open(suelto, "w", encoding="utf-8") as f:
+            f.write("x")
+
+        for path in [viejo, conservado, con_escritura] + invalidos:
+            _envejecer(path, 48)
+        # Directorio viejo con un fichero recién escrito: sigue en uso
+        os.utime(os.path.join(con_escritura, "fact_check_analisis.json"), None)
+        os.utime(suelto, (time.time() - 48 * 3600,) * 2)
+
+        _assert(cleanup_old_workspaces(0, root=root) == 0, "max_age_hours=0 debe desactivar la limpieza")
+        _assert(cleanup_old_workspaces(24, root=os.path.join(root, "no-existe")) == 0, "Raíz inexistente")
+
+        removed = cleanup_old_workspaces(24, root=root, keep=("conservado",))
+        _assert(removed == 1, f"Debe borrar solo el directorio viejo (borró {removed})")
+        _assert(not os.path.exists(viejo), "El directorio viejo no se borró")
+        for path in [reciente, conservado, con_escritura, suelto] + invalidos:
+            _assert(os.path.exists(path), f"No debía borrarse: {os.path.basename(path)}")
+
+        try:
+            workspace_dir("../fuera", root=root)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("run_id con separadores aceptado")
+
+    print("OK: workspace self-check passed")
+
+
+if __name__ == "__main__":
+    run_selfcheck()